@@ -0,0 +1,117 @@
+"""Сверка колоночного движка с Postgres на планах быстрого пути и замер времени ответа.
+
+Запуск из корня проекта (нужен PostgreSQL со схемой из init_db.sql):
+    python -m benchmarks.columnar --database-url postgresql://localhost/bench --seed-videos 5000 --repeat 50
+Код выхода 1, если хотя бы один ответ разошелся с Postgres.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Any, List
+
+# Токены бота и провайдера в бенчмарке не используются
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'benchmark')
+os.environ.setdefault('GROQ_API_KEY', 'benchmark')
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost/video_analytics')
+
+from benchmarks.dataset import write_dataset  # noqa: E402
+from benchmarks.e2e import QUESTIONS, percentile  # noqa: E402
+from db.columnar import ColumnarEngine, build_columnar_cache  # noqa: E402
+from db.config import settings  # noqa: E402
+from db.database import Database  # noqa: E402
+from services.date_extractor import DateExtractor  # noqa: E402
+from services.fast_path import FastPathPlanner  # noqa: E402
+
+# Вопросы с фильтром по креатору; {creator} - id из базы
+CREATOR_QUESTIONS = [
+    "Сколько видео у креатора с id {creator} вышло с 1 по 15 октября 2025?",
+    "Сколько видео у креатора с id {creator} набрало больше 5000 просмотров?",
+    "На сколько просмотров выросли все видео креатора с id {creator} 1 ноября 2025?",
+    "Сколько разных видео креатора с id {creator} получали новые лайки с 1 по 2 ноября 2025?",
+    "Сколько видео у креатора с id unknown вышло 28 октября 2025?",
+]
+
+
+def same(expected: Any, actual: Any) -> bool:
+    """SUM в Postgres возвращает int или Decimal, пустая сумма - NULL"""
+    if expected is None or actual is None:
+        return expected is None and actual is None
+    return int(expected) == int(actual)
+
+
+async def run(args) -> int:
+    db = Database(args.database_url, statement_cache_size=0)
+    await db.connect()
+    try:
+        if args.seed_videos:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'synthetic.ndjson.gz')
+                write_dataset(path, args.seed_videos, args.seed_snapshots)
+                await db.bulk_load_json_data(path)
+
+        with tempfile.TemporaryDirectory() as cache_path:
+            meta = await build_columnar_cache(db, cache_path)
+            engine = ColumnarEngine(cache_path)
+            if not engine.ready(meta['generation']):
+                print("Колоночный кэш не загружен")
+                return 1
+
+            creators = [row['creator_id'] for row in await db.execute_query(
+                "SELECT creator_id FROM videos GROUP BY creator_id ORDER BY COUNT(*) DESC LIMIT 2"
+            )]
+            questions = list(QUESTIONS) + [
+                question.format(creator=creator) for creator in creators for question in CREATOR_QUESTIONS
+            ]
+
+            extractor = DateExtractor()
+            mismatches = 0
+            postgres_times: List[float] = []
+            columnar_times: List[float] = []
+            for use_rollups in (True, False):
+                planner = FastPathPlanner(use_rollups=use_rollups)
+                for question in questions:
+                    plan = planner.plan(question, extractor.extract(question))
+                    if plan is None or not engine.supports(plan):
+                        continue
+
+                    for _ in range(max(1, args.repeat)):
+                        started = time.perf_counter()
+                        expected = await db.execute_scalar(plan.sql, *plan.args)
+                        postgres_times.append(time.perf_counter() - started)
+
+                        started = time.perf_counter()
+                        actual = engine.execute(plan)
+                        columnar_times.append(time.perf_counter() - started)
+
+                    if not same(expected, actual):
+                        mismatches += 1
+                        print(f"РАСХОЖДЕНИЕ {plan.intent} {plan.params}: postgres={expected}, columnar={actual}")
+                    elif args.verbose:
+                        print(f"ok {plan.intent} rollups={use_rollups}: {actual}")
+
+            print(f"Кэш: {meta['videos']} видео, {meta['snapshots']} снапшотов, поколение {meta['generation']}")
+            print(f"Сверено планов: {len(postgres_times) // max(1, args.repeat)}, расхождений: {mismatches}")
+            for name, values in (('postgres', postgres_times), ('columnar', columnar_times)):
+                print(f"  {name:<9} " + ", ".join(
+                    f"p{q}={percentile(values, q) * 1000:.3f} мс" for q in (50, 95, 99)
+                ))
+            return 1 if mismatches else 0
+    finally:
+        await db.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сверка колоночного движка с Postgres")
+    parser.add_argument('--database-url', default=settings.DATABASE_URL)
+    parser.add_argument('--seed-videos', type=int, default=0, help="загрузить синтетическую выгрузку из N видео")
+    parser.add_argument('--seed-snapshots', type=int, default=24, help="снапшотов на видео при загрузке")
+    parser.add_argument('--repeat', type=int, default=20, help="повторов каждого плана для замера")
+    parser.add_argument('--verbose', action='store_true')
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
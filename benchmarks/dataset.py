@@ -0,0 +1,89 @@
+"""Синтетическая выгрузка видео со снапшотами в формате загрузчика.
+
+Запуск из корня проекта:
+    python -m benchmarks.dataset synthetic.ndjson.gz --videos 10000 --snapshots 24
+"""
+import argparse
+import gzip
+import json
+import random
+import uuid
+from datetime import datetime, timedelta
+
+# Снапшоты начинаются с этой даты, по одному в час
+START = datetime(2025, 11, 1)
+
+
+def _timestamp(value: datetime) -> str:
+    return value.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+
+def generate_videos(videos: int, snapshots: int, creators: int = 100, seed: int = 0):
+    """Видео со снапшотами; детерминированы для одинаковых параметров"""
+    rng = random.Random(seed)
+    creator_ids = [uuid.UUID(int=rng.getrandbits(128)).hex for _ in range(creators)]
+
+    for _ in range(videos):
+        video_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        published = START - timedelta(hours=rng.randint(0, 24 * 60))
+        counts = [0, 0, 0, 0]
+        history = []
+
+        for hour in range(snapshots):
+            deltas = [rng.randint(0, 500), rng.randint(0, 50), rng.randint(0, 10), int(rng.random() < 0.01)]
+            counts = [count + delta for count, delta in zip(counts, deltas)]
+            created = START + timedelta(hours=hour)
+            history.append({
+                'id': str(uuid.UUID(int=rng.getrandbits(128))),
+                'views_count': counts[0],
+                'likes_count': counts[1],
+                'comments_count': counts[2],
+                'reports_count': counts[3],
+                'delta_views_count': deltas[0],
+                'delta_likes_count': deltas[1],
+                'delta_comments_count': deltas[2],
+                'delta_reports_count': deltas[3],
+                'created_at': _timestamp(created),
+                'updated_at': _timestamp(created),
+            })
+
+        updated = START + timedelta(hours=max(snapshots - 1, 0))
+        yield {
+            'id': video_id,
+            'creator_id': rng.choice(creator_ids),
+            'video_created_at': _timestamp(published),
+            'views_count': counts[0],
+            'likes_count': counts[1],
+            'comments_count': counts[2],
+            'reports_count': counts[3],
+            'created_at': _timestamp(published),
+            'updated_at': _timestamp(updated),
+            'snapshots': history,
+        }
+
+
+def write_dataset(path: str, videos: int, snapshots: int, creators: int = 100, seed: int = 0) -> int:
+    """Запись выгрузки в NDJSON (gzip для .gz); возвращает количество строк для загрузки"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'wt', encoding='utf-8') as f:
+        for video in generate_videos(videos, snapshots, creators, seed):
+            f.write(json.dumps(video, ensure_ascii=False))
+            f.write('\n')
+    return videos * (snapshots + 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация синтетической выгрузки видео")
+    parser.add_argument('path', help="файл .ndjson или .ndjson.gz")
+    parser.add_argument('--videos', type=int, default=10000, help="количество видео")
+    parser.add_argument('--snapshots', type=int, default=24, help="снапшотов на видео")
+    parser.add_argument('--creators', type=int, default=100, help="количество креаторов")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = write_dataset(args.path, args.videos, args.snapshots, args.creators, args.seed)
+    print(f"{args.path}: {args.videos} видео, {rows} строк")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Микробенчмарк и табличная проверка извлечения дат.
+
+Запуск из корня проекта:
+    python -m benchmarks.date_extraction            # проверка корпуса и замер
+    python -m benchmarks.date_extraction --check    # только проверка корпуса
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from services.date_extractor import DateExtractor
+
+# Опорное "сейчас" для корпуса: среда, 10 декабря 2025
+NOW = datetime(2025, 12, 10, 15, 30)
+
+
+def day(year: int, month: int, day_: int):
+    return datetime(year, month, day_), datetime(year, month, day_, 23, 59, 59, 999999)
+
+
+def span(start: tuple, end: tuple):
+    return datetime(*start), datetime(*end, 23, 59, 59, 999999)
+
+
+CORPUS = [
+    # Точные даты
+    ("На сколько просмотров выросли все видео 28 ноября 2025?", day(2025, 11, 28)),
+    ("Сколько разных видео получали новые просмотры 27 ноября 2025?", day(2025, 11, 27)),
+    ("Сколько видео вышло 28.11.2025?", day(2025, 11, 28)),
+    ("Сколько видео вышло 5 ноября?", day(2025, 11, 5)),
+    ("Сколько видео вышло 15 декабря?", day(2024, 12, 15)),
+    ("Сравни 1 ноября 2025 и 3 ноября 2025", span((2025, 11, 1), (2025, 11, 3))),
+    ("Сколько видео вышло 31 февраля 2025?", None),
+    # Диапазоны
+    ("Сколько видео у креатора с id abc вышло с 1 по 5 ноября 2025?", span((2025, 11, 1), (2025, 11, 5))),
+    ("с 15 января 2024 по 20 января 2024", span((2024, 1, 15), (2024, 1, 20))),
+    ("с 15.01.2024 по 20.01.2024", span((2024, 1, 15), (2024, 1, 20))),
+    ("от 15 января 2024 до 20 января 2024", span((2024, 1, 15), (2024, 1, 20))),
+    ("с 30 ноября по 2 декабря 2025", span((2025, 11, 30), (2025, 12, 2))),
+    ("с 25 декабря по 5 января 2026", span((2025, 12, 25), (2026, 1, 5))),
+    # Периоды
+    ("за последние 7 дней", span((2025, 12, 3), (2025, 12, 10))),
+    ("за 2 недели", span((2025, 11, 26), (2025, 12, 10))),
+    ("за последние 3 месяца", span((2025, 9, 10), (2025, 12, 10))),
+    ("последние 1 год", span((2024, 12, 10), (2025, 12, 10))),
+    # Кварталы
+    ("во 2 квартале 2025", span((2025, 4, 1), (2025, 6, 30))),
+    ("в 3-м квартале", span((2025, 7, 1), (2025, 9, 30))),
+    ("в этом квартале", span((2025, 10, 1), (2025, 12, 31))),
+    ("в прошлом квартале", span((2025, 7, 1), (2025, 9, 30))),
+    # Относительные
+    ("сколько видео вышло сегодня", day(2025, 12, 10)),
+    ("сколько видео вышло вчера", day(2025, 12, 9)),
+    ("сколько видео вышло позавчера", day(2025, 12, 8)),
+    ("на этой неделе", span((2025, 12, 8), (2025, 12, 14))),
+    ("на прошлой неделе", span((2025, 12, 1), (2025, 12, 7))),
+    ("в этом месяце", span((2025, 12, 1), (2025, 12, 10))),
+    ("в прошлом месяце", span((2025, 11, 1), (2025, 11, 30))),
+    # Без дат
+    ("Сколько всего видео есть в системе?", None),
+    ("Сколько видео набрало больше 100000 просмотров?", None),
+]
+
+
+def check(extractor: DateExtractor) -> int:
+    """Проверка корпуса; возвращает количество расхождений"""
+    failures = 0
+    for text, expected in CORPUS:
+        actual = extractor.extract(text)
+        if actual != expected:
+            failures += 1
+            print(f"FAIL {text!r}\n  ожидалось: {expected}\n  получено:  {actual}")
+    print(f"Корпус: {len(CORPUS) - failures}/{len(CORPUS)} совпадений")
+    return failures
+
+
+def bench(extractor: DateExtractor, rounds: int) -> float:
+    """Среднее время одного извлечения по корпусу в микросекундах"""
+    texts = [text for text, _ in CORPUS]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            extractor.extract(text)
+    elapsed = time.perf_counter() - started
+    return elapsed / (rounds * len(texts)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка и замер извлечения дат")
+    parser.add_argument('--check', action='store_true', help="только проверка корпуса")
+    parser.add_argument('--rounds', type=int, default=2000, help="количество проходов по корпусу")
+    args = parser.parse_args()
+
+    extractor = DateExtractor(now=lambda: NOW)
+    failures = check(extractor)
+    if not args.check:
+        print(f"Извлечение дат: {bench(extractor, args.rounds):.1f} мкс на вопрос")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
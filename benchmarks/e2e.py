@@ -0,0 +1,199 @@
+"""Сквозной замер задержки process_query с локальной заглушкой LLM.
+
+Запуск из корня проекта (нужен PostgreSQL со схемой из init_db.sql):
+    python -m benchmarks.e2e --database-url postgresql://localhost/bench --seed-videos 5000 \\
+        --requests 500 --concurrency 20 --llm-latency 0.8
+"""
+import argparse
+import asyncio
+import functools
+import math
+import os
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+# Токены бота и провайдера в бенчмарке не используются
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'benchmark')
+os.environ.setdefault('GROQ_API_KEY', 'benchmark')
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost/video_analytics')
+# Лимиты провайдера не должны ограничивать заглушку; переопределяются через окружение
+os.environ.setdefault('LLM_RATE_LIMIT_RPM', '100000')
+os.environ.setdefault('LLM_MAX_CONCURRENCY', '64')
+
+from benchmarks.dataset import write_dataset  # noqa: E402
+from benchmarks.llm_stub import StubLLM  # noqa: E402
+from db.config import settings  # noqa: E402
+from db.database import INIT_SQL_PATH, Database  # noqa: E402
+from db.result_cache import ResultCache  # noqa: E402
+from services.fast_path import FastPathPlanner  # noqa: E402
+from services.lm_handler import LLMHandler, create_llm_session  # noqa: E402
+from services.query_processor import QueryProcessor  # noqa: E402
+from services.single_flight import SingleFlight  # noqa: E402
+from services.sql_cache import SQLTemplateCache  # noqa: E402
+from services.sql_guard import SQLGuard  # noqa: E402
+
+# Вопросы под синтетическую выгрузку (снапшоты с 1 ноября 2025)
+QUESTIONS = [
+    "Сколько всего видео есть в системе?",
+    "Сколько видео вышло 28 октября 2025?",
+    "Сколько видео вышло с 1 по 15 октября 2025?",
+    "Сколько видео набрало больше 5000 просмотров?",
+    "Сколько видео набрало больше 100 лайков?",
+    "На сколько просмотров выросли все видео 1 ноября 2025?",
+    "На сколько лайков выросли все видео с 1 по 2 ноября 2025?",
+    "Сколько разных видео получали новые просмотры 1 ноября 2025?",
+    "Сколько разных видео получали новые комментарии с 1 по 2 ноября 2025?",
+    "Сколько креаторов опубликовали хотя бы одно видео?",
+    "Какое среднее количество просмотров у видео?",
+    "Сколько видео получили жалобы 2 ноября 2025?",
+    "Сколько видео у креаторов, у которых больше 10 видео?",
+    "Какой креатор набрал больше всего просмотров в ноябре 2025?",
+]
+
+
+class Timings:
+    """Суммарное время по этапам обработки"""
+
+    def __init__(self):
+        self.totals: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+
+    def wrap_sync(self, name: str, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.totals[name] += time.perf_counter() - started
+                self.calls[name] += 1
+        return wrapper
+
+    def wrap_async(self, name: str, func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.totals[name] += time.perf_counter() - started
+                self.calls[name] += 1
+        return wrapper
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+async def seed(db: Database, videos: int, snapshots: int, init_schema: bool):
+    """Создание схемы и загрузка синтетической выгрузки"""
+    if init_schema:
+        with open(INIT_SQL_PATH, 'r', encoding='utf-8') as f:
+            init_sql = f.read()
+        async with db.pool.acquire() as connection:
+            await connection.execute(init_sql)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'synthetic.ndjson.gz')
+        write_dataset(path, videos, snapshots)
+        report = await db.bulk_load_json_data(path)
+    print(f"Загружено {report['videos']} видео и {report['snapshots']} снапшотов "
+          f"за {report['seconds']:.1f} с ({report['rows_per_sec']:.0f} строк/с)")
+
+
+async def run(args):
+    stub = StubLLM(args.llm_latency, args.llm_jitter, port=args.llm_port)
+    await stub.start()
+
+    result_cache = ResultCache(settings.RESULT_CACHE_SIZE) if args.result_cache else None
+    db = Database(args.database_url, result_cache=result_cache, statement_cache_size=args.statement_cache)
+    await db.connect()
+    llm_session = create_llm_session()
+
+    try:
+        if args.seed_videos:
+            await seed(db, args.seed_videos, args.seed_snapshots, args.init_schema)
+
+        llm_handler = LLMHandler(session=llm_session, base_url=stub.base_url, api_key='benchmark')
+        await llm_handler.prompt_builder.load_schema(db)
+        processor = QueryProcessor(
+            db, llm_handler,
+            sql_cache=SQLTemplateCache() if args.sql_cache else None,
+            fast_path=FastPathPlanner() if args.fast_path else None,
+            sql_guard=SQLGuard() if args.guard else None,
+            single_flight=SingleFlight() if args.single_flight else None
+        )
+
+        timings = Timings()
+        processor.date_extractor.extract = timings.wrap_sync('dates', processor.date_extractor.extract)
+        llm_handler.generate_sql_query = timings.wrap_async('llm', llm_handler.generate_sql_query)
+        db.execute_scalar = timings.wrap_async('db', db.execute_scalar)
+
+        latencies: List[float] = []
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one(question: str):
+            async with semaphore:
+                started = time.perf_counter()
+                await processor.process_query(question)
+                latencies.append(time.perf_counter() - started)
+
+        questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.requests)]
+        started = time.perf_counter()
+        await asyncio.gather(*(one(question) for question in questions))
+        elapsed = time.perf_counter() - started
+
+        print(f"Запросов: {len(latencies)}, параллельно: {args.concurrency}, за {elapsed:.2f} с")
+        print(f"Пропускная способность: {len(latencies) / elapsed:.1f} запросов/с")
+        print("Задержка, мс: " + ", ".join(
+            f"p{q}={percentile(latencies, q) * 1000:.1f}" for q in (50, 95, 99)
+        ))
+        print("Время на запрос по этапам, мс:")
+        for name in ('dates', 'llm', 'db'):
+            average = timings.totals[name] / len(latencies) * 1000 if latencies else 0.0
+            print(f"  {name:<6} {average:8.2f}  (вызовов {timings.calls[name]})")
+        print(f"Запросов к заглушке LLM: {stub.requests}, из них пачек вопросов: {stub.batches}")
+        if processor.fast_path:
+            print(f"Быстрый путь: {processor.fast_path.stats()}")
+        if processor.single_flight:
+            print(f"Объединение вопросов: {processor.single_flight.stats()}")
+        print(f"LLM: {llm_handler.stats()}")
+        print(f"БД: {db.stats()}")
+    finally:
+        await llm_session.close()
+        await db.disconnect()
+        await stub.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной замер задержки обработки вопросов")
+    parser.add_argument('--database-url', default=settings.DATABASE_URL)
+    parser.add_argument('--requests', type=int, default=200, help="количество вопросов")
+    parser.add_argument('--concurrency', type=int, default=10, help="одновременных вопросов")
+    parser.add_argument('--llm-latency', type=float, default=0.5, help="задержка заглушки LLM, с")
+    parser.add_argument('--llm-jitter', type=float, default=0.1)
+    parser.add_argument('--llm-port', type=int, default=8099)
+    parser.add_argument('--seed-videos', type=int, default=0, help="загрузить синтетическую выгрузку из N видео")
+    parser.add_argument('--seed-snapshots', type=int, default=24, help="снапшотов на видео при загрузке")
+    parser.add_argument('--init-schema', action='store_true', help="выполнить init_db.sql перед загрузкой")
+    parser.add_argument('--statement-cache', type=int, default=settings.STATEMENT_CACHE_SIZE)
+    for flag, default in (
+            ('fast-path', settings.FAST_PATH_ENABLED),
+            ('sql-cache', settings.SQL_CACHE_ENABLED),
+            ('result-cache', settings.RESULT_CACHE_ENABLED),
+            ('guard', settings.SQL_GUARD_ENABLED),
+            ('single-flight', settings.SINGLE_FLIGHT_ENABLED),
+    ):
+        parser.add_argument(f'--{flag}', action=argparse.BooleanOptionalAction, default=default)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
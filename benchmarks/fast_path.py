@@ -0,0 +1,75 @@
+"""Табличная проверка и замер быстрого пути (вопросы без LLM).
+
+Запуск из корня проекта:
+    python -m benchmarks.fast_path            # проверка корпуса и замер
+    python -m benchmarks.fast_path --check    # только проверка корпуса
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from services.date_extractor import DateExtractor
+from services.fast_path import FastPathPlanner
+
+# Опорное "сейчас" для вопросов без года
+NOW = datetime(2025, 12, 10, 15, 30)
+
+# (вопрос, ожидаемое намерение или None, если вопрос должен уйти в LLM)
+CORPUS = [
+    ("Сколько всего видео есть в системе?", 'total_videos'),
+    ("Сколько видео вышло 5 ноября 2025?", 'videos_published'),
+    ("Сколько видео вышло с 1 по 5 ноября 2025 включительно?", 'videos_published'),
+    ("Сколько видео у креатора с id abc вышло с 1 ноября по 5 декабря 2025?", 'videos_published'),
+    ("Сколько видео набрало больше 100 000 просмотров?", 'videos_over_threshold'),
+    ("На сколько просмотров выросли все видео 28 ноября 2025?", 'growth'),
+    ("На сколько просмотров выросли все видео за прошлую неделю?", 'growth'),
+    ("Сколько разных видео получали новые просмотры 27 ноября 2025?", 'distinct_growing'),
+    # Открытый диапазон и несколько дат - не один день, ответ дает LLM
+    ("Сколько видео вышло с 5 ноября 2025?", None),
+    ("Сколько видео вышло до 5 ноября 2025?", None),
+    ("На сколько просмотров выросли все видео на прошлой неделе и 5 ноября 2025?", None),
+]
+
+
+def check(extractor: DateExtractor) -> int:
+    """Проверка корпуса; возвращает количество расхождений"""
+    failures = 0
+    for question, expected in CORPUS:
+        plan = FastPathPlanner().plan(question, extractor.extract(question))
+        actual = plan.intent if plan is not None else None
+        if actual != expected:
+            failures += 1
+            details = f"{plan.sql} {plan.args}" if plan is not None else "LLM"
+            print(f"FAIL {question!r}\n  ожидалось: {expected}\n  получено:  {actual} ({details})")
+    print(f"Корпус: {len(CORPUS) - failures}/{len(CORPUS)} совпадений")
+    return failures
+
+
+def bench(extractor: DateExtractor, rounds: int) -> float:
+    """Среднее время планирования вопроса корпуса в микросекундах"""
+    planner = FastPathPlanner()
+    asked = [(question, extractor.extract(question)) for question, _ in CORPUS]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for question, date_range in asked:
+            planner.plan(question, date_range)
+    elapsed = time.perf_counter() - started
+    return elapsed / (rounds * len(asked)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка и замер быстрого пути")
+    parser.add_argument('--check', action='store_true', help="только проверка корпуса")
+    parser.add_argument('--rounds', type=int, default=2000, help="количество проходов по корпусу")
+    args = parser.parse_args()
+
+    extractor = DateExtractor(now=lambda: NOW)
+    failures = check(extractor)
+    if not args.check:
+        print(f"Быстрый путь: {bench(extractor, args.rounds):.1f} мкс на вопрос")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
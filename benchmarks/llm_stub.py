@@ -0,0 +1,119 @@
+"""Локальный OpenAI-совместимый сервер с заданной задержкой и заготовленными ответами.
+
+Запуск отдельно от бенчмарка:
+    python -m benchmarks.llm_stub --port 8099 --latency 0.8 --jitter 0.2
+"""
+import argparse
+import asyncio
+import random
+import re
+from typing import List, Optional, Tuple
+
+from aiohttp import web
+
+# Заготовленный SQL по ключевым словам вопроса; первый совпавший шаблон побеждает
+CANNED: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r'разных видео', re.IGNORECASE),
+     "SELECT COUNT(DISTINCT video_id) FROM video_snapshots "
+     "WHERE DATE(created_at) BETWEEN '2025-11-01' AND '2025-11-02' AND delta_views_count > 0"),
+    (re.compile(r'выросл', re.IGNORECASE),
+     "SELECT SUM(delta_views_count) FROM daily_snapshot_totals WHERE day BETWEEN '2025-11-01' AND '2025-11-02'"),
+    (re.compile(r'креатор', re.IGNORECASE),
+     "SELECT COUNT(DISTINCT creator_id) FROM videos"),
+    (re.compile(r'больше|меньше', re.IGNORECASE),
+     "SELECT COUNT(*) FROM videos WHERE views_count > 5000"),
+    (re.compile(r'средн', re.IGNORECASE),
+     "SELECT AVG(views_count) FROM videos"),
+]
+DEFAULT_SQL = "SELECT COUNT(*) FROM videos"
+
+# Пачка вопросов приходит нумерованным списком и ждет ответ в том же формате
+_NUMBERED_QUESTION = re.compile(r'^(\d+)\. (.+)$', re.MULTILINE)
+
+
+def canned_sql(question: str) -> str:
+    return next((sql for pattern, sql in CANNED if pattern.search(question)), DEFAULT_SQL)
+
+
+class StubLLM:
+    """Сервер /chat/completions: ответ после задержки latency ± jitter секунд"""
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.1, host: str = '127.0.0.1', port: int = 8099):
+        self.latency = latency
+        self.jitter = jitter
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.batches = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/chat/completions', self._chat_completions)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _chat_completions(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        self.requests += 1
+
+        messages = payload.get('messages', [])
+        question = next((m['content'] for m in reversed(messages) if m.get('role') == 'user'), '')
+        batch = _NUMBERED_QUESTION.findall(question)
+        if len(batch) > 1:
+            self.batches += 1
+            sql = "\n".join(f"{number}. {canned_sql(text)}" for number, text in batch)
+        else:
+            sql = canned_sql(question)
+
+        await asyncio.sleep(max(0.0, random.uniform(self.latency - self.jitter, self.latency + self.jitter)))
+
+        prompt_tokens = sum(len(m.get('content', '')) for m in messages) // 4
+        return web.json_response({
+            'id': f"stub-{self.requests}",
+            'object': 'chat.completion',
+            'model': payload.get('model', 'stub'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': sql}, 'finish_reason': 'stop'}],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': len(sql) // 4,
+                'total_tokens': prompt_tokens + len(sql) // 4,
+            },
+        })
+
+
+async def _serve(args):
+    stub = StubLLM(args.latency, args.jitter, args.host, args.port)
+    await stub.start()
+    print(f"Заглушка LLM: {stub.base_url}/chat/completions")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stub.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка OpenAI-совместимого LLM сервера")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.5, help="средняя задержка ответа, с")
+    parser.add_argument('--jitter', type=float, default=0.1, help="разброс задержки, с")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Замер скорости загрузчика (строк/с) на синтетических выгрузках разного размера.
+
+Запуск из корня проекта (база будет перезаписана):
+    python -m benchmarks.loader --database-url postgresql://localhost/bench \\
+        --sizes 1000 10000 50000 --modes copy parallel incremental
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+
+# Токены бота и провайдера в бенчмарке не используются
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'benchmark')
+os.environ.setdefault('GROQ_API_KEY', 'benchmark')
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost/video_analytics')
+
+from benchmarks.dataset import write_dataset  # noqa: E402
+from db.config import settings  # noqa: E402
+from db.database import Database  # noqa: E402
+from services.load_data import MODE_COPY, MODE_INCREMENTAL, MODE_PARALLEL  # noqa: E402
+
+
+async def load(db: Database, path: str, mode: str, batch_size: int, workers: int):
+    if mode == MODE_PARALLEL:
+        return await db.parallel_load_json_data(path, workers=workers, batch_size=batch_size)
+    if mode == MODE_INCREMENTAL:
+        return await db.incremental_load_json_data(path, batch_size=batch_size)
+    return await db.bulk_load_json_data(path, batch_size=batch_size)
+
+
+async def run(args):
+    db = Database(args.database_url, partition_months=settings.SNAPSHOT_PARTITION_MONTHS)
+    await db.connect()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in args.sizes:
+                path = os.path.join(tmp, f"videos_{size}.ndjson.gz")
+                rows = write_dataset(path, size, args.snapshots)
+                for mode in args.modes:
+                    if mode == MODE_INCREMENTAL:
+                        # Инкрементальная загрузка поверх той же выгрузки: замер пути без новых данных
+                        await db.bulk_load_json_data(path, batch_size=args.batch_size)
+                    report = await load(db, path, mode, args.batch_size, args.workers)
+                    results.append((size, rows, mode, report))
+    finally:
+        await db.disconnect()
+
+    print(f"{'видео':>8} {'строк':>10} {'режим':<12} {'секунд':>8} {'строк/с':>10}")
+    for size, rows, mode, report in results:
+        print(f"{size:>8} {rows:>10} {mode:<12} {report['seconds']:>8.2f} {report['rows_per_sec']:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер скорости загрузки выгрузки в базу данных")
+    parser.add_argument('--database-url', default=settings.DATABASE_URL)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help="количество видео")
+    parser.add_argument('--snapshots', type=int, default=24, help="снапшотов на видео")
+    parser.add_argument(
+        '--modes', nargs='+', default=[MODE_COPY, MODE_PARALLEL],
+        choices=(MODE_COPY, MODE_PARALLEL, MODE_INCREMENTAL)
+    )
+    parser.add_argument('--batch-size', type=int, default=settings.LOAD_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=settings.LOAD_WORKERS)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
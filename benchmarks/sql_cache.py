@@ -0,0 +1,95 @@
+"""Табличная проверка и замер кэша SQL шаблонов.
+
+Запуск из корня проекта:
+    python -m benchmarks.sql_cache            # проверка корпуса и замер
+    python -m benchmarks.sql_cache --check    # только проверка корпуса
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from services.date_extractor import DateExtractor
+from services.sql_cache import SQLTemplateCache
+
+# Опорное "сейчас" для вопросов без года
+NOW = datetime(2025, 12, 10, 15, 30)
+
+# (сохраненный вопрос, его SQL, новый вопрос, ожидаемый SQL из кэша или None)
+CORPUS = [
+    # Слот встречается в SQL один раз - шаблон
+    ("Сколько видео набрало больше 100000 просмотров?",
+     "SELECT COUNT(*) FROM videos WHERE views_count > 100000",
+     "Сколько видео набрало больше 5000 просмотров?",
+     "SELECT COUNT(*) FROM videos WHERE views_count > 5000"),
+    ("Сколько видео у креатора с id abc вышло с 1 по 5 ноября 2025?",
+     "SELECT COUNT(*) FROM videos WHERE creator_id = 'abc' "
+     "AND video_created_at >= '2025-11-01' AND video_created_at <= '2025-11-05 23:59:59'",
+     "Сколько видео у креатора с id xyz вышло с 3 по 7 ноября 2025?",
+     "SELECT COUNT(*) FROM videos WHERE creator_id = 'xyz' "
+     "AND video_created_at >= '2025-11-03' AND video_created_at <= '2025-11-07 23:59:59'"),
+    # Значение слота повторяется в SQL - только точный вопрос
+    ("Какой процент видео набрал больше 100 просмотров?",
+     "SELECT COUNT(*) FILTER (WHERE views_count > 100) * 100 / COUNT(*) FROM videos",
+     "Какой процент видео набрал больше 5000 просмотров?",
+     None),
+    ("Какой процент видео набрал больше 100 просмотров?",
+     "SELECT COUNT(*) FILTER (WHERE views_count > 100) * 100 / COUNT(*) FROM videos",
+     "Какой процент видео набрал больше 100 просмотров?",
+     "SELECT COUNT(*) FILTER (WHERE views_count > 100) * 100 / COUNT(*) FROM videos"),
+    ("На сколько просмотров выросли все видео 28 ноября 2025?",
+     "SELECT SUM(delta_views_count) FROM daily_snapshot_totals WHERE day = '2025-11-28' "
+     "AND day IN (SELECT day FROM daily_snapshot_totals WHERE day = '2025-11-28')",
+     "На сколько просмотров выросли все видео 27 ноября 2025?",
+     None),
+    ("Сколько видео у креатора с id abc набрало больше 10 лайков?",
+     "SELECT COUNT(*) FROM videos WHERE creator_id = 'abc' AND likes_count > 10 "
+     "AND id IN (SELECT id FROM videos WHERE creator_id = 'abc')",
+     "Сколько видео у креатора с id xyz набрало больше 10 лайков?",
+     None),
+]
+
+
+def check(extractor: DateExtractor) -> int:
+    """Проверка корпуса; возвращает количество расхождений"""
+    failures = 0
+    for stored, sql, asked, expected in CORPUS:
+        cache = SQLTemplateCache()
+        cache.store(stored, extractor.extract(stored), sql)
+        actual = cache.lookup(asked, extractor.extract(asked))
+        if actual != expected:
+            failures += 1
+            print(f"FAIL {stored!r} -> {asked!r}\n  ожидалось: {expected}\n  получено:  {actual}")
+    print(f"Корпус: {len(CORPUS) - failures}/{len(CORPUS)} совпадений")
+    return failures
+
+
+def bench(extractor: DateExtractor, rounds: int) -> float:
+    """Среднее время поиска в кэше по корпусу в микросекундах"""
+    cache = SQLTemplateCache()
+    for stored, sql, _, _ in CORPUS:
+        cache.store(stored, extractor.extract(stored), sql)
+    asked = [(question, extractor.extract(question)) for _, _, question, _ in CORPUS]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for question, date_range in asked:
+            cache.lookup(question, date_range)
+    elapsed = time.perf_counter() - started
+    return elapsed / (rounds * len(asked)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка и замер кэша SQL шаблонов")
+    parser.add_argument('--check', action='store_true', help="только проверка корпуса")
+    parser.add_argument('--rounds', type=int, default=2000, help="количество проходов по корпусу")
+    args = parser.parse_args()
+
+    extractor = DateExtractor(now=lambda: NOW)
+    failures = check(extractor)
+    if not args.check:
+        print(f"Поиск в кэше SQL: {bench(extractor, args.rounds):.1f} мкс на вопрос")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Проверка webhook режима: отправка записанных обновлений Telegram и прием ответов бота заглушкой Bot API.
+
+Бот запускается отдельно и отвечает в заглушку (токен любой правильного формата):
+    TELEGRAM_BOT_TOKEN=123456:TEST BOT_MODE=webhook WEBHOOK_WORKERS=4 \\
+        TELEGRAM_API_URL=http://127.0.0.1:8097 python -m bot
+Затем из корня проекта:
+    python -m benchmarks.webhook_replay updates.ndjson --webhook-url http://127.0.0.1:8080/webhook
+Файл - JSON массив или NDJSON объектов Update; без файла отправляются синтетические
+обновления с вопросами из benchmarks.e2e.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.e2e import QUESTIONS, percentile
+
+
+def load_updates(path: str) -> List[Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read().strip()
+    if text.startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def synthetic_updates(count: int, chats: int) -> List[Dict[str, Any]]:
+    updates = []
+    for index in range(count):
+        chat_id = 1000 + index % chats
+        updates.append({
+            'update_id': index + 1,
+            'message': {
+                'message_id': index + 1,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': 'benchmark'},
+                'text': QUESTIONS[index % len(QUESTIONS)],
+            },
+        })
+    return updates
+
+
+class StubBotAPI:
+    """Заглушка Bot API: принимает sendMessage и отмечает время ответа по чату"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8097):
+        self.host = host
+        self.port = port
+        self.sent: Dict[int, Deque[float]] = defaultdict(deque)
+        self.latencies: List[float] = []
+        self.replies: List[str] = []
+        self.received = asyncio.Event()
+        self.expected = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._method)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _method(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        fields = dict(await request.post()) if request.content_type != 'application/json' else await request.json()
+        if method.lower() != 'sendmessage':
+            return web.json_response({'ok': True, 'result': True})
+
+        chat_id = int(fields['chat_id'])
+        if self.sent[chat_id]:
+            self.latencies.append(time.perf_counter() - self.sent[chat_id].popleft())
+        self.replies.append(str(fields.get('text', '')))
+        if len(self.replies) >= self.expected:
+            self.received.set()
+
+        return web.json_response({'ok': True, 'result': {
+            'message_id': len(self.replies),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': fields.get('text', ''),
+        }})
+
+
+async def run(args):
+    updates = load_updates(args.path) if args.path else synthetic_updates(args.updates, args.chats)
+    messages = [update for update in updates if 'text' in update.get('message', {})]
+
+    stub = StubBotAPI(port=args.api_port)
+    stub.expected = len(messages)
+    await stub.start()
+
+    headers = {'X-Telegram-Bot-Api-Secret-Token': args.secret} if args.secret else {}
+    statuses: Dict[int, int] = defaultdict(int)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def post(session: aiohttp.ClientSession, update: Dict[str, Any]):
+        message = update.get('message')
+        async with semaphore:
+            if message is not None:
+                # Задержка доставки в боте считается от даты сообщения
+                message['date'] = int(time.time())
+                stub.sent[message['chat']['id']].append(time.perf_counter())
+            async with session.post(args.webhook_url, json=update, headers=headers) as response:
+                statuses[response.status] += 1
+
+    started = time.perf_counter()
+    try:
+        async with aiohttp.ClientSession() as session:
+            await asyncio.gather(*(post(session, update) for update in updates))
+        try:
+            await asyncio.wait_for(stub.received.wait(), timeout=args.timeout)
+        except asyncio.TimeoutError:
+            pass
+    finally:
+        await stub.stop()
+    elapsed = time.perf_counter() - started
+
+    print(f"Отправлено обновлений: {len(updates)}, статусы webhook: {dict(statuses)}")
+    print(f"Ответов бота: {len(stub.replies)} из {len(messages)} за {elapsed:.2f} с")
+    print("Время до ответа, мс: " + ", ".join(
+        f"p{q}={percentile(stub.latencies, q) * 1000:.1f}" for q in (50, 95, 99)
+    ))
+    if args.verbose:
+        for reply in stub.replies:
+            print(f"  {reply}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отправка обновлений Telegram в webhook бота")
+    parser.add_argument('path', nargs='?', help="записанные обновления: JSON массив или NDJSON")
+    parser.add_argument('--webhook-url', default='http://127.0.0.1:8080/webhook')
+    parser.add_argument('--secret', default=None, help="WEBHOOK_SECRET бота")
+    parser.add_argument('--api-port', type=int, default=8097, help="порт заглушки Bot API (TELEGRAM_API_URL бота)")
+    parser.add_argument('--updates', type=int, default=100, help="синтетических обновлений без файла")
+    parser.add_argument('--chats', type=int, default=20, help="разных чатов в синтетических обновлениях")
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--timeout', type=float, default=60, help="ожидание ответов, с")
+    parser.add_argument('--verbose', action='store_true')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,36 @@
 import asyncio
 import logging
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+from typing import Any, Dict, Set
+
+from aiohttp import web
 from aiogram import Bot, Dispatcher, Router, types
-from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.filters import Command, CommandObject
+from aiogram.types import FSInputFile, Message
 from aiogram.enums import ParseMode
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
 from db.config import settings
 from db.database import Database
-from services.lm_handler import LLMHandler
+from db.query_log import QueryLog
+from db.result_cache import ResultCache
+from services.dispatcher import QueryDispatcher
+from services.export import export_filename
+from services.lm_handler import LLMHandler, create_llm_session
+from services.metrics import REGISTRY, record_stage, start_metrics_server
+from services.prompt_builder import PromptBuilder
+from services.fast_path import FastPathPlanner
 from services.query_processor import QueryProcessor
+from services.single_flight import SingleFlight
+from services.sql_cache import SQLTemplateCache
+from services.sql_guard import SQLGuard, SQLRejected
+from services.warmer import CacheWarmer
 
 
 logging.basicConfig(level=logging.INFO)
@@ -18,6 +40,10 @@ router = Router()
 
 db: Database = None
 query_processor: QueryProcessor = None
+dispatcher: QueryDispatcher = None
+
+# Обновления, которые сейчас обрабатываются: webhook процесс дожидается их при остановке
+in_flight: Set[asyncio.Task] = set()
 
 
 @router.message(Command("start"))
@@ -34,18 +60,61 @@ async def cmd_start(message: Message):
     • Сколько разных видео получали новые просмотры 27 ноября 2025?
 
     Просто задайте вопрос в свободной форме на русском языке!
+    Списки выгружаются в CSV: /export Топ 100 видео по просмотрам за ноябрь 2025
+    (/export_gz - то же в архиве gzip)
     """
     await message.answer(welcome_text)
 
 
+@router.message(Command("export", "export_gz"))
+async def cmd_export(message: Message, command: CommandObject):
+    """Выгрузка строк ответа в CSV документ"""
+    question = (command.args or '').strip()
+    if not question:
+        await message.answer("Напишите вопрос после команды: /export Топ 100 видео по просмотрам за ноябрь 2025")
+        return
+
+    compress = command.command == 'export_gz'
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, export_filename(compress))
+            # Выгрузка идет через общую очередь, как и обычные вопросы
+            pending = dispatcher.submit(message.chat.id, lambda: query_processor.export(
+                question, path, compress=compress,
+                chunk_size=settings.EXPORT_CHUNK_SIZE, max_rows=settings.EXPORT_MAX_ROWS
+            ))
+            if pending is None:
+                await message.answer("⏳ Бот сейчас перегружен, повторите выгрузку чуть позже")
+                return
+            report = await pending
+
+            caption = f"📄 Строк: {report['rows']}"
+            if report['truncated']:
+                caption += f" (первые {settings.EXPORT_MAX_ROWS})"
+            await message.answer_document(FSInputFile(path), caption=caption)
+
+    except SQLRejected as e:
+        await message.answer(f"Запрос отклонен: {e.reason}. Попробуйте уточнить вопрос")
+    except Exception as e:
+        logger.error(f"Error exporting: {e}")
+        await message.answer(f"Произошла ошибка при выгрузке: {str(e)}")
+
+
 @router.message()
 async def handle_message(message: Message):
     """Обработчик текстовых сообщений"""
     try:
         # processing_msg = await message.answer("🔄 Обрабатываю запрос...")
 
-        # Обработка запроса
-        result = await query_processor.process_query(message.text)
+        # Задержка доставки обновления: от отправки сообщения до обработчика
+        record_stage('telegram_delay', max(0.0, time.time() - message.date.timestamp()))
+
+        # Обработка запроса через общую очередь с ограничением на чат
+        pending = dispatcher.submit(message.chat.id, lambda: query_processor.process_query(message.text))
+        if pending is None:
+            await message.answer("⏳ Бот сейчас перегружен, повторите вопрос чуть позже")
+            return
+        result = await pending
 
         # await processing_msg.delete()
 
@@ -57,33 +126,278 @@ async def handle_message(message: Message):
         await message.answer(f"Произошла ошибка при обработке запроса: {str(e)}")
 
 
-async def main():
-    """Основная функция запуска бота"""
-    global db, query_processor
+async def track_update(handler, event, data):
+    """Учет обрабатываемых обновлений для корректной остановки процесса"""
+    task = asyncio.current_task()
+    in_flight.add(task)
+    try:
+        return await handler(event, data)
+    finally:
+        in_flight.discard(task)
+
 
-    # Инициализация бота
-    bot = Bot(token=settings.TELEGRAM_BOT_TOKEN, parse_mode=ParseMode.HTML)
+async def drain_updates(timeout: float):
+    """Ожидание обработки уже принятых обновлений"""
+    pending = {task for task in in_flight if task is not asyncio.current_task()}
+    if not pending:
+        return
+    logger.info(f"Ожидание обработки {len(pending)} обновлений (до {timeout} с)")
+    _, unfinished = await asyncio.wait(pending, timeout=timeout)
+    if unfinished:
+        logger.warning(f"Не дождались обработки {len(unfinished)} обновлений")
+
+
+def create_bot() -> Bot:
+    """Бот; TELEGRAM_API_URL направляет запросы к локальному Bot API серверу или заглушке"""
+    session = None
+    if settings.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.TELEGRAM_API_URL))
+    return Bot(token=settings.TELEGRAM_BOT_TOKEN, parse_mode=ParseMode.HTML, session=session)
+
+
+def create_dispatcher() -> Dispatcher:
     dp = Dispatcher()
+    dp.update.outer_middleware(track_update)
     dp.include_router(router)
+    return dp
+
+
+async def start_services(worker: int = 0) -> Dict[str, Any]:
+    """Пул БД, LLM и обработка вопросов; в webhook режиме - свои в каждом процессе"""
+    global db, query_processor, dispatcher
 
     # Инициализация базы данных
-    db = Database(settings.DATABASE_URL)
+    result_cache = ResultCache(settings.RESULT_CACHE_SIZE) if settings.RESULT_CACHE_ENABLED else None
+    query_log = None
+    if settings.QUERY_LOG_ENABLED:
+        query_log = QueryLog(
+            plan_sample=settings.QUERY_LOG_PLAN_SAMPLE,
+            slow_ms=settings.QUERY_LOG_SLOW_MS,
+            flush_interval=settings.QUERY_LOG_FLUSH_INTERVAL
+        )
+    db = Database(
+        settings.DATABASE_URL,
+        result_cache=result_cache,
+        statement_cache_size=settings.STATEMENT_CACHE_SIZE,
+        replica_urls=settings.DATABASE_REPLICA_URLS,
+        pool_min_size=settings.DB_POOL_MIN_SIZE,
+        pool_max_size=settings.DB_POOL_MAX_SIZE,
+        max_inactive_lifetime=settings.DB_POOL_MAX_INACTIVE_LIFETIME,
+        replica_check_interval=settings.DB_REPLICA_CHECK_INTERVAL,
+        query_log=query_log
+    )
     await db.connect()
 
-    # Инициализация LLM
-    llm_handler = LLMHandler()
+    # Инициализация LLM: одна keep-alive сессия на все запросы
+    llm_session = create_llm_session()
+    prompt_builder = PromptBuilder(k=settings.PROMPT_EXAMPLES)
+    await prompt_builder.load_schema(db)
+    llm_handler = LLMHandler(session=llm_session, prompt_builder=prompt_builder)
+
+    # Кэш SQL шаблонов
+    sql_cache = None
+    if settings.SQL_CACHE_ENABLED:
+        sql_cache = SQLTemplateCache(
+            max_size=settings.SQL_CACHE_SIZE,
+            ttl=settings.SQL_CACHE_TTL,
+            path=settings.SQL_CACHE_PATH
+        )
+
+    fast_path = FastPathPlanner(use_rollups=settings.ROLLUPS_ENABLED) if settings.FAST_PATH_ENABLED else None
+
+    sql_guard = None
+    if settings.SQL_GUARD_ENABLED:
+        sql_guard = SQLGuard(
+            statement_timeout_ms=settings.SQL_STATEMENT_TIMEOUT_MS,
+            max_cost=settings.SQL_MAX_COST,
+            max_rows=settings.SQL_MAX_PLAN_ROWS
+        )
+
+    single_flight = SingleFlight() if settings.SINGLE_FLIGHT_ENABLED else None
+
+    columnar = None
+    if settings.ANSWER_BACKEND == 'columnar':
+        # NumPy нужен только для колоночного движка
+        from db.columnar import ColumnarEngine
+        columnar = ColumnarEngine(settings.COLUMNAR_PATH)
+
+    warmer = None
+    if settings.WARMER_ENABLED and result_cache is not None:
+        warmer = CacheWarmer(
+            db,
+            top_n=settings.WARMER_TOP_N,
+            concurrency=settings.WARMER_CONCURRENCY,
+            max_questions=settings.WARMER_LOG_SIZE,
+            sql_guard=sql_guard
+        )
+        warmer.attach()
 
     # Инициализация процессора запросов
-    query_processor = QueryProcessor(db, llm_handler)
+    query_processor = QueryProcessor(
+        db, llm_handler, sql_cache, fast_path,
+        sql_guard=sql_guard,
+        regenerations=settings.SQL_REGENERATIONS,
+        single_flight=single_flight,
+        columnar=columnar,
+        warmer=warmer
+    )
+
+    dispatcher = QueryDispatcher(
+        workers=settings.DISPATCH_WORKERS,
+        max_queue=settings.DISPATCH_QUEUE_SIZE,
+        chat_concurrency=settings.DISPATCH_CHAT_CONCURRENCY,
+        chat_queue=settings.DISPATCH_CHAT_QUEUE_SIZE
+    )
+    dispatcher.start()
+
+    # Статистика компонентов публикуется на /metrics
+    components = {
+        'dispatcher': dispatcher, 'fast_path': fast_path, 'sql_cache': sql_cache,
+        'result_cache': result_cache, 'llm': llm_handler, 'single_flight': single_flight,
+        'sql_guard': sql_guard, 'db': db, 'columnar': columnar, 'warmer': warmer,
+        'query_log': query_log,
+    }
+    for name, component in components.items():
+        if component is not None:
+            REGISTRY.register_stats(name, component.stats)
+    metrics_runner = None
+    if settings.METRICS_ENABLED:
+        # У каждого webhook процесса свой порт метрик
+        metrics_runner = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT + worker)
+
+    return {**components, 'llm_session': llm_session, 'metrics_runner': metrics_runner}
+
+
+async def stop_services(services: Dict[str, Any]):
+    """Остановка очереди, сохранение кэшей, итоговая статистика и закрытие соединений"""
+    if services['metrics_runner'] is not None:
+        await services['metrics_runner'].cleanup()
+    await dispatcher.stop()
+    if services['warmer']:
+        await services['warmer'].stop()
+        logger.info(f"Прогрев после загрузки: {services['warmer'].stats()}")
+    logger.info(f"Очередь вопросов: {dispatcher.stats()}")
+    if services['fast_path']:
+        logger.info(f"Быстрый путь: {services['fast_path'].stats()}")
+    if services['sql_cache']:
+        logger.info(f"Кэш SQL шаблонов: {services['sql_cache'].stats()}")
+        services['sql_cache'].save()
+    if services['result_cache']:
+        logger.info(f"Кэш результатов: {services['result_cache'].stats()}")
+    logger.info(f"LLM: {services['llm'].stats()}")
+    if services['single_flight']:
+        logger.info(f"Объединение одинаковых вопросов: {services['single_flight'].stats()}")
+    if services['sql_guard']:
+        logger.info(f"Проверка SQL: {services['sql_guard'].stats()}")
+    if services['columnar']:
+        logger.info(f"Колоночный движок: {services['columnar'].stats()}")
+    logger.info(f"Пулы соединений и подготовленные выражения: {db.stats()}")
+    if services['query_log']:
+        logger.info(f"Журнал запросов: {services['query_log'].stats()}")
+    await db.disconnect()
+    await services['llm_session'].close()
+
+
+async def run_polling():
+    """Получение обновлений long polling в одном процессе"""
+    bot = create_bot()
+    dp = create_dispatcher()
+    services = await start_services()
 
     logger.info("Bot is starting...")
 
     try:
         await dp.start_polling(bot)
     finally:
-        await db.disconnect()
+        await stop_services(services)
         await bot.session.close()
 
 
+def create_webhook_app(worker: int = 0) -> web.Application:
+    """aiohttp приложение с обработчиком webhook и запуском/остановкой сервисов процесса"""
+    bot = create_bot()
+    dp = create_dispatcher()
+    services: Dict[str, Any] = {}
+
+    async def on_startup():
+        services.update(await start_services(worker))
+        # Webhook регистрируется один раз, первым процессом
+        if worker == 0 and settings.WEBHOOK_URL:
+            await bot.set_webhook(
+                settings.WEBHOOK_URL,
+                secret_token=settings.WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types()
+            )
+            logger.info(f"Webhook зарегистрирован: {settings.WEBHOOK_URL}")
+
+    async def on_shutdown():
+        # Новые запросы уже не принимаются; принятые обновления дорабатываются до закрытия сессии бота
+        await drain_updates(settings.WEBHOOK_SHUTDOWN_TIMEOUT)
+        if services:
+            await stop_services(services)
+
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+
+    app = web.Application()
+    # Остановка сервисов идет раньше закрытия сессии бота обработчиком webhook
+    setup_application(app, dp, bot=bot)
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=settings.WEBHOOK_SECRET).register(
+        app, path=settings.WEBHOOK_PATH
+    )
+    return app
+
+
+async def serve_webhook(worker: int = 0, reuse_port: bool = False):
+    """Webhook сервер одного процесса до SIGTERM или SIGINT"""
+    runner = web.AppRunner(create_webhook_app(worker), access_log=None)
+    await runner.setup()
+    try:
+        site = web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT, reuse_port=reuse_port)
+        await site.start()
+        logger.info(f"Webhook процесс {worker} слушает {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}{settings.WEBHOOK_PATH}")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        logger.info(f"Webhook процесс {worker} остановлен")
+
+
+def _webhook_worker(worker: int):
+    asyncio.run(serve_webhook(worker, reuse_port=True))
+
+
+def run_webhook(workers: int):
+    """Webhook в нескольких процессах на одном порту (SO_REUSEPORT) за локальным reverse proxy"""
+    if workers <= 1:
+        asyncio.run(serve_webhook())
+        return
+
+    processes = [
+        multiprocessing.Process(target=_webhook_worker, args=(worker,), name=f"webhook-{worker}")
+        for worker in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    # SIGTERM передается процессам; SIGINT из терминала они получают сами
+    signal.signal(signal.SIGTERM, lambda *_: [process.terminate() for process in processes])
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for process in processes:
+        process.join()
+
+
+def main():
+    """Основная функция запуска бота"""
+    if settings.BOT_MODE == 'webhook':
+        run_webhook(settings.WEBHOOK_WORKERS)
+    else:
+        asyncio.run(run_polling())
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
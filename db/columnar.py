@@ -0,0 +1,270 @@
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+# Имя каталога текущего поколения; файл заменяется атомарно после записи всех колонок
+CURRENT_FILE = 'CURRENT'
+FETCH_SIZE = 100000
+
+EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+# Коды видео - позиции в порядке video_created_at, коды креаторов - позиции в словаре creators
+_CODES = """
+    WITH creators AS (
+        SELECT creator_id, (ROW_NUMBER() OVER (ORDER BY creator_id) - 1)::int AS code
+        FROM (SELECT DISTINCT creator_id FROM videos) d
+    ),
+    codes AS (
+        SELECT v.id, v.creator_id, c.code AS creator,
+               (ROW_NUMBER() OVER (ORDER BY v.video_created_at, v.id) - 1)::int AS video
+        FROM videos v JOIN creators c USING (creator_id)
+    )
+"""
+
+VIDEOS_QUERY = _CODES + """
+    SELECT k.id, k.creator_id, k.creator,
+           (EXTRACT(EPOCH FROM v.video_created_at) * 1000000)::bigint,
+           v.views_count, v.likes_count, v.comments_count, v.reports_count
+    FROM videos v JOIN codes k USING (id)
+    ORDER BY k.video
+"""
+VIDEO_COLUMNS: Tuple[Tuple[str, Any], ...] = (
+    ('id', str), ('creator_id', str), ('creator', np.int32), ('video_created_at', np.int64),
+    ('views_count', np.int64), ('likes_count', np.int64), ('comments_count', np.int64), ('reports_count', np.int64),
+)
+
+SNAPSHOTS_QUERY = _CODES + """
+    SELECT k.video, k.creator,
+           (EXTRACT(EPOCH FROM s.created_at) * 1000000)::bigint,
+           s.delta_views_count, s.delta_likes_count, s.delta_comments_count, s.delta_reports_count
+    FROM video_snapshots s JOIN codes k ON k.id = s.video_id
+    ORDER BY s.created_at
+"""
+SNAPSHOT_COLUMNS: Tuple[Tuple[str, Any], ...] = (
+    ('video', np.int32), ('creator', np.int32), ('created_at', np.int64),
+    ('delta_views_count', np.int64), ('delta_likes_count', np.int64),
+    ('delta_comments_count', np.int64), ('delta_reports_count', np.int64),
+)
+
+
+def to_micros(value: datetime) -> int:
+    """Метка времени без зоны в микросекундах от эпохи, как EXTRACT(EPOCH ...) в Postgres"""
+    return (value - EPOCH) // _MICROSECOND
+
+
+async def build_columnar_cache(db, path: str) -> Dict[str, Any]:
+    """Выгрузка videos и video_snapshots в колонки .npy для ColumnarEngine; возвращает meta"""
+    started = time.perf_counter()
+
+    async with db.pool.acquire() as connection:
+        # Колонки и поколение читаются из одного снимка данных
+        async with connection.transaction(isolation='repeatable_read', readonly=True):
+            generation = await connection.fetchval("SELECT generation FROM ingest_state WHERE id") or 0
+            videos = await _fetch_columns(connection, VIDEOS_QUERY, VIDEO_COLUMNS)
+            snapshots = await _fetch_columns(connection, SNAPSHOTS_QUERY, SNAPSHOT_COLUMNS)
+
+    # Словари: код -> исходный идентификатор
+    creator_count = int(videos['creator'].max()) + 1 if len(videos['creator']) else 0
+    creators = np.empty(creator_count, dtype=videos['creator_id'].dtype)
+    creators[videos['creator']] = videos['creator_id']
+    columns = {
+        'creators': creators,
+        'video_ids': videos['id'],
+        **{f"videos.{name}": videos[name] for name, _ in VIDEO_COLUMNS[2:]},
+        **{f"snapshots.{name}": snapshots[name] for name, _ in SNAPSHOT_COLUMNS},
+    }
+    meta = {
+        'version': FORMAT_VERSION,
+        'generation': generation,
+        'videos': len(videos['id']),
+        'snapshots': len(snapshots['video']),
+        'creators': len(creators),
+        'built_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+    # Новое поколение пишется в отдельный каталог, читатели переключаются по файлу CURRENT
+    os.makedirs(path, exist_ok=True)
+    name = f"gen-{generation}-{os.getpid()}"
+    target = os.path.join(path, name)
+    shutil.rmtree(target, ignore_errors=True)
+    os.makedirs(target)
+    for column, values in columns.items():
+        np.save(os.path.join(target, f"{column}.npy"), values)
+    with open(os.path.join(target, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    current = os.path.join(path, CURRENT_FILE)
+    with open(f"{current}.tmp", 'w', encoding='utf-8') as f:
+        f.write(name)
+    os.replace(f"{current}.tmp", current)
+
+    # Открытые отображения старых файлов остаются действительными после удаления
+    for entry in os.listdir(path):
+        if entry.startswith('gen-') and entry != name:
+            shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+
+    logger.info(
+        f"Колоночный кэш поколения {generation} записан в {target}: {meta['videos']} видео, "
+        f"{meta['snapshots']} снапшотов за {time.perf_counter() - started:.2f} с"
+    )
+    return meta
+
+
+async def _fetch_columns(connection, query: str, columns: Tuple[Tuple[str, Any], ...]) -> Dict[str, np.ndarray]:
+    """Чтение результата запроса порциями по FETCH_SIZE строк в массивы по колонкам"""
+    chunks = {name: [] for name, _ in columns}
+    cursor = await connection.cursor(query)
+    while True:
+        rows = await cursor.fetch(FETCH_SIZE)
+        if not rows:
+            break
+        for position, (name, dtype) in enumerate(columns):
+            chunks[name].append(np.array([row[position] for row in rows], dtype=dtype))
+    return {
+        name: np.concatenate(chunks[name]) if chunks[name] else np.empty(0, dtype=dtype)
+        for name, dtype in columns
+    }
+
+
+class ColumnarEngine:
+    """Ответы быстрого пути векторными операциями над колонками NumPy из кэша загрузчика"""
+
+    INTENTS = ('total_videos', 'videos_published', 'videos_over_threshold', 'growth', 'distinct_growing')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.generation: Optional[int] = None
+        self.meta: Dict[str, Any] = {}
+        self.answered = 0
+        self.stale = 0
+        self._columns: Dict[str, np.ndarray] = {}
+        self._creators: Dict[str, int] = {}
+        self._current: Optional[str] = None
+
+    def ready(self, generation: Optional[int]) -> bool:
+        """Кэш загружен и построен для текущего поколения данных в Postgres"""
+        if generation is None:
+            return False
+        if self.generation != generation:
+            self._reload()
+        if self.generation != generation:
+            self.stale += 1
+            return False
+        return True
+
+    def supports(self, plan) -> bool:
+        return plan.intent in self.INTENTS
+
+    def execute(self, plan) -> Any:
+        """Скалярный ответ на план быстрого пути с той же семантикой, что у его SQL"""
+        self.answered += 1
+        return getattr(self, f"_{plan.intent}")(plan.params)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'generation': self.generation if self.generation is not None else -1,
+            'videos': self.meta.get('videos', 0),
+            'snapshots': self.meta.get('snapshots', 0),
+            'answered': self.answered,
+            'stale': self.stale,
+        }
+
+    def _reload(self):
+        """Отображение в память колонок каталога, на который указывает CURRENT"""
+        try:
+            with open(os.path.join(self.path, CURRENT_FILE), 'r', encoding='utf-8') as f:
+                current = f.read().strip()
+        except FileNotFoundError:
+            return
+        if current == self._current:
+            return
+
+        directory = os.path.join(self.path, current)
+        try:
+            with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') != FORMAT_VERSION:
+                logger.warning(f"Колоночный кэш {directory} другой версии, нужна перезагрузка данных")
+                return
+            columns = {
+                entry[:-len('.npy')]: np.load(os.path.join(directory, entry), mmap_mode='r')
+                for entry in os.listdir(directory) if entry.endswith('.npy')
+            }
+        except (OSError, ValueError) as e:
+            # Каталог мог быть удален загрузчиком следующего поколения
+            logger.warning(f"Колоночный кэш {directory} не прочитан: {e}")
+            return
+
+        self._columns = columns
+        self._creators = {str(creator): code for code, creator in enumerate(columns['creators'])}
+        self._current = current
+        self.meta = meta
+        self.generation = meta['generation']
+        logger.info(f"Колоночный кэш поколения {self.generation}: {meta['videos']} видео, {meta['snapshots']} снапшотов")
+
+    def _total_videos(self, params: Dict[str, Any]) -> int:
+        return len(self._columns['video_ids'])
+
+    def _videos_published(self, params: Dict[str, Any]) -> int:
+        start, end = self._time_slice('videos.video_created_at', params)
+        mask = self._creator_mask('videos.creator', params, start, end)
+        return end - start if mask is None else int(np.count_nonzero(mask))
+
+    def _videos_over_threshold(self, params: Dict[str, Any]) -> int:
+        values = self._columns[f"videos.{params['metric']}"]
+        if params['operator'] == '>':
+            mask = values > params['threshold']
+        else:
+            mask = values < params['threshold']
+        creators = self._creator_mask('videos.creator', params, 0, len(values))
+        if creators is not None:
+            mask &= creators
+        return int(np.count_nonzero(mask))
+
+    def _growth(self, params: Dict[str, Any]) -> Optional[int]:
+        start, end = self._time_slice('snapshots.created_at', params)
+        deltas = self._columns[f"snapshots.delta_{params['metric']}"][start:end]
+        mask = self._creator_mask('snapshots.creator', params, start, end)
+        if mask is not None:
+            deltas = deltas[mask]
+        # SUM по пустому множеству строк в Postgres - NULL
+        return int(deltas.sum()) if len(deltas) else None
+
+    def _distinct_growing(self, params: Dict[str, Any]) -> int:
+        start, end = self._time_slice('snapshots.created_at', params)
+        mask = self._columns[f"snapshots.delta_{params['metric']}"][start:end] > 0
+        creators = self._creator_mask('snapshots.creator', params, start, end)
+        if creators is not None:
+            mask &= creators
+        seen = np.zeros(len(self._columns['video_ids']), dtype=bool)
+        seen[self._columns['snapshots.video'][start:end][mask]] = True
+        return int(np.count_nonzero(seen))
+
+    def _time_slice(self, column: str, params: Dict[str, Any]) -> Tuple[int, int]:
+        """Границы полуинтервала [start, end) в отсортированной колонке времени"""
+        values = self._columns[column]
+        if 'start' not in params:
+            return 0, len(values)
+        start = int(np.searchsorted(values, to_micros(params['start']), side='left'))
+        end = int(np.searchsorted(values, to_micros(params['end']), side='left'))
+        return start, max(start, end)
+
+    def _creator_mask(self, column: str, params: Dict[str, Any], start: int, end: int) -> Optional[np.ndarray]:
+        """Маска строк креатора из плана или None без фильтра по креатору"""
+        if 'creator_id' not in params:
+            return None
+        code = self._creators.get(params['creator_id'])
+        if code is None:
+            return np.zeros(end - start, dtype=bool)
+        return self._columns[column][start:end] == code
@@ -1,3 +1,5 @@
+from typing import List, Optional
+
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -15,6 +17,111 @@ class Settings(BaseSettings):
     LLM_BASE_URL: str = "https://api.groq.com/openai/v1"
     LLM_TEMPERATURE: float = 0.1
 
+    # HTTP клиент LLM: пул соединений, лимиты провайдера, таймауты и повторы
+    LLM_POOL_SIZE: int = 10
+    LLM_KEEPALIVE_TIMEOUT: float = 60
+    LLM_MAX_CONCURRENCY: int = 4
+    LLM_RATE_LIMIT_RPM: float = 30
+    LLM_RATE_LIMIT_TPM: float = 0
+    LLM_TIMEOUT: float = 30
+    LLM_CONNECT_TIMEOUT: float = 5
+    LLM_MAX_RETRIES: int = 3
+    LLM_BACKOFF_BASE: float = 0.5
+    LLM_BACKOFF_MAX: float = 10
+
+    # Пачки вопросов к LLM: окно сбора и максимальный размер (0 или 1 - без пачек)
+    LLM_BATCH_WINDOW_MS: float = 50
+    LLM_BATCH_SIZE: int = 8
+
+    # Промпт: число похожих примеров в запросе
+    PROMPT_EXAMPLES: int = 2
+
+    # Загрузка данных
+    LOAD_BATCH_SIZE: int = 50000
+    LOAD_WORKERS: int = 4
+    # Секции video_snapshots по created_at: размер в месяцах и срок хранения (0 - без удаления)
+    SNAPSHOT_PARTITION_MONTHS: int = 1
+    SNAPSHOT_RETENTION_MONTHS: int = 0
+
+    # Очередь вопросов: обработчики, общий лимит и лимиты на чат
+    DISPATCH_WORKERS: int = 8
+    DISPATCH_QUEUE_SIZE: int = 100
+    DISPATCH_CHAT_CONCURRENCY: int = 1
+    DISPATCH_CHAT_QUEUE_SIZE: int = 5
+
+    # Быстрый путь без LLM для частых вопросов
+    FAST_PATH_ENABLED: bool = True
+    ROLLUPS_ENABLED: bool = True
+    # Ответы быстрого пути: postgres или columnar (колонки NumPy из кэша, который строит загрузчик)
+    ANSWER_BACKEND: str = "postgres"
+    COLUMNAR_PATH: str = "columnar_cache"
+
+    # /export: строк за одно чтение курсора и предел строк в файле (0 - без предела)
+    EXPORT_CHUNK_SIZE: int = 5000
+    EXPORT_MAX_ROWS: int = 1000000
+
+    # Кэш SQL шаблонов
+    SQL_CACHE_ENABLED: bool = True
+    SQL_CACHE_SIZE: int = 1000
+    SQL_CACHE_TTL: int = 86400
+    SQL_CACHE_PATH: Optional[str] = None
+
+    # Объединение одинаковых одновременных вопросов
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    # Кэш результатов запросов
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_SIZE: int = 1000
+
+    # Прогрев после загрузки: SQL самых частых вопросов выполняется на новом поколении данных
+    # (нужен кэш результатов - он же дает подписку на уведомления загрузчика)
+    WARMER_ENABLED: bool = True
+    WARMER_TOP_N: int = 50
+    WARMER_CONCURRENCY: int = 2
+    WARMER_LOG_SIZE: int = 1000
+
+    # Проверка SQL от LLM: read-only транзакция, таймаут и пороги оценки EXPLAIN
+    SQL_GUARD_ENABLED: bool = True
+    SQL_STATEMENT_TIMEOUT_MS: int = 5000
+    SQL_MAX_COST: float = 5e6
+    SQL_MAX_PLAN_ROWS: float = 5e7
+    SQL_REGENERATIONS: int = 1
+
+    # Журнал запросов в таблице query_log для советника по индексам: план EXPLAIN сохраняется
+    # для запросов от QUERY_LOG_SLOW_MS и для доли QUERY_LOG_PLAN_SAMPLE остальных
+    QUERY_LOG_ENABLED: bool = True
+    QUERY_LOG_SLOW_MS: float = 200
+    QUERY_LOG_PLAN_SAMPLE: float = 0.05
+    QUERY_LOG_FLUSH_INTERVAL: float = 5
+
+    # Подготовленные выражения на соединение пула (0 - без подготовки)
+    STATEMENT_CACHE_SIZE: int = 100
+
+    # Пулы соединений: DATABASE_URL - основной сервер для загрузки, реплики - для запросов на чтение
+    # DATABASE_REPLICA_URLS задается JSON списком: '["postgresql://replica1/video_analytics"]'
+    DATABASE_REPLICA_URLS: List[str] = []
+    DB_POOL_MIN_SIZE: int = 10
+    DB_POOL_MAX_SIZE: int = 10
+    DB_POOL_MAX_INACTIVE_LIFETIME: float = 300
+    DB_REPLICA_CHECK_INTERVAL: float = 5
+
+    # Получение обновлений: polling или webhook (aiohttp сервер, несколько процессов за reverse proxy)
+    BOT_MODE: str = "polling"
+    WEBHOOK_URL: Optional[str] = None
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_SECRET: Optional[str] = None
+    WEBHOOK_HOST: str = "127.0.0.1"
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_WORKERS: int = 1
+    WEBHOOK_SHUTDOWN_TIMEOUT: float = 30
+    # Другой Bot API сервер: локальный telegram-bot-api или заглушка для проверки webhook
+    TELEGRAM_API_URL: Optional[str] = None
+
+    # Метрики Prometheus на /metrics
+    METRICS_ENABLED: bool = True
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 9100
+
     class Config:
         env_file = ".env"
 
@@ -1,67 +1,424 @@
+import asyncio
 import asyncpg
 import logging
 import json
-from typing import Any, Dict, List, Optional
-from datetime import datetime
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from datetime import date, datetime
 
+from db.json_stream import FORMAT_AUTO, iter_videos
+from db.pools import CONNECTION_ERRORS, PoolNode, ReplicaRouter
+from db.query_log import QueryLog
+from db.result_cache import ResultCache
+from services.metrics import annotate, span
 
 logger = logging.getLogger(__name__)
 
+# Порядок колонок для COPY
+VIDEO_COLUMNS = (
+    'id', 'creator_id', 'video_created_at',
+    'views_count', 'likes_count', 'comments_count', 'reports_count',
+    'created_at', 'updated_at',
+)
+
+SNAPSHOT_COLUMNS = (
+    'id', 'video_id',
+    'views_count', 'likes_count', 'comments_count', 'reports_count',
+    'delta_views_count', 'delta_likes_count',
+    'delta_comments_count', 'delta_reports_count',
+    'created_at', 'updated_at',
+)
+
+# Позиции полей в записях, по которым сравниваются водяные знаки
+VIDEO_UPDATED_AT = VIDEO_COLUMNS.index('updated_at')
+SNAPSHOT_CREATED_AT = SNAPSHOT_COLUMNS.index('created_at')
+
+DEFAULT_BATCH_SIZE = 50000
+DEFAULT_WORKERS = 4
+DEFAULT_STATEMENT_CACHE_SIZE = 100
+# Строк за одно чтение курсора в stream_query
+DEFAULT_STREAM_CHUNK_SIZE = 5000
+
+# Пулы соединений (значения по умолчанию asyncpg)
+DEFAULT_POOL_MIN_SIZE = 10
+DEFAULT_POOL_MAX_SIZE = 10
+DEFAULT_MAX_INACTIVE_LIFETIME = 300.0
+DEFAULT_REPLICA_CHECK_INTERVAL = 5.0
+
+# Параллельная загрузка через staging таблицы
+LOAD_TABLES = ('videos', 'video_snapshots')
+STAGING_SUFFIX = '_staging'
+SWAP_LOCK_TIMEOUT = '5s'
+SWAP_ATTEMPTS = 3
+
+# Дневные агрегаты снапшотов: колонка -> выражение над video_snapshots s
+ROLLUP_COLUMNS = {
+    'snapshots_count': 'COUNT(*)',
+    'active_videos': 'COUNT(DISTINCT s.video_id)',
+    'delta_views_count': 'SUM(s.delta_views_count)',
+    'delta_likes_count': 'SUM(s.delta_likes_count)',
+    'delta_comments_count': 'SUM(s.delta_comments_count)',
+    'delta_reports_count': 'SUM(s.delta_reports_count)',
+    'videos_with_new_views': 'COUNT(DISTINCT s.video_id) FILTER (WHERE s.delta_views_count > 0)',
+    'videos_with_new_likes': 'COUNT(DISTINCT s.video_id) FILTER (WHERE s.delta_likes_count > 0)',
+    'videos_with_new_comments': 'COUNT(DISTINCT s.video_id) FILTER (WHERE s.delta_comments_count > 0)',
+    'videos_with_new_reports': 'COUNT(DISTINCT s.video_id) FILTER (WHERE s.delta_reports_count > 0)',
+}
+# (таблица, с разбивкой по креатору)
+ROLLUP_TABLES = (
+    ('daily_snapshot_totals', False),
+    ('daily_creator_snapshot_totals', True),
+)
+
+# Секционирование снапшотов по диапазонам created_at
+PARTITIONED_TABLE = 'video_snapshots'
+DEFAULT_PARTITION_MONTHS = 1
+_PARTITION_NAME = re.compile(r'_p(\d{4})_(\d{2})$')
+
+# Канал уведомлений о новом поколении данных
+GENERATION_CHANNEL = 'data_generation'
+LISTENER_RETRY_INTERVAL = 30
+
+# Временные таблицы инкрементальной загрузки
+INCOMING_SUFFIX = '_incoming'
+
+INIT_SQL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'init_db.sql')
+
+_INDEX_PATTERN = re.compile(
+    r'CREATE\s+INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s+ON\s+(\w+)\s*((?:USING\s+\w+\s*)?\(.*?\))\s*;',
+    re.IGNORECASE
+)
+
+
+def schema_indexes(tables: Tuple[str, ...] = LOAD_TABLES, path: str = INIT_SQL_PATH) -> List[Tuple[str, str, str]]:
+    """Вторичные индексы таблиц из init_db.sql: (имя, таблица, определение)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        indexes = [match.groups() for match in _INDEX_PATTERN.finditer(f.read())]
+    return [index for index in indexes if index[1] in tables]
+
+
+def _month_start(index: int) -> date:
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_bounds(value: date, months: int = DEFAULT_PARTITION_MONTHS) -> Tuple[date, date]:
+    """Границы [начало, конец) секции, в которую попадает дата value"""
+    index = value.year * 12 + value.month - 1
+    index -= index % months
+    return _month_start(index), _month_start(index + months)
+
+
+def partition_name(table: str, start: date) -> str:
+    """Имя секции таблицы, начинающейся с даты start"""
+    return f"{table}_p{start:%Y_%m}"
+
 
 class Database:
-    def __init__(self, connection_string: str):
+    def __init__(
+            self,
+            connection_string: str,
+            result_cache: Optional[ResultCache] = None,
+            statement_cache_size: int = DEFAULT_STATEMENT_CACHE_SIZE,
+            partition_months: int = DEFAULT_PARTITION_MONTHS,
+            retention_months: int = 0,
+            replica_urls: Sequence[str] = (),
+            pool_min_size: int = DEFAULT_POOL_MIN_SIZE,
+            pool_max_size: int = DEFAULT_POOL_MAX_SIZE,
+            max_inactive_lifetime: float = DEFAULT_MAX_INACTIVE_LIFETIME,
+            replica_check_interval: float = DEFAULT_REPLICA_CHECK_INTERVAL,
+            query_log: Optional[QueryLog] = None
+    ):
         self.connection_string = connection_string
         self.pool: Optional[asyncpg.Pool] = None
 
+        # Загрузка и запись идут в основной сервер, запросы на чтение - на реплики, если они заданы
+        pool_options = {
+            'min_size': min(pool_min_size, pool_max_size),
+            'max_size': pool_max_size,
+            'max_inactive_connection_lifetime': max_inactive_lifetime,
+        }
+        self.primary = PoolNode('primary', connection_string, **pool_options)
+        self.replicas: Optional[ReplicaRouter] = None
+        if replica_urls:
+            self.replicas = ReplicaRouter(
+                [PoolNode(f"replica{index}", url, **pool_options) for index, url in enumerate(replica_urls)],
+                check_interval=replica_check_interval
+            )
+
+        # Размер секции снапшотов и срок их хранения в месяцах (0 - хранить все)
+        self.partition_months = max(1, partition_months)
+        self.retention_months = retention_months
+
+        # Подготовленные выражения хранятся в каждом соединении пула
+        self.statement_cache_size = statement_cache_size
+        self.statement_hits = 0
+        self.statement_misses = 0
+
+        # Журнал выполненных запросов на чтение для советника по индексам (services.index_advisor)
+        self.query_log = query_log
+
+        # Кэш результатов действителен, пока не сменилось поколение данных
+        self.result_cache = result_cache
+        self.generation = 0
+        self._listener: Optional[asyncpg.Connection] = None
+        self._listener_retry_at = 0.0
+        self._generation_listeners: List[Callable[[int], None]] = []
+
     async def connect(self):
-        """Создание пула соединений"""
-        self.pool = await asyncpg.create_pool(self.connection_string)
+        """Создание пулов соединений основного сервера и реплик"""
+        await self.primary.open()
+        self.pool = self.primary.pool
         logger.info("Пул соединений с базой данных создан")
+        if self.query_log is not None:
+            await self.query_log.start(self.primary.pool)
+
+        if self.replicas is not None:
+            await self.replicas.start()
+            available = sum(replica.healthy for replica in self.replicas.replicas)
+            logger.info(f"Реплики для чтения: {available} из {len(self.replicas.replicas)} доступны")
+
+        if self.result_cache is not None:
+            await self._listen_generation()
 
     async def disconnect(self):
         """Закрытие пула соединений"""
+        if self._listener is not None:
+            listener, self._listener = self._listener, None
+            await listener.close()
+        if self.query_log is not None:
+            await self.query_log.stop()
+        if self.replicas is not None:
+            await self.replicas.stop()
         if self.pool:
-            await self.pool.close()
+            await self.primary.close()
+            self.pool = None
             logger.info("Пул соединений с базой данных закрыт")
 
     async def execute_query(self, query: str, *args) -> List[Dict[str, Any]]:
         """Выполнение SQL запроса и возврат списка словарей"""
-        async with self.pool.acquire() as connection:
-            try:
-                rows = await connection.fetch(query, *args)
+        key = await self._cache_key('rows', query, args)
+        # Поколение фиксируется до запроса: загрузка могла завершиться во время выполнения
+        generation = self.generation
+        if key is not None:
+            found, rows = self.result_cache.get(key, generation)
+            if found:
+                annotate(result_cache='hit')
                 return [dict(row) for row in rows]
-            except Exception as e:
-                logger.error(f"Ошибка при выполнении SQL-запроса: {e}")
-                raise
 
-    async def execute_scalar(self, query: str, *args) -> Any:
-        """Выполнение SQL запроса и возврат скалярного значения"""
-        async with self.pool.acquire() as connection:
-            try:
-                result = await connection.fetchval(query, *args)
+        try:
+            rows = await self._read('fetch', query, args)
+            result = [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Ошибка при выполнении SQL-запроса: {e}")
+            raise
+
+        if key is not None:
+            self.result_cache.put(key, generation, [dict(row) for row in result])
+        return result
+
+    async def execute_scalar(self, query: str, *args, guard=None) -> Any:
+        """Выполнение SQL запроса и возврат скалярного значения
+
+        guard (services.sql_guard.SQLGuard) - выполнение в read-only транзакции
+        с statement_timeout после проверки плана EXPLAIN
+        """
+        key = await self._cache_key('scalar', query, args)
+        # Поколение фиксируется до запроса: загрузка могла завершиться во время выполнения
+        generation = self.generation
+        if key is not None:
+            found, result = self.result_cache.get(key, generation)
+            if found:
+                annotate(result_cache='hit')
                 return result
-            except Exception as e:
-                logger.error(f"Ошибка при выполнении scalar-запроса: {e}")
-                raise
 
-    async def load_json_data(self, json_path: str):
+        try:
+            result = await self._read('fetchval', query, args, guard)
+        except Exception as e:
+            logger.error(f"Ошибка при выполнении scalar-запроса: {e}")
+            raise
+
+        if key is not None:
+            self.result_cache.put(key, generation, result)
+        return result
+
+    @asynccontextmanager
+    async def stream_query(
+            self, query: str, *args, chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE, guard=None
+    ) -> AsyncIterator[Tuple[List[str], AsyncIterator[List[asyncpg.Record]]]]:
+        """Результат запроса через курсор: (имена колонок, асинхронный итератор порций по chunk_size строк)
+
+        Соединение и read-only транзакция держатся до выхода из блока async with;
+        в памяти одновременно только одна порция строк. Кэш результатов не используется.
+        """
+        node = self._read_node()
+        async with node.acquire() as connection:
+            annotate(db_node=node.name)
+            async with connection.transaction(readonly=True):
+                if guard is not None:
+                    await self._check_plan(connection, query, args, guard)
+                statement = await connection.prepare(query)
+                columns = [attribute.name for attribute in statement.get_attributes()]
+
+                async def chunks() -> AsyncIterator[List[asyncpg.Record]]:
+                    cursor = await statement.cursor(*args)
+                    while True:
+                        with span('db_fetch'):
+                            rows = await cursor.fetch(chunk_size)
+                        if not rows:
+                            return
+                        yield rows
+
+                yield columns, chunks()
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики кэша подготовленных выражений, состояние и ожидание пулов соединений"""
+        total = self.statement_hits + self.statement_misses
+        pools = {f"pool_{key}": value for key, value in self.primary.stats().items() if key != 'healthy'}
+        if self.replicas is not None:
+            pools.update(self.replicas.stats())
+        return {
+            **pools,
+            'statement_hits': self.statement_hits,
+            'statement_misses': self.statement_misses,
+            'statement_hit_rate': self.statement_hits / total if total else 0.0,
+        }
+
+    def _read_node(self) -> PoolNode:
+        """Наименее загруженная подходящая реплика или основной сервер"""
+        replica = self.replicas.choose(self.generation) if self.replicas is not None else None
+        return replica or self.primary
+
+    async def _read(self, method: str, query: str, args: tuple, guard=None):
+        """Запрос на чтение на наименее загруженной реплике; при обрыве соединения - на основном сервере"""
+        node = self._read_node()
+        if node is not self.primary:
+            try:
+                return await self._execute_on(node, method, query, args, guard)
+            except CONNECTION_ERRORS as e:
+                self.replicas.mark_failed(node, e)
+        return await self._execute_on(self.primary, method, query, args, guard)
+
+    async def _execute_on(self, node: PoolNode, method: str, query: str, args: tuple, guard=None):
+        async with node.acquire() as connection:
+            annotate(db_node=node.name)
+            started = time.perf_counter()
+            plan = None
+            with span('db_query'):
+                if guard is None:
+                    result = await self._run_prepared(connection, method, query, args)
+                else:
+                    result, plan = await self._run_guarded(connection, method, query, args, guard)
+
+            if self.query_log is not None:
+                duration = time.perf_counter() - started
+                rows = len(result) if isinstance(result, list) else 1
+                # Недостающий план строит фоновая запись журнала, соединение сразу возвращается в пул
+                self.query_log.add(query, duration, rows, plan, node.name, args)
+            return result
+
+    async def _run_prepared(self, connection, method: str, query: str, args: tuple):
+        """Выполнение запроса через подготовленное выражение соединения"""
+        if not self.statement_cache_size:
+            return await getattr(connection, method)(query, *args)
+
+        statement, hit = await connection.prepared(query, self.statement_cache_size)
+        if hit:
+            self.statement_hits += 1
+        else:
+            self.statement_misses += 1
+
+        try:
+            return await getattr(statement, method)(*args)
+        except asyncpg.exceptions.InvalidCachedStatementError:
+            # Таблицы заменены загрузчиком после подготовки выражения
+            connection.forget(query)
+            statement, _ = await connection.prepared(query, self.statement_cache_size)
+            return await getattr(statement, method)(*args)
+
+    async def _run_guarded(self, connection, method: str, query: str, args: tuple, guard):
+        """Оценка плана и выполнение в read-only транзакции с ограничением времени; (результат, план)"""
+        async with connection.transaction(readonly=True):
+            plan = await self._check_plan(connection, query, args, guard)
+            return await self._run_prepared(connection, method, query, args), plan
+
+    async def _check_plan(self, connection, query: str, args: tuple, guard) -> Dict[str, Any]:
+        """statement_timeout текущей транзакции и проверка оценки плана EXPLAIN"""
+        await connection.execute(f"SET LOCAL statement_timeout = {int(guard.statement_timeout_ms)}")
+        explain = await connection.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args)
+        plan = json.loads(explain)[0]['Plan']
+        guard.check_plan(plan, query)
+        return plan
+
+    async def current_generation(self) -> Optional[int]:
+        """Текущее поколение данных или None, если нет подписки на уведомления загрузчика"""
+        if self._listener is None or self._listener.is_closed():
+            if time.monotonic() < self._listener_retry_at:
+                return None
+            await self._listen_generation()
+            if self._listener is None:
+                return None
+        return self.generation
+
+    async def _cache_key(self, kind: str, query: str, args: tuple):
+        """Ключ кэша результатов; без подписки на смену поколения кэш не используется"""
+        if self.result_cache is None or await self.current_generation() is None:
+            return None
+        return self.result_cache.make_key(kind, query, args)
+
+    async def _listen_generation(self):
+        """Чтение текущего поколения данных и подписка на уведомления загрузчика"""
+        listener = None
+        try:
+            listener = await asyncpg.connect(self.connection_string)
+            await listener.add_listener(GENERATION_CHANNEL, self._on_generation)
+            listener.add_termination_listener(self._on_listener_closed)
+            generation = await listener.fetchval("SELECT generation FROM ingest_state WHERE id")
+        except Exception as e:
+            if listener is not None:
+                listener.terminate()
+            # Без подписки нельзя узнать о новой загрузке: кэш временно отключается
+            self._listener_retry_at = time.monotonic() + LISTENER_RETRY_INTERVAL
+            logger.warning(f"Кэши по поколению данных отключены: нет подписки на уведомления загрузчика ({e})")
+            return
+
+        self._listener = listener
+        self._set_generation(generation or 0)
+        logger.info(f"Подписка на поколение данных установлена, текущее поколение {self.generation}")
+
+    def add_generation_listener(self, callback: Callable[[int], None]):
+        """callback(поколение) после перехода к новому поколению данных и сброса кэша результатов"""
+        self._generation_listeners.append(callback)
+
+    def _on_generation(self, connection, pid, channel, payload):
+        self._set_generation(int(payload))
+
+    def _on_listener_closed(self, connection):
+        if self._listener is connection:
+            self._listener = None
+            self._listener_retry_at = time.monotonic() + LISTENER_RETRY_INTERVAL
+            logger.warning("Соединение подписки на поколение данных закрыто")
+
+    def _set_generation(self, generation: int):
+        """Переход к новому поколению данных и сброс кэша результатов"""
+        if generation == self.generation:
+            return
+        self.generation = generation
+        if self.result_cache is not None:
+            self.result_cache.clear()
+            logger.info(f"Данные обновлены (поколение {generation}), кэш результатов сброшен")
+        for callback in self._generation_listeners:
+            callback(generation)
+
+    async def load_json_data(self, json_path: str, fmt: str = FORMAT_AUTO):
         """Загрузка данных из JSON файла в базу"""
         try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            # Извлекаем список видео
-            if isinstance(data, dict) and 'videos' in data:
-                videos_list = data['videos']
-                logger.info(f"Обнаружено {len(videos_list)} видео в JSON объекте")
-            elif isinstance(data, list):
-                videos_list = data
-                logger.info(f"Обнаружено {len(videos_list)} видео в JSON массиве")
-            else:
-                logger.error("Неподдерживаемый формат JSON: ожидается ключ 'videos' или массив")
-                return
+            # Видео читаются из файла по одному
+            videos_list = iter_videos(json_path, fmt)
 
-            logger.info(f"Начинается загрузка {len(videos_list)} видео в базу данных")
+            logger.info(f"Начинается загрузка видео из {json_path} в базу данных")
 
             async with self.pool.acquire() as connection:
                 async with connection.transaction():
@@ -71,6 +428,7 @@ class Database:
 
                     videos_loaded = 0
                     snapshots_loaded = 0
+                    partitions: Set[date] = set()
 
                     for video in videos_list:
                         try:
@@ -104,6 +462,9 @@ class Database:
                             for snapshot in snapshots:
                                 snapshot_created_at = self._parse_datetime_naive(snapshot['created_at'])
                                 snapshot_updated_at = self._parse_datetime_naive(snapshot['updated_at'])
+                                await self._ensure_partitions(
+                                    connection, PARTITIONED_TABLE, [snapshot_created_at], partitions
+                                )
 
                                 await connection.execute("""
                                     INSERT INTO video_snapshots (
@@ -134,7 +495,60 @@ class Database:
                         except Exception as e:
                             logger.error(f"Ошибка при обработке видео {video.get('id', 'неизвестно')}: {e}")
 
-                    logger.info(f"Успешно загружено: {videos_loaded} видео, {snapshots_loaded} снапшотов")
+                    generation = await self._finish_load(connection)
+
+            self._set_generation(generation)
+            logger.info(f"Успешно загружено: {videos_loaded} видео, {snapshots_loaded} снапшотов")
+
+        except FileNotFoundError:
+            logger.error(f"Файл не найден: {json_path}")
+            raise
+        except json.JSONDecodeError as e:
+            logger.error(f"Ошибка формата JSON в файле {json_path}: {e}")
+            raise
+        except UnicodeDecodeError:
+            logger.error(f"Ошибка кодировки файла: {json_path}")
+            raise
+        except ValueError as e:
+            logger.error(f"Неподдерживаемый формат файла {json_path}: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Неожиданная ошибка при загрузке данных: {e}")
+            raise
+
+    async def bulk_load_json_data(
+            self,
+            json_path: str,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            fmt: str = FORMAT_AUTO
+    ) -> Dict[str, Any]:
+        """Загрузка данных из JSON файла в базу через бинарный COPY"""
+        try:
+            # Генератор видео: в памяти одновременно не больше одного батча
+            videos_list = iter_videos(json_path, fmt)
+
+            logger.info(f"Начинается bulk-загрузка видео из {json_path} (батч {batch_size} строк)")
+            started = time.perf_counter()
+            stats = {'videos': 0, 'snapshots': 0, 'skipped': 0}
+
+            async with self.pool.acquire() as connection:
+                async with connection.transaction():
+                    # Очистка таблиц
+                    await connection.execute("DELETE FROM video_snapshots")
+                    await connection.execute("DELETE FROM videos")
+
+                    partitions: Set[date] = set()
+                    for batch in self._record_batches(videos_list, batch_size, stats):
+                        await self._ensure_partitions(
+                            connection, PARTITIONED_TABLE,
+                            (record[SNAPSHOT_CREATED_AT] for record in batch[1]), partitions
+                        )
+                        await self._copy_batch(connection, batch, stats)
+
+                    generation = await self._finish_load(connection)
+
+            self._set_generation(generation)
+            return self._load_report(stats, started)
 
         except FileNotFoundError:
             logger.error(f"Файл не найден: {json_path}")
@@ -145,10 +559,584 @@ class Database:
         except UnicodeDecodeError:
             logger.error(f"Ошибка кодировки файла: {json_path}")
             raise
+        except ValueError as e:
+            logger.error(f"Неподдерживаемый формат файла {json_path}: {e}")
+            raise
         except Exception as e:
             logger.error(f"Неожиданная ошибка при загрузке данных: {e}")
             raise
 
+    async def parallel_load_json_data(
+            self,
+            json_path: str,
+            workers: int = DEFAULT_WORKERS,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            fmt: str = FORMAT_AUTO
+    ) -> Dict[str, Any]:
+        """Параллельная загрузка в staging таблицы с атомарной подменой основных таблиц"""
+        workers = max(1, min(workers, self.pool.get_max_size()))
+        started = time.perf_counter()
+        stats = {'videos': 0, 'snapshots': 0, 'skipped': 0}
+
+        try:
+            await self._create_staging_tables()
+
+            logger.info(f"Начинается параллельная загрузка видео из {json_path}: {workers} соединений, батч {batch_size} строк")
+
+            # Разбор файла идет в одном потоке, COPY батчей - параллельно в N соединениях
+            queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+            # Секции staging таблицы создаются воркерами по мере появления новых месяцев
+            partitions: Set[date] = set()
+            partitions_lock = asyncio.Lock()
+            tasks = [
+                asyncio.ensure_future(self._staging_worker(queue, stats, partitions, partitions_lock))
+                for _ in range(workers)
+            ]
+            try:
+                videos_list = iter_videos(json_path, fmt)
+                for batch in self._record_batches(videos_list, batch_size, stats):
+                    await self._put_batch(queue, batch, tasks)
+                for _ in tasks:
+                    await self._put_batch(queue, None, tasks)
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+            logger.info(f"Данные в staging таблицах ({stats['videos']} видео, {stats['snapshots']} снапшотов), строятся индексы")
+            await self._finalize_staging_tables()
+            generation = await self._swap_staging_tables()
+
+            self._set_generation(generation)
+
+            return self._load_report(stats, started)
+
+        except FileNotFoundError:
+            logger.error(f"Файл не найден: {json_path}")
+            await self._drop_staging_tables()
+            raise
+        except json.JSONDecodeError as e:
+            logger.error(f"Ошибка формата JSON в файле {json_path}: {e}")
+            await self._drop_staging_tables()
+            raise
+        except UnicodeDecodeError:
+            logger.error(f"Ошибка кодировки файла: {json_path}")
+            await self._drop_staging_tables()
+            raise
+        except ValueError as e:
+            logger.error(f"Неподдерживаемый формат файла {json_path}: {e}")
+            await self._drop_staging_tables()
+            raise
+        except Exception as e:
+            logger.error(f"Неожиданная ошибка при параллельной загрузке данных: {e}")
+            await self._drop_staging_tables()
+            raise
+
+    async def incremental_load_json_data(
+            self,
+            json_path: str,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            fmt: str = FORMAT_AUTO
+    ) -> Dict[str, Any]:
+        """Инкрементальная загрузка: upsert изменившихся видео и снапшоты новее водяного знака"""
+        try:
+            videos_list = iter_videos(json_path, fmt)
+            started = time.perf_counter()
+            parsed = {'videos': 0, 'snapshots': 0, 'skipped': 0}
+            stats = {
+                'videos_inserted': 0, 'videos_updated': 0, 'videos_skipped': 0,
+                'snapshots_inserted': 0, 'snapshots_skipped': 0,
+            }
+
+            async with self.pool.acquire() as connection:
+                async with connection.transaction():
+                    state = await connection.fetchrow(
+                        "SELECT snapshot_watermark, video_watermark FROM ingest_state WHERE id"
+                    )
+                    snapshot_watermark = state['snapshot_watermark'] if state else None
+                    video_watermark = state['video_watermark'] if state else None
+                    logger.info(
+                        f"Начинается инкрементальная загрузка видео из {json_path}: "
+                        f"снапшоты новее {snapshot_watermark}, видео обновленные после {video_watermark}"
+                    )
+
+                    for table in LOAD_TABLES:
+                        await connection.execute(
+                            f"CREATE TEMP TABLE {table}{INCOMING_SUFFIX} "
+                            f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"
+                        )
+
+                    partitions: Set[date] = set()
+                    for video_records, snapshot_records in self._record_batches(videos_list, batch_size, parsed):
+                        # Все, что не новее водяных знаков, уже есть в базе
+                        fresh_videos = [
+                            record for record in video_records
+                            if video_watermark is None or record[VIDEO_UPDATED_AT] > video_watermark
+                        ]
+                        fresh_snapshots = [
+                            record for record in snapshot_records
+                            if snapshot_watermark is None or record[SNAPSHOT_CREATED_AT] > snapshot_watermark
+                        ]
+                        stats['videos_skipped'] += len(video_records) - len(fresh_videos)
+                        stats['snapshots_skipped'] += len(snapshot_records) - len(fresh_snapshots)
+
+                        await self._upsert_videos(connection, fresh_videos, stats)
+                        await self._ensure_partitions(
+                            connection, PARTITIONED_TABLE,
+                            (record[SNAPSHOT_CREATED_AT] for record in fresh_snapshots), partitions
+                        )
+                        await self._insert_new_snapshots(connection, fresh_snapshots, stats)
+
+                    # Пересчитываются только дни, в которые могли попасть новые снапшоты
+                    rollups_since = snapshot_watermark.date() if snapshot_watermark else None
+                    generation = await self._finish_load(connection, rollups_since)
+
+            self._set_generation(generation)
+            elapsed = time.perf_counter() - started
+            logger.info(
+                f"Инкрементальная загрузка за {elapsed:.2f} с: видео - добавлено {stats['videos_inserted']}, "
+                f"обновлено {stats['videos_updated']}, пропущено {stats['videos_skipped']}; "
+                f"снапшоты - добавлено {stats['snapshots_inserted']}, пропущено {stats['snapshots_skipped']}; "
+                f"некорректных видео {parsed['skipped']}"
+            )
+            return {**stats, 'invalid': parsed['skipped'], 'seconds': elapsed}
+
+        except FileNotFoundError:
+            logger.error(f"Файл не найден: {json_path}")
+            raise
+        except json.JSONDecodeError as e:
+            logger.error(f"Ошибка формата JSON в файле {json_path}: {e}")
+            raise
+        except UnicodeDecodeError:
+            logger.error(f"Ошибка кодировки файла: {json_path}")
+            raise
+        except ValueError as e:
+            logger.error(f"Неподдерживаемый формат файла {json_path}: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Неожиданная ошибка при инкрементальной загрузке данных: {e}")
+            raise
+
+    async def _upsert_videos(self, connection, records: List[tuple], stats: Dict[str, int]):
+        """Upsert батча видео: существующие обновляются, только если изменился updated_at"""
+        if not records:
+            return
+
+        columns = ', '.join(VIDEO_COLUMNS)
+        updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in VIDEO_COLUMNS[1:])
+        await connection.copy_records_to_table(f"videos{INCOMING_SUFFIX}", records=records, columns=VIDEO_COLUMNS)
+        row = await connection.fetchrow(f"""
+            WITH upserted AS (
+                INSERT INTO videos ({columns})
+                SELECT DISTINCT ON (id) {columns} FROM videos{INCOMING_SUFFIX}
+                ORDER BY id, updated_at DESC
+                ON CONFLICT (id) DO UPDATE SET {updates}
+                WHERE videos.updated_at IS DISTINCT FROM EXCLUDED.updated_at
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT COUNT(*) FILTER (WHERE inserted) AS inserted,
+                   COUNT(*) FILTER (WHERE NOT inserted) AS updated
+            FROM upserted
+        """)
+        await connection.execute(f"TRUNCATE videos{INCOMING_SUFFIX}")
+
+        stats['videos_inserted'] += row['inserted']
+        stats['videos_updated'] += row['updated']
+        stats['videos_skipped'] += len(records) - row['inserted'] - row['updated']
+
+    async def _insert_new_snapshots(self, connection, records: List[tuple], stats: Dict[str, int]):
+        """Вставка батча новых снапшотов; уже известные и снапшоты неизвестных видео пропускаются"""
+        if not records:
+            return
+
+        columns = ', '.join(SNAPSHOT_COLUMNS)
+        await connection.copy_records_to_table(
+            f"video_snapshots{INCOMING_SUFFIX}", records=records, columns=SNAPSHOT_COLUMNS
+        )
+        status = await connection.execute(f"""
+            INSERT INTO video_snapshots ({columns})
+            SELECT DISTINCT ON (id) {columns} FROM video_snapshots{INCOMING_SUFFIX} s
+            WHERE EXISTS (SELECT 1 FROM videos v WHERE v.id = s.video_id)
+            ORDER BY id
+            ON CONFLICT (id, created_at) DO NOTHING
+        """)
+        await connection.execute(f"TRUNCATE video_snapshots{INCOMING_SUFFIX}")
+
+        # Статус команды: "INSERT 0 <количество строк>"
+        inserted = int(status.split()[-1])
+        stats['snapshots_inserted'] += inserted
+        stats['snapshots_skipped'] += len(records) - inserted
+
+    async def _finish_load(
+            self,
+            connection,
+            rollups_since: Optional[date] = None,
+            refresh_rollups: bool = True
+    ) -> int:
+        """Удаление старых секций, пересчет дневных агрегатов, водяные знаки и новое поколение данных
+
+        refresh_rollups=False - агрегаты уже опубликованы вызывающим (подмена staging таблиц).
+        """
+        if self.retention_months > 0:
+            await self._drop_expired_partitions(connection)
+        if refresh_rollups:
+            await self._refresh_rollups(connection, rollups_since)
+
+        generation = await connection.fetchval("""
+            INSERT INTO ingest_state (id, snapshot_watermark, video_watermark, generation, updated_at)
+            VALUES (
+                TRUE,
+                (SELECT MAX(created_at) FROM video_snapshots),
+                (SELECT MAX(updated_at) FROM videos),
+                1,
+                NOW()
+            )
+            ON CONFLICT (id) DO UPDATE SET
+                snapshot_watermark = EXCLUDED.snapshot_watermark,
+                video_watermark = EXCLUDED.video_watermark,
+                generation = ingest_state.generation + 1,
+                updated_at = EXCLUDED.updated_at
+            RETURNING generation
+        """)
+        # Уведомление доставляется подписчикам только после коммита
+        await connection.execute("SELECT pg_notify($1, $2)", GENERATION_CHANNEL, str(generation))
+        return generation
+
+    async def _refresh_rollups(self, connection, since: Optional[date] = None, suffix: str = ''):
+        """Пересчет дневных агрегатов снапшотов: полностью или начиная с дня since
+
+        suffix - пересчет staging агрегатов по staging таблицам загрузки.
+        """
+        started = time.perf_counter()
+        for rollup, creator in ROLLUP_TABLES:
+            table = f"{rollup}{suffix}"
+            columns = ['day'] + (['creator_id'] if creator else []) + list(ROLLUP_COLUMNS)
+            expressions = ['DATE(s.created_at)'] + (['v.creator_id'] if creator else []) + list(ROLLUP_COLUMNS.values())
+            source = f"video_snapshots{suffix} s" + (f" JOIN videos{suffix} v ON v.id = s.video_id" if creator else "")
+            group_by = ', '.join(str(position) for position in range(1, 3 if creator else 2))
+
+            if since is None:
+                await connection.execute(f"DELETE FROM {table}")
+                await connection.execute(f"""
+                    INSERT INTO {table} ({', '.join(columns)})
+                    SELECT {', '.join(expressions)} FROM {source}
+                    GROUP BY {group_by}
+                """)
+            else:
+                await connection.execute(f"DELETE FROM {table} WHERE day >= $1", since)
+                await connection.execute(f"""
+                    INSERT INTO {table} ({', '.join(columns)})
+                    SELECT {', '.join(expressions)} FROM {source}
+                    WHERE s.created_at >= $1
+                    GROUP BY {group_by}
+                """, datetime.combine(since, datetime.min.time()))
+
+        scope = "полностью" if since is None else f"с {since}"
+        scope += " (staging)" if suffix else ""
+        logger.info(f"Дневные агрегаты пересчитаны {scope} за {time.perf_counter() - started:.2f} с")
+
+    async def _ensure_partitions(
+            self,
+            connection,
+            table: str,
+            timestamps: Iterable[datetime],
+            known: Set[date],
+            unlogged: bool = False
+    ):
+        """Создание недостающих секций под моменты timestamps; known - начала уже проверенных секций"""
+        months = {(value.year, value.month) for value in timestamps}
+        for year, month in sorted(months):
+            start, end = partition_bounds(date(year, month, 1), self.partition_months)
+            if start in known:
+                continue
+            name = partition_name(table, start)
+            if await connection.fetchval("SELECT to_regclass($1)", name) is None:
+                # CREATE ... PARTITION OF блокирует родителя целиком, ATTACH не мешает читателям и COPY
+                await connection.execute(
+                    f"CREATE {'UNLOGGED ' if unlogged else ''}TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"
+                )
+                await connection.execute(
+                    f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"
+                )
+                logger.info(f"Создана секция {name} с {start} по {end}")
+            known.add(start)
+
+    async def _partitions(self, connection, table: str) -> List[Tuple[str, date]]:
+        """Секции таблицы: (имя, начало диапазона из имени секции)"""
+        rows = await connection.fetch("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = $1::text::regclass
+            ORDER BY c.relname
+        """, table)
+        partitions = []
+        for row in rows:
+            match = _PARTITION_NAME.search(row['relname'])
+            if match:
+                partitions.append((row['relname'], date(int(match.group(1)), int(match.group(2)), 1)))
+        return partitions
+
+    async def _drop_expired_partitions(self, connection):
+        """Удаление секций снапшотов старше срока хранения вместе с их дневными агрегатами"""
+        today = date.today()
+        # Хранятся последние retention_months месяцев, включая текущий
+        cutoff = _month_start(today.year * 12 + today.month - self.retention_months)
+        boundary = None
+        for name, start in await self._partitions(connection, PARTITIONED_TABLE):
+            end = partition_bounds(start, self.partition_months)[1]
+            if end <= cutoff:
+                await connection.execute(f"DROP TABLE {name}")
+                boundary = max(boundary or end, end)
+                logger.info(f"Удалена секция {name}: данные старше {cutoff}")
+
+        if boundary is not None:
+            for table, _ in ROLLUP_TABLES:
+                await connection.execute(f"DELETE FROM {table} WHERE day < $1", boundary)
+
+    async def _staging_worker(
+            self,
+            queue: asyncio.Queue,
+            stats: Dict[str, int],
+            partitions: Set[date],
+            partitions_lock: asyncio.Lock
+    ):
+        """Воркер параллельной загрузки: COPY батчей из очереди в staging таблицы"""
+        async with self.pool.acquire() as connection:
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+                async with partitions_lock:
+                    await self._ensure_partitions(
+                        connection, f"{PARTITIONED_TABLE}{STAGING_SUFFIX}",
+                        (record[SNAPSHOT_CREATED_AT] for record in batch[1]), partitions, unlogged=True
+                    )
+                await self._copy_batch(
+                    connection, batch, stats,
+                    videos_table=f"videos{STAGING_SUFFIX}",
+                    snapshots_table=f"video_snapshots{STAGING_SUFFIX}"
+                )
+
+    async def _put_batch(self, queue: asyncio.Queue, batch, tasks: List[asyncio.Future]):
+        """Передача батча воркерам с проверкой, что ни один из них не упал"""
+        put = asyncio.ensure_future(queue.put(batch))
+        while not put.done():
+            running = [task for task in tasks if not task.done()]
+            done, _ = await asyncio.wait([put, *running], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is not put and task.exception() is not None:
+                    put.cancel()
+                    raise task.exception()
+
+    async def _create_staging_tables(self):
+        """Создание пустых UNLOGGED копий таблиц и дневных агрегатов без индексов и ограничений"""
+        await self._drop_staging_tables()
+        async with self.pool.acquire() as connection:
+            for table, _ in ROLLUP_TABLES:
+                await connection.execute(
+                    f"CREATE UNLOGGED TABLE {table}{STAGING_SUFFIX} (LIKE {table} INCLUDING DEFAULTS)"
+                )
+            for table in LOAD_TABLES:
+                if table == PARTITIONED_TABLE:
+                    # Секционированная таблица не бывает UNLOGGED: UNLOGGED создаются ее секции
+                    await connection.execute(
+                        f"CREATE TABLE {table}{STAGING_SUFFIX} (LIKE {table} INCLUDING DEFAULTS) "
+                        f"PARTITION BY RANGE (created_at)"
+                    )
+                else:
+                    await connection.execute(
+                        f"CREATE UNLOGGED TABLE {table}{STAGING_SUFFIX} (LIKE {table} INCLUDING DEFAULTS)"
+                    )
+
+    async def _drop_staging_tables(self):
+        """Удаление staging таблиц (после ошибки или перед новой загрузкой)"""
+        async with self.pool.acquire() as connection:
+            for table in [*reversed(LOAD_TABLES), *(rollup for rollup, _ in ROLLUP_TABLES)]:
+                await connection.execute(f"DROP TABLE IF EXISTS {table}{STAGING_SUFFIX}")
+
+    async def _finalize_staging_tables(self):
+        """Перевод staging таблиц в LOGGED, создание ключей и индексов из init_db.sql"""
+        async with self.pool.acquire() as connection:
+            partitions = await self._partitions(connection, f"{PARTITIONED_TABLE}{STAGING_SUFFIX}")
+
+        # SET LOGGED переписывает таблицу целиком, секции переводятся параллельно
+        async def set_logged(table: str):
+            async with self.pool.acquire() as connection:
+                await connection.execute(f"ALTER TABLE {table} SET LOGGED")
+
+        await asyncio.gather(set_logged(f"videos{STAGING_SUFFIX}"), *(set_logged(name) for name, _ in partitions))
+
+        async with self.pool.acquire() as connection:
+            await connection.execute(
+                f"ALTER TABLE videos{STAGING_SUFFIX} "
+                f"ADD CONSTRAINT videos{STAGING_SUFFIX}_pkey PRIMARY KEY (id)"
+            )
+            await connection.execute(
+                f"ALTER TABLE video_snapshots{STAGING_SUFFIX} "
+                f"ADD CONSTRAINT video_snapshots{STAGING_SUFFIX}_pkey PRIMARY KEY (id, created_at)"
+            )
+            await connection.execute(
+                f"ALTER TABLE video_snapshots{STAGING_SUFFIX} "
+                f"ADD CONSTRAINT video_snapshots{STAGING_SUFFIX}_video_id_fkey "
+                f"FOREIGN KEY (video_id) REFERENCES videos{STAGING_SUFFIX}(id) ON DELETE CASCADE"
+            )
+
+        # Вторичные индексы независимы и строятся параллельно
+        async def build_index(name: str, table: str, definition: str):
+            async with self.pool.acquire() as connection:
+                await connection.execute(
+                    f"CREATE INDEX {name}{STAGING_SUFFIX} ON {table}{STAGING_SUFFIX} {definition}"
+                )
+
+        await asyncio.gather(*(build_index(*index) for index in schema_indexes()))
+
+        async with self.pool.acquire() as connection:
+            for table in LOAD_TABLES:
+                await connection.execute(f"ANALYZE {table}{STAGING_SUFFIX}")
+            # Агрегаты считаются до подмены, чтобы опубликовать их вместе с таблицами
+            await self._refresh_rollups(connection, suffix=STAGING_SUFFIX)
+
+    async def _swap_staging_tables(self) -> int:
+        """Подмена основных таблиц и дневных агрегатов staging копиями в одной короткой транзакции
+
+        В той же транзакции поднимается поколение данных: читатели не видят новых снапшотов
+        со старыми агрегатами, а кэш не сохраняет результаты такого промежуточного состояния.
+        """
+        for attempt in range(1, SWAP_ATTEMPTS + 1):
+            try:
+                async with self.pool.acquire() as connection:
+                    async with connection.transaction():
+                        # Не ставим в очередь читателей надолго, если таблицы заняты
+                        await connection.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+                        await connection.execute(
+                            f"LOCK TABLE {', '.join(LOAD_TABLES)} IN ACCESS EXCLUSIVE MODE"
+                        )
+                        for table in reversed(LOAD_TABLES):
+                            await connection.execute(f"DROP TABLE {table}")
+                        for table in LOAD_TABLES:
+                            await connection.execute(f"ALTER TABLE {table}{STAGING_SUFFIX} RENAME TO {table}")
+                            await connection.execute(
+                                f"ALTER TABLE {table} RENAME CONSTRAINT {table}{STAGING_SUFFIX}_pkey TO {table}_pkey"
+                            )
+                        await connection.execute(
+                            f"ALTER TABLE video_snapshots RENAME CONSTRAINT "
+                            f"video_snapshots{STAGING_SUFFIX}_video_id_fkey TO video_snapshots_video_id_fkey"
+                        )
+                        for name, _, _ in schema_indexes():
+                            await connection.execute(f"ALTER INDEX {name}{STAGING_SUFFIX} RENAME TO {name}")
+                        # Секции старой таблицы удалены вместе с ней, их имена свободны
+                        for name, start in await self._partitions(connection, PARTITIONED_TABLE):
+                            new_name = partition_name(PARTITIONED_TABLE, start)
+                            if name != new_name:
+                                await connection.execute(f"ALTER TABLE {name} RENAME TO {new_name}")
+                        # Агрегаты малы: их строки переносятся целиком, без переименования индексов
+                        for table, _ in ROLLUP_TABLES:
+                            await connection.execute(f"DELETE FROM {table}")
+                            await connection.execute(f"INSERT INTO {table} SELECT * FROM {table}{STAGING_SUFFIX}")
+                            await connection.execute(f"DROP TABLE {table}{STAGING_SUFFIX}")
+                        generation = await self._finish_load(connection, refresh_rollups=False)
+                logger.info("Staging таблицы подменили основные")
+                return generation
+            except asyncpg.exceptions.LockNotAvailableError:
+                logger.warning(f"Таблицы заняты читателями, попытка подмены {attempt}/{SWAP_ATTEMPTS} не удалась")
+                if attempt == SWAP_ATTEMPTS:
+                    raise
+
+    def _record_batches(
+            self,
+            videos: Iterator[Dict[str, Any]],
+            batch_size: int,
+            stats: Dict[str, int]
+    ) -> Iterator[Tuple[List[tuple], List[tuple]]]:
+        """Преобразование потока видео в батчи записей для COPY с пропуском некорректных видео"""
+        video_buffer: List[tuple] = []
+        snapshot_buffer: List[tuple] = []
+
+        for video in videos:
+            try:
+                video_record = self._video_record(video)
+                snapshot_records = [
+                    self._snapshot_record(snapshot, video_record[0])
+                    for snapshot in video.get('snapshots') or []
+                ]
+            except KeyError as e:
+                stats['skipped'] += 1
+                logger.warning(f"Отсутствует обязательное поле {e} в видео {video.get('id', 'неизвестно')}")
+                continue
+            except (AttributeError, TypeError, ValueError) as e:
+                stats['skipped'] += 1
+                logger.error(f"Ошибка при обработке видео {video.get('id', 'неизвестно')}: {e}")
+                continue
+
+            video_buffer.append(video_record)
+            snapshot_buffer.extend(snapshot_records)
+
+            if len(video_buffer) >= batch_size or len(snapshot_buffer) >= batch_size:
+                yield video_buffer, snapshot_buffer
+                video_buffer, snapshot_buffer = [], []
+
+        if video_buffer or snapshot_buffer:
+            yield video_buffer, snapshot_buffer
+
+    async def _copy_batch(
+            self,
+            connection,
+            batch: Tuple[List[tuple], List[tuple]],
+            stats: Dict[str, int],
+            videos_table: str = 'videos',
+            snapshots_table: str = 'video_snapshots'
+    ):
+        """COPY одного батча; видео копируются раньше снапшотов из-за внешнего ключа"""
+        video_records, snapshot_records = batch
+        if video_records:
+            await connection.copy_records_to_table(videos_table, records=video_records, columns=VIDEO_COLUMNS)
+            stats['videos'] += len(video_records)
+        if snapshot_records:
+            await connection.copy_records_to_table(snapshots_table, records=snapshot_records, columns=SNAPSHOT_COLUMNS)
+            stats['snapshots'] += len(snapshot_records)
+
+    def _load_report(self, stats: Dict[str, int], started: float) -> Dict[str, Any]:
+        """Итоговая статистика загрузки со скоростью в строках в секунду"""
+        elapsed = time.perf_counter() - started
+        rows = stats['videos'] + stats['snapshots']
+        rows_per_sec = rows / elapsed if elapsed > 0 else 0.0
+        logger.info(
+            f"Успешно загружено: {stats['videos']} видео, {stats['snapshots']} снапшотов, "
+            f"пропущено {stats['skipped']} видео за {elapsed:.2f} с ({rows_per_sec:.0f} строк/с)"
+        )
+        return {**stats, 'seconds': elapsed, 'rows_per_sec': rows_per_sec}
+
+    def _video_record(self, video: Dict[str, Any]) -> tuple:
+        """Преобразование видео из JSON в запись для COPY (порядок VIDEO_COLUMNS)"""
+        return (
+            str(video['id']),
+            str(video['creator_id']),
+            self._parse_datetime_naive(video['video_created_at']),
+            int(video.get('views_count') or 0),
+            int(video.get('likes_count') or 0),
+            int(video.get('comments_count') or 0),
+            int(video.get('reports_count') or 0),
+            self._parse_datetime_naive(video['created_at']),
+            self._parse_datetime_naive(video['updated_at']),
+        )
+
+    def _snapshot_record(self, snapshot: Dict[str, Any], video_id: str) -> tuple:
+        """Преобразование снапшота из JSON в запись для COPY (порядок SNAPSHOT_COLUMNS)"""
+        return (
+            str(snapshot['id']),
+            video_id,
+            int(snapshot.get('views_count') or 0),
+            int(snapshot.get('likes_count') or 0),
+            int(snapshot.get('comments_count') or 0),
+            int(snapshot.get('reports_count') or 0),
+            int(snapshot.get('delta_views_count') or 0),
+            int(snapshot.get('delta_likes_count') or 0),
+            int(snapshot.get('delta_comments_count') or 0),
+            int(snapshot.get('delta_reports_count') or 0),
+            self._parse_datetime_naive(snapshot['created_at']),
+            self._parse_datetime_naive(snapshot['updated_at']),
+        )
+
     def _parse_datetime_naive(self, dt_str: str):
         """Парсинг строки даты и удаление временной зоны"""
         if dt_str.endswith('Z'):
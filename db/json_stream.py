@@ -0,0 +1,193 @@
+import gzip
+import json
+import logging
+from typing import Any, Dict, Iterator, TextIO
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+FORMAT_AUTO = 'auto'
+FORMAT_JSON = 'json'
+FORMAT_NDJSON = 'ndjson'
+
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+
+_WHITESPACE = ' \t\n\r'
+_GZIP_MAGIC = b'\x1f\x8b'
+
+
+def detect_format(path: str) -> str:
+    """Определение формата выгрузки по расширению файла"""
+    name = path.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return FORMAT_NDJSON if name.endswith(NDJSON_SUFFIXES) else FORMAT_JSON
+
+
+def open_text(path: str) -> TextIO:
+    """Открытие файла на чтение с прозрачной распаковкой gzip"""
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+
+    if magic == _GZIP_MAGIC:
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+class _StreamReader:
+    """Инкрементальный разбор JSON поверх буфера ограниченного размера"""
+
+    def __init__(self, stream: TextIO, chunk_size: int):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, size: int) -> bool:
+        """Дочитывание файла; уже разобранная часть буфера отбрасывается"""
+        if self._eof:
+            return False
+
+        chunk = self._stream.read(size)
+        if not chunk:
+            self._eof = True
+            return False
+
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self._buffer, self._pos)
+
+    def peek(self) -> str:
+        """Следующий непробельный символ ('' в конце файла)"""
+        while True:
+            buffer = self._buffer
+            size = len(buffer)
+            while self._pos < size and buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < size:
+                return buffer[self._pos]
+            if not self._fill(self._chunk_size):
+                return ''
+
+    def expect(self, char: str):
+        """Пропуск обязательного символа-разделителя"""
+        if self.peek() != char:
+            raise self._error(f"Ожидался символ {char!r}")
+        self._pos += 1
+
+    def value(self) -> Any:
+        """Разбор одного JSON значения начиная с текущей позиции"""
+        if not self.peek():
+            raise self._error("Неожиданный конец файла")
+
+        read_size = self._chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # Число на границе буфера могло быть обрезано: дочитываем
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+
+            # Значение не поместилось в буфер: читаем с удвоением порции
+            self._fill(read_size)
+            read_size *= 2
+
+    def array(self) -> Iterator[Any]:
+        """Поэлементный обход JSON массива"""
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+
+        while True:
+            yield self.value()
+
+            separator = self.peek()
+            self._pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                self._pos -= 1
+                raise self._error("Ожидался символ ',' или ']'")
+
+    def document(self) -> Iterator[Any]:
+        """Обход видео из документа {"videos": [...]} или массива верхнего уровня"""
+        first = self.peek()
+        if first == '[':
+            yield from self.array()
+            return
+        if first != '{':
+            raise ValueError("Неподдерживаемый формат JSON: ожидается ключ 'videos' или массив")
+
+        self._pos += 1
+        found = False
+        if self.peek() == '}':
+            self._pos += 1
+        else:
+            while True:
+                key = self.value()
+                self.expect(':')
+                if key == 'videos' and self.peek() == '[':
+                    found = True
+                    yield from self.array()
+                else:
+                    # Прочие ключи верхнего уровня пропускаем
+                    self.value()
+
+                separator = self.peek()
+                self._pos += 1
+                if separator == '}':
+                    break
+                if separator != ',':
+                    self._pos -= 1
+                    raise self._error("Ожидался символ ',' или '}'")
+
+        if not found:
+            raise ValueError("Неподдерживаемый формат JSON: ожидается ключ 'videos' или массив")
+
+
+def _iter_ndjson(stream: TextIO) -> Iterator[Any]:
+    """Построчный обход NDJSON: одно видео на строку"""
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise json.JSONDecodeError(f"Строка {line_number}: {e.msg}", e.doc, e.pos) from e
+
+
+def iter_videos(
+        path: str,
+        fmt: str = FORMAT_AUTO,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """Потоковое чтение видео (вместе со снапшотами) по одному из JSON, NDJSON или gzip файла"""
+    if fmt == FORMAT_AUTO:
+        fmt = detect_format(path)
+    if fmt not in (FORMAT_JSON, FORMAT_NDJSON):
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+
+    with open_text(path) as stream:
+        if fmt == FORMAT_NDJSON:
+            items = _iter_ndjson(stream)
+        else:
+            items = _StreamReader(stream, chunk_size).document()
+
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                logger.warning(f"Пропущен элемент #{index}: ожидается объект видео, получен {type(item).__name__}")
+                continue
+            yield item
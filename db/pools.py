@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import asyncpg
+
+from db.statements import StatementCachingConnection
+from services.metrics import record_stage
+
+logger = logging.getLogger(__name__)
+
+# Ошибки соединения, после которых реплика исключается до следующей успешной проверки
+CONNECTION_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.exceptions.PostgresConnectionError,
+    asyncpg.exceptions.ConnectionDoesNotExistError,
+    asyncpg.exceptions.CannotConnectNowError,
+)
+
+# Проверка реплики: доступность и поколение данных, до которого она воспроизвела журнал
+HEALTH_QUERY = "SELECT generation FROM ingest_state WHERE id"
+
+
+class PoolNode:
+    """Пул соединений одного сервера со счетчиками нагрузки и ожидания соединения"""
+
+    def __init__(self, name: str, dsn: str, **pool_options):
+        self.name = name
+        self.dsn = dsn
+        self.pool_options = pool_options
+        self.pool: Optional[asyncpg.Pool] = None
+
+        self.outstanding = 0
+        self.acquires = 0
+        self.acquire_wait = 0.0
+        self.acquire_wait_max = 0.0
+        self.errors = 0
+
+        # Для реплик: доступность и видимое на сервере поколение данных по последней проверке
+        self.healthy = True
+        self.generation: Optional[int] = None
+
+    async def open(self):
+        self.pool = await asyncpg.create_pool(
+            self.dsn,
+            connection_class=StatementCachingConnection,
+            server_settings={'application_name': f"video-analytics-{self.name}"},
+            **self.pool_options
+        )
+
+    async def close(self):
+        if self.pool is not None:
+            pool, self.pool = self.pool, None
+            await pool.close()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        """Соединение из пула с учетом выполняющихся запросов и времени ожидания"""
+        self.outstanding += 1
+        started = time.perf_counter()
+        try:
+            async with self.pool.acquire() as connection:
+                waited = time.perf_counter() - started
+                self.acquires += 1
+                self.acquire_wait += waited
+                self.acquire_wait_max = max(self.acquire_wait_max, waited)
+                record_stage('db_acquire', waited)
+                yield connection
+        finally:
+            self.outstanding -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            'outstanding': self.outstanding,
+            'acquires': self.acquires,
+            'acquire_wait_avg': self.acquire_wait / self.acquires if self.acquires else 0.0,
+            'acquire_wait_max': self.acquire_wait_max,
+            'errors': self.errors,
+            'healthy': int(self.healthy),
+        }
+        if self.pool is not None:
+            size, idle, max_size = self.pool.get_size(), self.pool.get_idle_size(), self.pool.get_max_size()
+            stats.update({
+                'size': size, 'idle': idle, 'active': size - idle, 'max': max_size,
+                'utilization': (size - idle) / max_size if max_size else 0.0,
+            })
+        return stats
+
+
+class ReplicaRouter:
+    """Выбор реплики для чтения: наименьшее число выполняющихся запросов среди доступных и не отстающих"""
+
+    def __init__(self, replicas: List[PoolNode], check_interval: float = 5):
+        self.replicas = replicas
+        self.check_interval = check_interval
+        self.routed = 0
+        self.fallbacks = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Первая проверка всех реплик и фоновые проверки раз в check_interval"""
+        await self.check_all()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.gather(*(replica.close() for replica in self.replicas))
+
+    def choose(self, generation: int) -> Optional[PoolNode]:
+        """Реплика для чтения или None, если читать нужно с основного сервера
+
+        Реплика, которая еще не воспроизвела текущее поколение данных, не выбирается:
+        иначе устаревший ответ попал бы в кэш результатов нового поколения.
+        """
+        candidates = [
+            replica for replica in self.replicas
+            if replica.healthy and replica.generation is not None and replica.generation >= generation
+        ]
+        if not candidates:
+            self.fallbacks += 1
+            return None
+        self.routed += 1
+        return min(candidates, key=lambda replica: (replica.outstanding, replica.acquires))
+
+    def mark_failed(self, replica: PoolNode, error: BaseException):
+        replica.errors += 1
+        if replica.healthy:
+            logger.warning(f"Реплика {replica.name} исключена из чтения: {error}")
+        replica.healthy = False
+
+    async def check_all(self):
+        await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+
+    async def check(self, replica: PoolNode):
+        try:
+            if replica.pool is None:
+                await replica.open()
+            async with replica.pool.acquire(timeout=self.check_interval) as connection:
+                generation = await connection.fetchval(HEALTH_QUERY, timeout=self.check_interval)
+        except Exception as e:
+            self.mark_failed(replica, e)
+            return
+
+        if not replica.healthy:
+            logger.info(f"Реплика {replica.name} снова доступна для чтения")
+        replica.healthy = True
+        replica.generation = generation or 0
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check_all()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {'replica_routed': self.routed, 'replica_fallbacks': self.fallbacks}
+        for replica in self.replicas:
+            stats.update({f"{replica.name}_{key}": value for key, value in replica.stats().items()})
+            stats[f"{replica.name}_generation"] = replica.generation if replica.generation is not None else -1
+        return stats
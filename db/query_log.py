@@ -0,0 +1,133 @@
+import asyncio
+import json
+import logging
+import random
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.sql_params import fingerprint
+
+logger = logging.getLogger(__name__)
+
+QUERY_LOG_TABLE = 'query_log'
+QUERY_LOG_COLUMNS = ('fingerprint', 'query', 'node', 'duration_ms', 'rows', 'plan', 'created_at')
+
+
+class QueryLog:
+    """Журнал выполненных запросов в таблице query_log: отпечаток, длительность, строки и план
+
+    Записи копятся в памяти и раз в flush_interval пишутся в основной сервер одним COPY.
+    План EXPLAIN сохраняется для медленных запросов (от slow_ms) и для доли plan_sample остальных;
+    для SQL от LLM он уже есть после проверки SQLGuard. Остальные планы строятся фоновой записью
+    на ее соединении с основным сервером, а не на соединении, которое ждет ответа запрос бота.
+    """
+
+    def __init__(
+            self,
+            plan_sample: float = 0.05,
+            slow_ms: float = 200,
+            flush_interval: float = 5,
+            max_buffer: int = 10000
+    ):
+        self.plan_sample = plan_sample
+        self.slow_ms = slow_ms
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+
+        self._records: List[tuple] = []
+        # (номер записи, SQL, аргументы) записей, план которых строится при записи
+        self._pending_plans: List[Tuple[int, str, tuple]] = []
+        self._pool = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.slow = 0
+
+    async def start(self, pool):
+        """Периодическая запись в таблицу через пул основного сервера"""
+        self._pool = pool
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pool is not None:
+            await self.flush()
+
+    def wants_plan(self, duration: float) -> bool:
+        """Нужен ли план запроса, выполнявшегося duration секунд"""
+        return duration * 1000 >= self.slow_ms or random.random() < self.plan_sample
+
+    def add(
+            self,
+            query: str,
+            duration: float,
+            rows: int,
+            plan: Optional[Dict[str, Any]] = None,
+            node: str = 'primary',
+            args: Optional[tuple] = None
+    ):
+        """Запись о запросе; без готового плана и с аргументами args план строится при записи"""
+        self.recorded += 1
+        if duration * 1000 >= self.slow_ms:
+            self.slow += 1
+        if len(self._records) >= self.max_buffer:
+            self.dropped += 1
+            return
+        key, normalized = fingerprint(query)
+        if plan is None and args is not None and self.wants_plan(duration):
+            self._pending_plans.append((len(self._records), query, args))
+        self._records.append((
+            key, normalized, node, duration * 1000, rows,
+            json.dumps(plan) if plan is not None else None, datetime.now(),
+        ))
+
+    async def flush(self):
+        """Планы отложенных записей и запись накопленных одним COPY; при ошибке записи они отбрасываются"""
+        records, self._records = self._records, []
+        pending, self._pending_plans = self._pending_plans, []
+        if not records:
+            return
+        try:
+            async with self._pool.acquire() as connection:
+                for index, query, args in pending:
+                    plan = await self._explain(connection, query, args)
+                    if plan is not None:
+                        record = records[index]
+                        records[index] = record[:5] + (json.dumps(plan),) + record[6:]
+                await connection.copy_records_to_table(QUERY_LOG_TABLE, records=records, columns=QUERY_LOG_COLUMNS)
+            self.written += len(records)
+        except Exception as e:
+            self.dropped += len(records)
+            logger.warning(f"Журнал запросов не записан ({len(records)} записей): {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'recorded': self.recorded,
+            'written': self.written,
+            'dropped': self.dropped,
+            'slow': self.slow,
+            'buffered': len(self._records),
+            'pending_plans': len(self._pending_plans),
+        }
+
+    async def _explain(self, connection, query: str, args: tuple) -> Optional[Dict[str, Any]]:
+        """План запроса для журнала или None, если EXPLAIN не удался"""
+        try:
+            explain = await connection.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args)
+        except Exception as e:
+            logger.debug(f"План для журнала запросов не получен: {e}")
+            return None
+        return json.loads(explain)[0]['Plan']
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
@@ -0,0 +1,89 @@
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+# Строковые литералы и идентификаторы в кавычках сохраняются как есть
+_SQL_TOKEN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|\s+|[^'\"\s-]+|-")
+
+# Результат таких запросов зависит не только от данных
+_VOLATILE = re.compile(
+    r'\b(?:now|current_date|current_time|current_timestamp|localtime|localtimestamp|'
+    r'clock_timestamp|statement_timestamp|transaction_timestamp|timeofday|random)\b'
+)
+
+
+def canonicalize_sql(sql: str) -> str:
+    """Каноническая форма SQL: без комментариев, лишних пробелов, регистра ключевых слов и ';'"""
+    parts = []
+    for token in _SQL_TOKEN.findall(sql):
+        if token.startswith('--'):
+            continue
+        if token.isspace():
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+        elif token[0] in '\'"':
+            parts.append(token)
+        else:
+            parts.append(token.lower())
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+class ResultCache:
+    """LRU кэш результатов запросов, действительный в пределах одного поколения данных"""
+
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[int, Any]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def make_key(self, kind: str, query: str, args: tuple) -> Hashable:
+        """Ключ кэша или None, если результат запроса кэшировать нельзя"""
+        canonical = canonicalize_sql(query)
+        if _VOLATILE.search(canonical):
+            self.bypassed += 1
+            return None
+        return kind, canonical, repr(args)
+
+    def get(self, key: Hashable, generation: int) -> Tuple[bool, Any]:
+        """(найдено, значение) для ключа в текущем поколении данных"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != generation:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[1]
+
+    def put(self, key: Hashable, generation: int, value: Any):
+        self._entries[key] = (generation, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Сброс кэша при смене поколения данных"""
+        if self._entries:
+            self._entries.clear()
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики попаданий и промахов"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'bypassed': self.bypassed,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
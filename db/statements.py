@@ -0,0 +1,31 @@
+from collections import OrderedDict
+from typing import Tuple
+
+import asyncpg
+from asyncpg.prepared_stmt import PreparedStatement
+
+
+class StatementCachingConnection(asyncpg.Connection):
+    """Соединение пула с LRU кэшем подготовленных выражений по тексту запроса"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._prepared: "OrderedDict[str, PreparedStatement]" = OrderedDict()
+
+    async def prepared(self, query: str, max_size: int) -> Tuple[PreparedStatement, bool]:
+        """(подготовленное выражение, попадание в кэш) для текста запроса"""
+        statement = self._prepared.get(query)
+        if statement is not None:
+            self._prepared.move_to_end(query)
+            return statement, True
+
+        statement = await self.prepare(query)
+        self._prepared[query] = statement
+        # Вытесненные выражения закрываются asyncpg после сборки мусора
+        while len(self._prepared) > max_size:
+            self._prepared.popitem(last=False)
+        return statement, False
+
+    def forget(self, query: str):
+        """Удаление выражения, план которого стал недействительным"""
+        self._prepared.pop(query, None)
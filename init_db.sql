@@ -11,9 +11,10 @@ CREATE TABLE IF NOT EXISTS videos (
     updated_at TIMESTAMP NOT NULL
 );
 
--- Таблица video_snapshots
+-- Таблица video_snapshots, секционированная по месяцам created_at;
+-- секции создает загрузчик для месяцев, которые есть в выгрузке
 CREATE TABLE IF NOT EXISTS video_snapshots (
-    id VARCHAR(255) PRIMARY KEY,
+    id VARCHAR(255) NOT NULL,
     video_id VARCHAR(255) REFERENCES videos(id) ON DELETE CASCADE,
     views_count INTEGER NOT NULL DEFAULT 0,
     likes_count INTEGER NOT NULL DEFAULT 0,
@@ -24,7 +25,61 @@ CREATE TABLE IF NOT EXISTS video_snapshots (
     delta_comments_count INTEGER NOT NULL DEFAULT 0,
     delta_reports_count INTEGER NOT NULL DEFAULT 0,
     created_at TIMESTAMP NOT NULL,
-    updated_at TIMESTAMP NOT NULL
+    updated_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Состояние загрузки: водяные знаки для инкрементального режима
+-- и поколение данных для сброса кэша результатов в боте
+CREATE TABLE IF NOT EXISTS ingest_state (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    snapshot_watermark TIMESTAMP,
+    video_watermark TIMESTAMP,
+    generation BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Дневные агрегаты снапшотов (пересчитываются загрузчиком)
+CREATE TABLE IF NOT EXISTS daily_snapshot_totals (
+    day DATE PRIMARY KEY,
+    snapshots_count INTEGER NOT NULL DEFAULT 0,
+    active_videos INTEGER NOT NULL DEFAULT 0,
+    delta_views_count BIGINT NOT NULL DEFAULT 0,
+    delta_likes_count BIGINT NOT NULL DEFAULT 0,
+    delta_comments_count BIGINT NOT NULL DEFAULT 0,
+    delta_reports_count BIGINT NOT NULL DEFAULT 0,
+    videos_with_new_views INTEGER NOT NULL DEFAULT 0,
+    videos_with_new_likes INTEGER NOT NULL DEFAULT 0,
+    videos_with_new_comments INTEGER NOT NULL DEFAULT 0,
+    videos_with_new_reports INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS daily_creator_snapshot_totals (
+    day DATE NOT NULL,
+    creator_id VARCHAR(255) NOT NULL,
+    snapshots_count INTEGER NOT NULL DEFAULT 0,
+    active_videos INTEGER NOT NULL DEFAULT 0,
+    delta_views_count BIGINT NOT NULL DEFAULT 0,
+    delta_likes_count BIGINT NOT NULL DEFAULT 0,
+    delta_comments_count BIGINT NOT NULL DEFAULT 0,
+    delta_reports_count BIGINT NOT NULL DEFAULT 0,
+    videos_with_new_views INTEGER NOT NULL DEFAULT 0,
+    videos_with_new_likes INTEGER NOT NULL DEFAULT 0,
+    videos_with_new_comments INTEGER NOT NULL DEFAULT 0,
+    videos_with_new_reports INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, creator_id)
+);
+
+-- Журнал запросов бота для советника по индексам (python -m services.index_advisor)
+CREATE TABLE IF NOT EXISTS query_log (
+    id BIGSERIAL PRIMARY KEY,
+    fingerprint VARCHAR(16) NOT NULL,
+    query TEXT NOT NULL,
+    node VARCHAR(32) NOT NULL,
+    duration_ms DOUBLE PRECISION NOT NULL,
+    rows INTEGER NOT NULL,
+    plan JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
 );
 
 -- Индексы для оптимизации запросов
@@ -32,5 +87,7 @@ CREATE INDEX IF NOT EXISTS idx_videos_creator_id ON videos(creator_id);
 CREATE INDEX IF NOT EXISTS idx_videos_created_at ON videos(video_created_at);
 CREATE INDEX IF NOT EXISTS idx_videos_views ON videos(views_count);
 CREATE INDEX IF NOT EXISTS idx_snapshots_video_id ON video_snapshots(video_id);
-CREATE INDEX IF NOT EXISTS idx_snapshots_created_at ON video_snapshots(created_at);
-CREATE INDEX IF NOT EXISTS idx_snapshots_date ON video_snapshots(DATE(created_at));
\ No newline at end of file
+-- Снапшоты пишутся по времени: BRIN по created_at компактен и дешев для загрузчика
+CREATE INDEX IF NOT EXISTS idx_snapshots_created_at ON video_snapshots USING BRIN (created_at);
+CREATE INDEX IF NOT EXISTS idx_creator_totals_creator ON daily_creator_snapshot_totals(creator_id, day);
+CREATE INDEX IF NOT EXISTS idx_query_log_created_at ON query_log(created_at);
@@ -0,0 +1,201 @@
+import re
+from calendar import monthrange
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+DateRange = Tuple[datetime, datetime]
+
+MONTHS = {
+    'января': 1, 'февраля': 2, 'марта': 3, 'апреля': 4,
+    'мая': 5, 'июня': 6, 'июля': 7, 'августа': 8,
+    'сентября': 9, 'октября': 10, 'ноября': 11, 'декабря': 12,
+    'январь': 1, 'февраль': 2, 'март': 3, 'апрель': 4,
+    'май': 5, 'июнь': 6, 'июль': 7, 'август': 8,
+    'сентябрь': 9, 'октябрь': 10, 'ноябрь': 11, 'декабрь': 12
+}
+
+_MONTH = '(?:' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + ')'
+
+# Граница диапазона: "15 января 2024", "15 января", "15", "15.01.2024"
+_ENDPOINT = r'\d{1,2}[./-]\d{1,2}[./-]\d{4}|\d{1,2}(?:\s+' + _MONTH + r')?(?:\s+\d{4})?'
+_ENDPOINT_PATTERN = re.compile(
+    r'(?P<day>\d{1,2})(?:[./-](?P<num_month>\d{1,2})[./-](?P<num_year>\d{4})'
+    r'|(?:\s+(?P<month>' + _MONTH + r'))?(?:\s+(?P<year>\d{4}))?)$'
+)
+
+# Все выражения дат разбираются одним проходом по тексту (уже в нижнем регистре);
+# порядок альтернатив важен, опережающая проверка отсекает позиции, с которых не начинается ни одна
+_DATE_PATTERN = re.compile(
+    r'(?=[\dсозпвтэнмк])(?:'
+    r'(?P<range>\b(?:с|со|от)\s+(?P<range_start>' + _ENDPOINT + r')\s+(?:по|до)\s+(?P<range_end>' + _ENDPOINT + r'))'
+    r'|(?P<text_date>\b(?P<td_day>\d{1,2})\s+(?P<td_month>' + _MONTH + r')(?:\s+(?P<td_year>\d{4}))?)'
+    r'|(?P<num_date>\b(?P<nd_day>\d{1,2})[./-](?P<nd_month>\d{1,2})[./-](?P<nd_year>\d{4}))'
+    r'|(?P<period>\b(?:за\s+(?:последни\w*\s+)?|последни\w*\s+)(?P<period_value>\d+)\s+'
+    r'(?P<period_unit>дн|день|недел|месяц|год|лет)\w*)'
+    r'|(?P<quarter>\b(?:(?P<quarter_num>[1-4])(?:-?(?:й|ый|ий|м|ом|ем))?\s*|(?P<quarter_mod>прошл|текущ|эт)\w*\s+)?'
+    r'квартал\w*(?:\s+(?P<quarter_year>\d{4}))?)'
+    r'|(?P<day_word>\b(?:позавчера|вчера|сегодня)\b)'
+    r'|(?P<relative>\b(?:(?P<relative_mod>прошл|последн|текущ|эт)\w*\s+)?(?P<relative_unit>недел|месяц)\w*))'
+)
+
+# Приоритет при нескольких выражениях: явный диапазон точнее относительного периода
+_PRIORITY = ('range', 'date', 'period', 'quarter', 'day_word', 'relative')
+
+_DAY_OFFSETS = {'сегодня': 0, 'вчера': 1, 'позавчера': 2}
+
+
+def day_start(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def day_end(value: datetime) -> datetime:
+    return value.replace(hour=23, minute=59, second=59, microsecond=999999)
+
+
+def shift_months(value: datetime, months: int) -> datetime:
+    """Сдвиг на календарные месяцы с ограничением дня концом месяца"""
+    index = value.year * 12 + value.month - 1 + months
+    year, month = divmod(index, 12)
+    month += 1
+    return value.replace(year=year, month=month, day=min(value.day, monthrange(year, month)[1]))
+
+
+def quarter_dates(year: int, quarter: int) -> DateRange:
+    """Даты начала и конца квартала"""
+    start_month = (quarter - 1) * 3 + 1
+    end_month = start_month + 2
+    return (
+        datetime(year, start_month, 1),
+        day_end(datetime(year, end_month, monthrange(year, end_month)[1]))
+    )
+
+
+class DateExtractor:
+    """Извлечение диапазона дат из русского текста одним проходом скомпилированного шаблона"""
+
+    def __init__(self, now: Callable[[], datetime] = datetime.now):
+        # Источник текущего времени подменяется в бенчмарках и проверках
+        self.now = now
+
+    def extract(self, text: str, now: Optional[datetime] = None) -> Optional[DateRange]:
+        """Диапазон дат [начало дня, конец дня] из текста или None"""
+        now = now or self.now()
+        found = {kind: [] for kind in _PRIORITY}
+
+        for match in _DATE_PATTERN.finditer(text.lower()):
+            kind = match.lastgroup
+            if kind in ('text_date', 'num_date'):
+                kind = 'date'
+            try:
+                value = self._resolve(kind, match, now)
+            except ValueError:
+                # Несуществующая дата (например, 31 февраля)
+                continue
+            if value is not None:
+                found[kind].append(value)
+
+        for kind in _PRIORITY:
+            values: List[DateRange] = found[kind]
+            if not values:
+                continue
+            if kind == 'date':
+                # Несколько дат: от первой до последней
+                return values[0][0], values[-1][1]
+            return values[0]
+
+        return None
+
+    def _resolve(self, kind: str, match: re.Match, now: datetime) -> Optional[DateRange]:
+        if kind == 'range':
+            end = self._endpoint(match.group('range_end'), None, now)
+            start = self._endpoint(match.group('range_start'), end, now)
+            if start > end:
+                return None
+            return start, day_end(end)
+
+        if kind == 'date':
+            if match.group('td_day'):
+                day, month = int(match.group('td_day')), MONTHS[match.group('td_month')]
+                year = self._year(match.group('td_year'), month, day, now)
+            else:
+                day, month, year = int(match.group('nd_day')), int(match.group('nd_month')), int(match.group('nd_year'))
+            date = datetime(year, month, day)
+            return date, day_end(date)
+
+        if kind == 'period':
+            value = int(match.group('period_value'))
+            unit = match.group('period_unit')
+            if unit in ('дн', 'день'):
+                start = now - timedelta(days=value)
+            elif unit == 'недел':
+                start = now - timedelta(weeks=value)
+            elif unit == 'месяц':
+                start = shift_months(now, -value)
+            else:
+                start = shift_months(now, -12 * value)
+            return day_start(start), day_end(now)
+
+        if kind == 'quarter':
+            current = (now.month - 1) // 3 + 1
+            year = int(match.group('quarter_year')) if match.group('quarter_year') else now.year
+            if match.group('quarter_num'):
+                return quarter_dates(year, int(match.group('quarter_num')))
+            if match.group('quarter_mod') == 'прошл':
+                return quarter_dates(year - 1, 4) if current == 1 else quarter_dates(year, current - 1)
+            return quarter_dates(year, current)
+
+        if kind == 'day_word':
+            day = now - timedelta(days=_DAY_OFFSETS[match.group('day_word')])
+            return day_start(day), day_end(day)
+
+        if kind == 'relative':
+            previous = match.group('relative_mod') in ('прошл', 'последн')
+            if match.group('relative_unit') == 'недел':
+                start = day_start(now - timedelta(days=now.weekday()))
+                if previous:
+                    start -= timedelta(weeks=1)
+                return start, day_end(start + timedelta(days=6))
+
+            start = day_start(now.replace(day=1))
+            if previous:
+                start = shift_months(start, -1)
+                return start, day_end(now.replace(day=1) - timedelta(days=1))
+            # Текущий месяц - по сегодняшний день
+            return start, day_end(now)
+
+        return None
+
+    def _endpoint(self, text: str, end: Optional[datetime], now: datetime) -> datetime:
+        """Граница диапазона; недостающие месяц и год берутся у конечной даты"""
+        match = _ENDPOINT_PATTERN.match(text)
+        if match is None:
+            raise ValueError(text)
+
+        day = int(match.group('day'))
+        if match.group('num_month'):
+            return datetime(int(match.group('num_year')), int(match.group('num_month')), day)
+
+        if match.group('month'):
+            month = MONTHS[match.group('month')]
+        elif end is not None:
+            month = end.month
+        else:
+            raise ValueError(text)
+
+        if match.group('year'):
+            year = int(match.group('year'))
+        elif end is not None:
+            # "с 25 декабря по 5 января 2026" - начало в предыдущем году
+            year = end.year if (month, day) <= (end.month, end.day) else end.year - 1
+        else:
+            year = self._year(None, month, day, now)
+        return datetime(year, month, day)
+
+    @staticmethod
+    def _year(year: Optional[str], month: int, day: int, now: datetime) -> int:
+        """Год даты; без явного года - ближайший, не позже текущей даты"""
+        if year:
+            return int(year)
+        if (month, day) > (now.month, now.day):
+            return now.year - 1
+        return now.year
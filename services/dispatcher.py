@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, NamedTuple, Optional
+
+from services.metrics import record_stage
+
+logger = logging.getLogger(__name__)
+
+
+class _Job(NamedTuple):
+    factory: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    enqueued_at: float
+
+
+class QueryDispatcher:
+    """Ограниченная очередь вопросов с фиксированным числом обработчиков.
+
+    Чаты обслуживаются по кругу, у каждого чата ограничено число одновременно
+    выполняемых и ожидающих вопросов; при переполнении новый вопрос отклоняется.
+    """
+
+    def __init__(
+            self,
+            workers: int = 4,
+            max_queue: int = 100,
+            chat_concurrency: int = 1,
+            chat_queue: int = 5
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.chat_concurrency = chat_concurrency
+        self.chat_queue = chat_queue
+
+        self._queues: Dict[Hashable, Deque[_Job]] = {}
+        # Очередь готовых к выполнению чатов: одна запись на один выполнимый вопрос
+        self._ready: Deque[Hashable] = deque()
+        self._ready_signal = asyncio.Semaphore(0)
+        # Записи в _ready и выполняемые вопросы по чатам
+        self._ready_count: Counter = Counter()
+        self._running: Counter = Counter()
+        self._size = 0
+        self._tasks: List[asyncio.Task] = []
+
+        self.started = 0
+        self.processed = 0
+        self.failed = 0
+        self.shed = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def start(self):
+        """Запуск обработчиков очереди"""
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Диспетчер вопросов запущен: {self.workers} обработчиков, очередь {self.max_queue}")
+
+    async def stop(self):
+        """Остановка обработчиков; ожидающие вопросы отменяются"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        for queue in self._queues.values():
+            for job in queue:
+                job.future.cancel()
+        self._queues.clear()
+        self._ready.clear()
+        self._ready_count.clear()
+        self._running.clear()
+        self._size = 0
+
+    def submit(self, chat_id: Hashable, factory: Callable[[], Awaitable[Any]]) -> Optional[asyncio.Future]:
+        """Постановка вопроса в очередь; None, если очередь чата или общая очередь заполнена"""
+        queue = self._queues.get(chat_id)
+        if self._size >= self.max_queue or (queue is not None and len(queue) >= self.chat_queue):
+            self.shed += 1
+            logger.warning(f"Вопрос чата {chat_id} отклонен: очередь заполнена ({self._size})")
+            return None
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(chat_id, deque()).append(_Job(factory, future, time.monotonic()))
+        self._size += 1
+        self.max_depth = max(self.max_depth, self._size)
+        self._schedule(chat_id)
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        """Глубина очереди, время ожидания и число отклоненных вопросов"""
+        return {
+            'depth': self._size,
+            'max_depth': self.max_depth,
+            'running': sum(self._running.values()),
+            'processed': self.processed,
+            'failed': self.failed,
+            'shed': self.shed,
+            'wait_avg': self.wait_total / self.started if self.started else 0.0,
+            'wait_max': self.wait_max,
+        }
+
+    def _schedule(self, chat_id: Hashable):
+        """Постановка чата в круговую очередь, если у него есть ожидающий вопрос и свободный слот"""
+        queue = self._queues.get(chat_id)
+        if not queue or len(queue) <= self._ready_count[chat_id]:
+            return
+        if self._ready_count[chat_id] + self._running[chat_id] >= self.chat_concurrency:
+            return
+        self._ready.append(chat_id)
+        self._ready_count[chat_id] += 1
+        self._ready_signal.release()
+
+    async def _worker(self):
+        while True:
+            await self._ready_signal.acquire()
+            chat_id = self._ready.popleft()
+            self._ready_count[chat_id] -= 1
+            self._running[chat_id] += 1
+            job = self._queues[chat_id].popleft()
+            self._size -= 1
+
+            try:
+                # Вопрос, который больше никто не ждет, не выполняется
+                if job.future.cancelled():
+                    continue
+
+                self.started += 1
+                waited = time.monotonic() - job.enqueued_at
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+                record_stage('queue_wait', waited)
+
+                result = await job.factory()
+                self.processed += 1
+                if not job.future.cancelled():
+                    job.future.set_result(result)
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                if not job.future.cancelled():
+                    job.future.set_exception(e)
+            finally:
+                self._release(chat_id)
+
+    def _release(self, chat_id: Hashable):
+        """Освобождение слота чата и постановка его следующего вопроса в конец круга"""
+        self._running[chat_id] -= 1
+        if self._queues.get(chat_id):
+            self._schedule(chat_id)
+        elif not self._running[chat_id] and not self._ready_count[chat_id]:
+            self._queues.pop(chat_id, None)
+            del self._running[chat_id]
+            del self._ready_count[chat_id]
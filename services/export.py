@@ -0,0 +1,60 @@
+import csv
+import gzip
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+async def export_csv(
+        db,
+        query: str,
+        args: tuple = (),
+        path: str = 'export.csv',
+        compress: bool = False,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_rows: int = 0,
+        guard=None
+) -> Dict[str, Any]:
+    """Запись результата запроса в CSV (или CSV.gz) порциями курсора; max_rows - ограничение строк (0 - без него)"""
+    started = time.perf_counter()
+    rows = 0
+    truncated = False
+
+    # utf-8-sig: Excel распознает кириллицу в CSV только с BOM
+    opener = gzip.open if compress else open
+    with opener(path, 'wt', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        async with db.stream_query(query, *args, chunk_size=chunk_size, guard=guard) as (columns, chunks):
+            writer.writerow(columns)
+            async for chunk in chunks:
+                if max_rows and rows + len(chunk) > max_rows:
+                    chunk = chunk[:max_rows - rows]
+                    truncated = True
+                writer.writerows(chunk)
+                rows += len(chunk)
+                if truncated:
+                    break
+
+    report = {
+        'rows': rows,
+        'columns': len(columns),
+        'truncated': truncated,
+        'bytes': os.path.getsize(path),
+        'seconds': time.perf_counter() - started,
+    }
+    logger.info(
+        f"Выгрузка {path}: {rows} строк, {report['bytes']} байт за {report['seconds']:.2f} с"
+        + (" (обрезана)" if truncated else "")
+    )
+    return report
+
+
+def export_filename(compress: bool, stamp: Optional[float] = None) -> str:
+    """Имя файла выгрузки для пользователя"""
+    name = time.strftime('export-%Y%m%d-%H%M%S', time.localtime(stamp))
+    return f"{name}.csv.gz" if compress else f"{name}.csv"
@@ -0,0 +1,256 @@
+import logging
+import re
+from collections import Counter
+from datetime import datetime, time, timedelta
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from services.date_extractor import MONTHS
+from services.sql_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+
+class FastPlan(NamedTuple):
+    """Запрос, построенный без LLM: намерение, параметризованный SQL и аргументы"""
+    intent: str
+    sql: str
+    args: tuple
+    params: Dict[str, Any]
+
+
+# Колонки метрик по основе слова в вопросе
+METRICS = {
+    'просмотр': 'views_count',
+    'лайк': 'likes_count',
+    'коммент': 'comments_count',
+    'жалоб': 'reports_count',
+    'репорт': 'reports_count',
+}
+
+_METRIC = r'(?P<metric>просмотр\w*|лайк\w*|коммент\w*|жалоб\w*|репорт\w*)'
+_CREATOR = r'(?P<creator> (?:у |от )?креатора(?: с)? id \S+)'
+_MULTIPLIERS = {'тыс': 1000, 'тысяч': 1000, 'тысячи': 1000, 'тысячу': 1000,
+                'млн': 1000000, 'миллион': 1000000, 'миллиона': 1000000, 'миллионов': 1000000}
+_NUMBER = r'(?P<num>\d+(?: \d{3})*)(?: (?P<mult>' + '|'.join(_MULTIPLIERS) + r'))?'
+_CMP = r'(?P<cmp>больше|более|свыше|меньше|менее)(?: чем)?'
+
+_RULES = [
+    ('total_videos', re.compile(
+        r'^сколько (?:всего )?видео(?: всего)?(?: есть| имеется| хранится)?(?: всего)?'
+        r'(?: в (?:системе|базе(?: данных)?))?$'
+    )),
+    ('videos_published', re.compile(
+        r'^сколько (?:всего )?видео' + _CREATOR + r'? (?:было )?'
+        r'(?:вышло|опубликовано|выложено|загружено|создано)(?P<date> .+)?$'
+    )),
+    ('videos_over_threshold', re.compile(
+        r'^сколько (?:всего )?видео' + _CREATOR + r'? '
+        r'(?:набрало|набрали|имеет|имеют|получило|получили|собрало|собрали) '
+        + _CMP + ' ' + _NUMBER + ' ' + _METRIC + '$'
+    )),
+    ('growth', re.compile(
+        r'^на сколько ' + _METRIC + r' (?:выросли|выросло|увеличились|прибавили) (?:все )?видео'
+        + _CREATOR + r'?(?P<date> .+)$'
+    )),
+    ('distinct_growing', re.compile(
+        r'^сколько (?:разных |уникальных )?видео' + _CREATOR + r'? '
+        r'(?:получали|получили|получило) (?:новые )?' + _METRIC + r'(?P<date> .+)$'
+    )),
+]
+
+# Хвост вопроса, состоящий только из выражения одной даты или периода. Слова границ (с, по, от, до)
+# и союз "и" сюда не входят: открытый диапазон или несколько дат уходят в LLM
+_DATE_WORDS = (
+    r'за|в|на|включительно|года?|г|й|ый|ом|'
+    r'сегодня|вчера|эт[аоуй]|текущ\w*|прошл\w*|последн\w*|'
+    r'недел\w*|месяц\w*|дн[яей]+|день|квартал\w*|\d{1,4}|' + '|'.join(MONTHS)
+)
+_DATE_PART = r'(?: (?:' + _DATE_WORDS + r'))+'
+_DATE_TAIL = re.compile(r'^' + _DATE_PART + r'$')
+# Закрытый диапазон "с X по Y" / "от X до Y" на весь хвост
+_RANGE_TAIL = re.compile(r'^ (?:с|от)' + _DATE_PART + r' (?:по|до)' + _DATE_PART + r'$')
+
+_MONTH_IN_TAIL = re.compile(r'\b(?:' + '|'.join(MONTHS) + r')\b')
+_DAY = re.compile(r'\b(\d{1,2})\b')
+
+_CREATOR_ID = re.compile(r'\bid\s*[:=]?\s*([\w\-]+)', re.IGNORECASE)
+
+
+class FastPathPlanner:
+    """Правила для частых вопросов, которые переводятся в SQL без обращения к LLM"""
+
+    def __init__(self, use_rollups: bool = True):
+        # Дневные агрегаты (daily_snapshot_totals) для вопросов с целыми днями
+        self.use_rollups = use_rollups
+        self.hits: Counter = Counter()
+        self.misses = 0
+
+    def plan(self, question: str, date_range: Optional[Tuple[datetime, datetime]]) -> Optional[FastPlan]:
+        """Параметризованный SQL для вопроса или None, если ни одно правило не подошло"""
+        text = normalize_question(question)
+
+        for intent, pattern in _RULES:
+            match = pattern.match(text)
+            if not match:
+                continue
+
+            plan = self._build(intent, match, question, date_range)
+            if plan is not None:
+                self.hits[intent] += 1
+                logger.info(f"Быстрый путь: {intent} {plan.params}")
+                return plan
+
+        self.misses += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Доля вопросов, отвеченных без LLM"""
+        hits = sum(self.hits.values())
+        total = hits + self.misses
+        return {
+            'hits': hits,
+            'misses': self.misses,
+            'hit_rate': hits / total if total else 0.0,
+            'by_intent': dict(self.hits),
+        }
+
+    def _build(
+            self,
+            intent: str,
+            match: re.Match,
+            question: str,
+            date_range: Optional[Tuple[datetime, datetime]]
+    ) -> Optional[FastPlan]:
+        groups = match.groupdict()
+
+        # Дата в вопросе должна быть распознана и не содержать лишних условий
+        date_tail = groups.get('date')
+        if date_tail:
+            if not date_range:
+                return None
+            if not _DATE_TAIL.match(date_tail):
+                # Границы диапазона принимаются, только если извлечен сам диапазон, а не один день
+                if not _RANGE_TAIL.match(date_tail) or date_range[0].date() == date_range[1].date():
+                    return None
+            if not self._days_match(date_tail, date_range):
+                return None
+        elif date_range:
+            return None
+
+        params: Dict[str, Any] = {}
+        if groups.get('creator'):
+            creator = _CREATOR_ID.search(question)
+            if not creator:
+                return None
+            params['creator_id'] = creator.group(1)
+        if groups.get('metric'):
+            params['metric'] = self._metric(groups['metric'])
+        if date_range:
+            # Полуинтервал [начало, конец) по меткам времени без DATE() над колонкой
+            params['start'] = date_range[0]
+            params['end'] = date_range[1] + timedelta(microseconds=1)
+
+        if intent == 'total_videos':
+            return FastPlan(intent, "SELECT COUNT(*) FROM videos", (), params)
+
+        if intent == 'videos_published':
+            conditions, args = self._conditions(params, 'video_created_at', 'creator_id')
+            return FastPlan(intent, "SELECT COUNT(*) FROM videos" + conditions, args, params)
+
+        if intent == 'videos_over_threshold':
+            params['threshold'] = int(groups['num'].replace(' ', '')) * _MULTIPLIERS.get(groups['mult'], 1)
+            params['operator'] = '>' if groups['cmp'] in ('больше', 'более', 'свыше') else '<'
+            conditions, args = self._conditions(params, None, 'creator_id')
+            args = (*args, params['threshold'])
+            conditions += (" AND " if conditions else " WHERE ") + f"{params['metric']} {params['operator']} ${len(args)}"
+            return FastPlan(intent, "SELECT COUNT(*) FROM videos" + conditions, args, params)
+
+        if intent in ('growth', 'distinct_growing') and self.use_rollups and self._whole_days(date_range):
+            plan = self._rollup_plan(intent, params, date_range)
+            if plan is not None:
+                return plan
+
+        creator_filter = 'video_id IN (SELECT id FROM videos WHERE creator_id = ${})'
+        if intent == 'growth':
+            conditions, args = self._conditions(params, 'created_at', creator_filter)
+            sql = f"SELECT SUM(delta_{params['metric']}) FROM video_snapshots" + conditions
+            return FastPlan(intent, sql, args, params)
+
+        if intent == 'distinct_growing':
+            conditions, args = self._conditions(params, 'created_at', creator_filter)
+            sql = (
+                f"SELECT COUNT(DISTINCT video_id) FROM video_snapshots"
+                f"{conditions} AND delta_{params['metric']} > 0"
+            )
+            return FastPlan(intent, sql, args, params)
+
+        return None
+
+    @staticmethod
+    def _rollup_plan(
+            intent: str,
+            params: Dict[str, Any],
+            date_range: Tuple[datetime, datetime]
+    ) -> Optional[FastPlan]:
+        """Запрос к дневным агрегатам вместо сканирования video_snapshots"""
+        start, end = date_range[0].date(), date_range[1].date()
+        table = 'daily_creator_snapshot_totals' if 'creator_id' in params else 'daily_snapshot_totals'
+
+        if intent == 'growth':
+            args: tuple = (start, end)
+            conditions = "day >= $1 AND day <= $2"
+            column = f"SUM(delta_{params['metric']})"
+        elif start == end:
+            # Число разных видео суммируется только в пределах одного дня
+            args = (start,)
+            conditions = "day = $1"
+            column = f"COALESCE(SUM(videos_with_new_{params['metric'][:-len('_count')]}), 0)"
+        else:
+            return None
+
+        if 'creator_id' in params:
+            args = (*args, params['creator_id'])
+            conditions += f" AND creator_id = ${len(args)}"
+        params['rollup'] = table
+        return FastPlan(intent, f"SELECT {column} FROM {table} WHERE {conditions}", args, params)
+
+    @staticmethod
+    def _whole_days(date_range: Optional[Tuple[datetime, datetime]]) -> bool:
+        """Диапазон покрывает целые календарные дни"""
+        if not date_range:
+            return False
+        start, end = date_range
+        return start.time() == time.min and end.time() == time.max
+
+    @staticmethod
+    def _days_match(date_tail: str, date_range: Tuple[datetime, datetime]) -> bool:
+        """Дни календарных дат в вопросе должны быть границами извлеченного диапазона"""
+        if not _MONTH_IN_TAIL.search(date_tail):
+            return True
+        bounds = {date_range[0].day, date_range[1].day}
+        return all(int(day) in bounds for day in _DAY.findall(date_tail))
+
+    @staticmethod
+    def _metric(word: str) -> str:
+        for stem, column in METRICS.items():
+            if word.startswith(stem):
+                return column
+        return 'views_count'
+
+    @staticmethod
+    def _conditions(params: Dict[str, Any], time_column: Optional[str], creator_filter: str) -> Tuple[str, tuple]:
+        """WHERE с фильтрами по периоду и креатору; аргументы передаются как $n"""
+        conditions = []
+        args: list = []
+        if time_column and 'start' in params:
+            args.extend((params['start'], params['end']))
+            conditions.append(f"{time_column} >= ${len(args) - 1} AND {time_column} < ${len(args)}")
+        if 'creator_id' in params:
+            args.append(params['creator_id'])
+            if '{}' in creator_filter:
+                conditions.append(creator_filter.format(len(args)))
+            else:
+                conditions.append(f"{creator_filter} = ${len(args)}")
+        if not conditions:
+            return "", ()
+        return " WHERE " + " AND ".join(conditions), tuple(args)
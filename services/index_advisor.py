@@ -0,0 +1,349 @@
+"""Советник по индексам по журналу запросов бота (таблица query_log).
+
+Запуск из корня проекта:
+    python -m services.index_advisor --days 7 --top 10
+Отпечатки запросов агрегируются за период; по последним планам находятся последовательные
+сканирования больших таблиц, и для их фильтров предлагаются индексы (составные, частичные,
+по выражению). Индексы без сканирований и без упоминаний в планах предлагается удалить.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from db.config import settings
+from db.database import Database
+from db.query_log import QUERY_LOG_TABLE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FINGERPRINTS_QUERY = f"""
+    SELECT fingerprint, MIN(query) AS query, COUNT(*) AS calls,
+           SUM(duration_ms) AS total_ms, AVG(duration_ms) AS avg_ms,
+           percentile_cont(0.95) WITHIN GROUP (ORDER BY duration_ms) AS p95_ms,
+           AVG(rows) AS avg_rows
+    FROM {QUERY_LOG_TABLE}
+    WHERE created_at >= $1
+    GROUP BY fingerprint
+    ORDER BY total_ms DESC
+"""
+
+# Последний сохраненный план каждого отпечатка
+PLANS_QUERY = f"""
+    SELECT DISTINCT ON (fingerprint) fingerprint, plan
+    FROM {QUERY_LOG_TABLE}
+    WHERE created_at >= $1 AND plan IS NOT NULL
+    ORDER BY fingerprint, created_at DESC
+"""
+
+# Секции -> секционированная таблица или индекс
+PARENTS_QUERY = """
+    SELECT c.relname AS child, p.relname AS parent, p.relkind AS kind
+    FROM pg_inherits h
+    JOIN pg_class c ON c.oid = h.inhrelid
+    JOIN pg_class p ON p.oid = h.inhparent
+    JOIN pg_namespace n ON n.oid = p.relnamespace
+    WHERE n.nspname = 'public'
+"""
+
+# Индексы таблиц; индексы секций суммируются в индекс секционированной таблицы
+INDEXES_QUERY = f"""
+    SELECT COALESCE(parent.relname, i.relname) AS index_name,
+           COALESCE(parent_table.relname, t.relname) AS table_name,
+           pg_get_indexdef(COALESCE(parent.oid, i.oid)) AS definition,
+           x.indisunique OR x.indisprimary AS is_unique,
+           SUM(COALESCE(s.idx_scan, 0)) AS scans,
+           SUM(pg_relation_size(i.oid)) AS bytes
+    FROM pg_index x
+    JOIN pg_class i ON i.oid = x.indexrelid
+    JOIN pg_class t ON t.oid = x.indrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = x.indexrelid
+    LEFT JOIN pg_inherits h ON h.inhrelid = i.oid
+    LEFT JOIN pg_class parent ON parent.oid = h.inhparent
+    LEFT JOIN pg_index px ON px.indexrelid = parent.oid
+    LEFT JOIN pg_class parent_table ON parent_table.oid = px.indrelid
+    WHERE n.nspname = 'public' AND COALESCE(parent_table.relname, t.relname) <> '{QUERY_LOG_TABLE}'
+    GROUP BY 1, 2, 3, 4
+"""
+
+STATS_RESET_QUERY = "SELECT stats_reset FROM pg_stat_database WHERE datname = current_database()"
+
+SCAN_NODES = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+_REVERSED = {'<': '>', '<=': '>=', '>': '<', '>=': '<=', '=': '='}
+
+# Приведения типов в тексте Filter, которые не влияют на выбор индекса
+_CAST = re.compile(
+    r'::(?:timestamp(?:\(\d\))? with(?:out)? time zone|character varying|double precision|"?[a-z_]\w*"?)(?:\[\])?'
+)
+# Скобки вокруг имени или параметра, но не вызов функции date(created_at)
+_WRAPPED = re.compile(r'(?<!\w)\((\w+|\$\d+)\)')
+_COMPARISON = re.compile(r'^(?P<left>.+?)\s*(?P<op><>|!=|<=|>=|=|<|>)\s*(?P<right>.+)$')
+_COLUMN = re.compile(r'^[a-z_]\w*$')
+_EXPRESSION = re.compile(r'^[a-z_]\w*\([a-z_]\w*\)$')
+_NUMBER = re.compile(r'^-?\d+(?:\.\d+)?$')
+
+
+class Condition(NamedTuple):
+    key: str
+    op: str
+    value: str
+
+
+class Candidate(NamedTuple):
+    table: str
+    keys: Tuple[str, ...]
+    predicate: Optional[str]
+
+
+def plan_nodes(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def _strip_parens(text: str) -> str:
+    """Снятие внешних скобок, охватывающих все выражение"""
+    text = text.strip()
+    while text.startswith('(') and text.endswith(')'):
+        depth = 0
+        for position, char in enumerate(text):
+            depth += char == '('
+            depth -= char == ')'
+            if depth == 0 and position < len(text) - 1:
+                return text
+        text = text[1:-1].strip()
+    return text
+
+
+def _split_and(text: str) -> Optional[List[str]]:
+    """Части условия, соединенные AND на верхнем уровне; None, если есть OR"""
+    parts, depth, start = [], 0, 0
+    upper = text.upper()
+    position = 0
+    while position < len(text):
+        char = text[position]
+        if char == "'":
+            position = text.index("'", position + 1) + 1 if "'" in text[position + 1:] else len(text)
+            continue
+        depth += char == '('
+        depth -= char == ')'
+        if depth == 0:
+            if upper.startswith(' OR ', position):
+                return None
+            if upper.startswith(' AND ', position):
+                parts.append(text[start:position])
+                start = position + len(' AND ')
+                position = start
+                continue
+        position += 1
+    parts.append(text[start:])
+    return [_strip_parens(part) for part in parts]
+
+
+def parse_filter(text: str) -> Optional[List[Condition]]:
+    """Сравнения столбцов и выражений над столбцом из Filter плана; None для условий с OR"""
+    text = _CAST.sub('', text)
+    while True:
+        unwrapped = _WRAPPED.sub(r'\1', text)
+        if unwrapped == text:
+            break
+        text = unwrapped
+
+    parts = _split_and(_strip_parens(text))
+    if parts is None:
+        return None
+
+    conditions = []
+    for part in parts:
+        match = _COMPARISON.match(part)
+        if match is None:
+            continue
+        left, op, right = _strip_parens(match.group('left')), match.group('op'), _strip_parens(match.group('right'))
+        if not (_COLUMN.match(left) or _EXPRESSION.match(left)) and (_COLUMN.match(right) or _EXPRESSION.match(right)):
+            left, right, op = right, left, _REVERSED.get(op, op)
+        if (_COLUMN.match(left) or _EXPRESSION.match(left)) and op in _REVERSED:
+            conditions.append(Condition(left, op, right))
+    return conditions
+
+
+def candidate_for(table: str, conditions: List[Condition]) -> Optional[Candidate]:
+    """Индекс под условия: равенства, затем один диапазон; числовые константы в диапазонах - в WHERE"""
+    equal: List[str] = []
+    ranges: List[str] = []
+    partial: List[str] = []
+    for condition in conditions:
+        if condition.op == '=':
+            if condition.key not in equal:
+                equal.append(condition.key)
+        elif _NUMBER.match(condition.value) and _COLUMN.match(condition.key):
+            # Постоянный порог (delta_views_count > 0) сужает индекс, а не входит в ключ
+            partial.append(f"{condition.key} {condition.op} {condition.value}")
+        elif condition.key not in ranges:
+            ranges.append(condition.key)
+
+    keys = tuple(equal + [key for key in ranges[:1] if key not in equal])
+    if not keys:
+        return None
+    return Candidate(table, keys, ' AND '.join(sorted(partial)) or None)
+
+
+def index_keys(definition: str) -> Tuple[Tuple[str, ...], Optional[str]]:
+    """(ключи, условие WHERE) из pg_get_indexdef"""
+    match = re.search(r'USING \w+ \((.*?)\)(?: WHERE \((.*)\))?$', definition)
+    if match is None:
+        return (), None
+    keys, depth, start = [], 0, 0
+    text = match.group(1)
+    for position, char in enumerate(text + ','):
+        depth += char == '('
+        depth -= char == ')'
+        if char == ',' and depth == 0:
+            keys.append(_strip_parens(text[start:position]).split(' ')[0])
+            start = position + 1
+    return tuple(keys), match.group(2)
+
+
+def render_create(candidate: Candidate, partitioned: bool) -> str:
+    keys = ', '.join(key if _COLUMN.match(key) else f"({key})" for key in candidate.keys)
+    name = re.sub(r'\W+', '_', f"idx_{candidate.table}_{'_'.join(candidate.keys)}").strip('_')
+    if candidate.predicate:
+        name += '_partial'
+    # CONCURRENTLY не поддерживается для секционированных таблиц
+    concurrently = '' if partitioned else 'CONCURRENTLY '
+    sql = f"CREATE INDEX {concurrently}IF NOT EXISTS {name[:63]} ON {candidate.table} ({keys})"
+    if candidate.predicate:
+        sql += f" WHERE {candidate.predicate}"
+    return sql + ';'
+
+
+def analyze(
+        fingerprints: List[Dict[str, Any]],
+        plans: Dict[str, Dict[str, Any]],
+        indexes: List[Dict[str, Any]],
+        parents: Dict[str, str],
+        min_cost: float = 1000
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(предлагаемые индексы, неиспользуемые индексы) по агрегатам отпечатков и их планам"""
+    existing = [(row['table_name'], *index_keys(row['definition'])) for row in indexes]
+    used: Set[str] = set()
+    suggestions: Dict[Candidate, Dict[str, Any]] = {}
+
+    for row in fingerprints:
+        plan = plans.get(row['fingerprint'])
+        if plan is None:
+            continue
+        for node in plan_nodes(plan):
+            if node.get('Node Type') in SCAN_NODES and 'Index Name' in node:
+                used.add(parents.get(node['Index Name'], node['Index Name']))
+            if node.get('Node Type') != 'Seq Scan' or 'Filter' not in node:
+                continue
+            if node.get('Total Cost', 0) < min_cost:
+                continue
+
+            table = parents.get(node['Relation Name'], node['Relation Name'])
+            conditions = parse_filter(node['Filter'])
+            candidate = candidate_for(table, conditions) if conditions else None
+            if candidate is None:
+                continue
+            covered = any(
+                existing_table == table and keys[:len(candidate.keys)] == candidate.keys
+                and (predicate or None) == (candidate.predicate and _strip_parens(candidate.predicate))
+                for existing_table, keys, predicate in existing
+            )
+            if covered:
+                continue
+
+            # Оценка выгоды: суммарная стоимость последовательных сканирований за период
+            entry = suggestions.setdefault(candidate, {
+                'candidate': candidate, 'cost': 0.0, 'total_ms': 0.0, 'calls': 0, 'fingerprints': [],
+            })
+            entry['cost'] += node['Total Cost'] * row['calls']
+            entry['calls'] += row['calls']
+            if row['fingerprint'] not in entry['fingerprints']:
+                entry['fingerprints'].append(row['fingerprint'])
+                entry['total_ms'] += row['total_ms']
+
+    unused = [
+        row for row in indexes
+        if not row['is_unique'] and not row['scans'] and row['index_name'] not in used
+    ]
+    ranked = sorted(suggestions.values(), key=lambda entry: entry['cost'], reverse=True)
+    return ranked, sorted(unused, key=lambda row: row['bytes'], reverse=True)
+
+
+async def run(args):
+    db = Database(settings.DATABASE_URL, pool_min_size=1, pool_max_size=2)
+    await db.connect()
+    try:
+        async with db.pool.acquire() as connection:
+            if args.purge_days:
+                deleted = await connection.execute(
+                    f"DELETE FROM {QUERY_LOG_TABLE} WHERE created_at < $1",
+                    datetime.now() - timedelta(days=args.purge_days)
+                )
+                logger.info(f"Журнал запросов очищен: {deleted}")
+
+            since = datetime.now() - timedelta(days=args.days)
+            fingerprints = [dict(row) for row in await connection.fetch(FINGERPRINTS_QUERY, since)]
+            plans = {row['fingerprint']: json.loads(row['plan']) for row in await connection.fetch(PLANS_QUERY, since)}
+            parent_rows = await connection.fetch(PARENTS_QUERY)
+            indexes = [dict(row) for row in await connection.fetch(INDEXES_QUERY)]
+            stats_reset = await connection.fetchval(STATS_RESET_QUERY)
+    finally:
+        await db.disconnect()
+
+    parents = {row['child']: row['parent'] for row in parent_rows}
+    partitioned = {row['parent'] for row in parent_rows if row['kind'] == 'p'}
+    suggestions, unused = analyze(fingerprints, plans, indexes, parents, min_cost=args.min_cost)
+
+    calls = sum(row['calls'] for row in fingerprints)
+    print(f"Журнал за {args.days} дн.: {calls} запросов, {len(fingerprints)} отпечатков, {len(plans)} с планом")
+    print("\nСамые затратные отпечатки:")
+    for row in fingerprints[:args.top]:
+        print(f"  {row['fingerprint']} вызовов {row['calls']}, всего {row['total_ms']:.0f} мс, "
+              f"p95 {row['p95_ms']:.1f} мс, строк {row['avg_rows']:.0f}: {row['query'][:120]}")
+
+    print("\nПредлагаемые индексы (выгода - стоимость последовательных сканирований за период):")
+    if not suggestions:
+        print("  нет")
+    for entry in suggestions[:args.top]:
+        candidate = entry['candidate']
+        print(f"  {render_create(candidate, candidate.table in partitioned)}")
+        print(f"    выгода {entry['cost']:.0f}, вызовов {entry['calls']}, время запросов {entry['total_ms']:.0f} мс, "
+              f"отпечатки {', '.join(entry['fingerprints'][:5])}")
+    if suggestions:
+        print("  Индексы, которые остаются, нужно добавить в init_db.sql: "
+              "параллельный загрузчик пересоздает только их")
+
+    reset = f" с {stats_reset:%Y-%m-%d %H:%M}" if stats_reset else ""
+    print(f"\nИндексы без сканирований{reset} и без упоминаний в планах:")
+    if not unused:
+        print("  нет")
+    for row in unused:
+        concurrently = '' if row['table_name'] in partitioned else 'CONCURRENTLY '
+        print(f"  DROP INDEX {concurrently}IF EXISTS {row['index_name']};  -- {row['table_name']}, "
+              f"{row['bytes'] / 1024 / 1024:.1f} МБ")
+    if calls < args.min_calls:
+        print(f"\nВ журнале меньше {args.min_calls} запросов: выводы предварительные")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Советник по индексам по журналу запросов бота")
+    parser.add_argument('--days', type=float, default=7, help="период журнала в днях")
+    parser.add_argument('--top', type=int, default=10, help="сколько отпечатков и индексов показать")
+    parser.add_argument('--min-cost', type=float, default=1000,
+                        help="минимальная оценка стоимости последовательного сканирования")
+    parser.add_argument('--min-calls', type=int, default=1000,
+                        help="меньше запросов в журнале - предупреждение о малой выборке")
+    parser.add_argument('--purge-days', type=float, default=0,
+                        help="перед анализом удалить записи журнала старше N дней (0 - не удалять)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,133 +1,331 @@
 import aiohttp
+import asyncio
+import contextvars
+import json
 import logging
-from typing import Dict, Any
+import random
+import re
+import time
+from typing import Dict, Any, List, Optional, Tuple
 
 from db.config import settings
+from services.metrics import LLM_TOKENS, annotate, record_stage, span
+from services.prompt_builder import PromptBuilder, estimate_tokens
+from services.rate_limit import TokenBucket
 
 logger = logging.getLogger(__name__)
 
+# Статусы, после которых запрос повторяется
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Лимит токенов ответа на один SQL запрос
+MAX_SQL_TOKENS = 500
+
+# Начало пункта нумерованного списка в ответе на пачку вопросов
+_NUMBERED = re.compile(r'^\s*(\d+)[.)]\s*', re.MULTILINE)
+
+PendingQuestion = Tuple[str, Optional[Dict[str, Any]], asyncio.Future]
+
+
+class LLMError(Exception):
+    """Ошибка запроса к LLM провайдеру"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def clean_sql(text: str) -> str:
+    """Удаление markdown-обрамления вокруг SQL"""
+    return text.replace('```sql', '').replace('```', '').strip()
+
+
+def split_numbered(text: str, count: int) -> Optional[List[str]]:
+    """SQL по пунктам "1. ...", "2. ..." или None, если номера не совпадают с 1..count"""
+    text = clean_sql(text)
+    marks = list(_NUMBERED.finditer(text))
+    if [int(mark.group(1)) for mark in marks] != list(range(1, count + 1)):
+        return None
+    ends = [mark.start() for mark in marks[1:]] + [len(text)]
+    parts = [text[mark.end():end].strip() for mark, end in zip(marks, ends)]
+    return parts if all(parts) else None
+
+
+def create_llm_session() -> aiohttp.ClientSession:
+    """Долгоживущая HTTP сессия с keep-alive пулом соединений к LLM провайдеру"""
+    connector = aiohttp.TCPConnector(
+        limit=settings.LLM_POOL_SIZE,
+        keepalive_timeout=settings.LLM_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=300
+    )
+    return aiohttp.ClientSession(connector=connector)
+
 
 class LLMHandler:
-    def __init__(self):
-        self.api_key = settings.GROQ_API_KEY
-        self.base_url = settings.LLM_BASE_URL
+    def __init__(
+            self,
+            session: Optional[aiohttp.ClientSession] = None,
+            base_url: Optional[str] = None,
+            api_key: Optional[str] = None,
+            prompt_builder: Optional[PromptBuilder] = None
+    ):
+        self.api_key = api_key or settings.GROQ_API_KEY
+        self.base_url = base_url or settings.LLM_BASE_URL
         self.model = settings.LLM_MODEL
         self.temperature = settings.LLM_TEMPERATURE
 
+        # Сессия создается в bot.main; без нее создается своя при первом запросе
+        self._session = session
+        self._owns_session = session is None
+
+        self.max_retries = settings.LLM_MAX_RETRIES
+        self.backoff_base = settings.LLM_BACKOFF_BASE
+        self.backoff_max = settings.LLM_BACKOFF_MAX
+        self.timeout = aiohttp.ClientTimeout(
+            total=settings.LLM_TIMEOUT,
+            sock_connect=settings.LLM_CONNECT_TIMEOUT
+        )
+
+        self._semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        self._request_bucket = TokenBucket.per_minute(settings.LLM_RATE_LIMIT_RPM)
+        self._token_bucket = (
+            TokenBucket.per_minute(settings.LLM_RATE_LIMIT_TPM) if settings.LLM_RATE_LIMIT_TPM else None
+        )
+
+        self.prompt_builder = prompt_builder or PromptBuilder()
+
+        # Вопросы, пришедшие в пределах окна, отправляются одним запросом
+        self.batch_window = settings.LLM_BATCH_WINDOW_MS / 1000
+        self.batch_size = settings.LLM_BATCH_SIZE
+        self._pending: List[PendingQuestion] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._batch_tasks: set = set()
+        self.batches = 0
+        self.batched_questions = 0
+        self.batch_fallbacks = 0
+
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.generations = 0
+        self.prompt_tokens_estimated = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    async def close(self):
+        """Закрытие собственной HTTP сессии"""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики запросов к LLM и расход токенов"""
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'failures': self.failures,
+            'generations': self.generations,
+            'prompt_tokens': self.prompt_tokens,
+            'prompt_tokens_estimated': self.prompt_tokens_estimated,
+            'completion_tokens': self.completion_tokens,
+            'avg_prompt_tokens': self.prompt_tokens / self.generations if self.generations else 0.0,
+            'batches': self.batches,
+            'batched_questions': self.batched_questions,
+            'batch_fallbacks': self.batch_fallbacks,
+        }
+
+    def add_example(self, question: str, sql: str):
+        """Успешно выполненный запрос становится кандидатом в примеры промпта"""
+        self.prompt_builder.add_example(question, sql)
+
+    def _record_tokens(self, estimated: int, usage: Optional[Dict[str, Any]]):
+        """Учет токенов запроса: оценка до отправки и фактический расход по ответу провайдера"""
+        usage = usage or {}
+        prompt_tokens = usage.get('prompt_tokens', estimated)
+        self.generations += 1
+        self.prompt_tokens_estimated += estimated
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += usage.get('completion_tokens', 0)
+        LLM_TOKENS.inc(prompt_tokens, kind='prompt')
+        LLM_TOKENS.inc(usage.get('completion_tokens', 0), kind='completion')
+        annotate(prompt_tokens=prompt_tokens, completion_tokens=usage.get('completion_tokens'))
+        logger.info(f"Токены промпта: {prompt_tokens} (оценка {estimated}), ответа: {usage.get('completion_tokens', '?')}")
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = create_llm_session()
+            self._owns_session = True
+        return self._session
+
+    async def _chat_completion(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST /chat/completions с ограничением параллельности, скорости и повторами"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        # Оценка расхода токенов: ~4 символа на токен плюс лимит ответа
+        estimated_tokens = len(json.dumps(payload['messages'], ensure_ascii=False)) / 4 + payload.get('max_tokens', 0)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                wait_started = time.perf_counter()
+                async with self._semaphore:
+                    await self._request_bucket.acquire()
+                    if self._token_bucket is not None:
+                        await self._token_bucket.acquire(estimated_tokens)
+                    # Ожидание слота параллельности и лимитов провайдера
+                    record_stage('llm_wait', time.perf_counter() - wait_started)
+
+                    self.requests += 1
+                    async with self._get_session().post(
+                            f"{self.base_url}/chat/completions",
+                            headers=headers,
+                            json=payload,
+                            timeout=self.timeout
+                    ) as response:
+                        if response.status == 200:
+                            return await response.json()
+
+                        error_text = await response.text()
+                        raise LLMError(
+                            f"Ошибка: {response.status} - {error_text}",
+                            status=response.status,
+                            retry_after=self._retry_after(response.headers.get('Retry-After'))
+                        )
+
+            except (LLMError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                retryable = not isinstance(e, LLMError) or e.status in RETRYABLE_STATUSES
+                if not retryable or attempt == self.max_retries:
+                    self.failures += 1
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise LLMError(f"Таймаут запроса к LLM ({self.timeout.total} с)") from e
+                    raise
+
+                # Экспоненциальная задержка с полным джиттером, Retry-After имеет приоритет
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                if isinstance(e, LLMError) and e.retry_after is not None:
+                    delay = max(delay, min(e.retry_after, self.backoff_max))
+                self.retries += 1
+                logger.warning(f"Запрос к LLM не удался ({e}), повтор {attempt + 1}/{self.max_retries} через {delay:.2f} с")
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _retry_after(value: Optional[str]) -> Optional[float]:
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
     async def generate_sql_query(self, question: str, context: Dict[str, Any] = None) -> str:
         """Генерация SQL запроса на основе естественного языка"""
+        # Повторная генерация после отказа и выгрузки со своими правилами идут отдельным запросом
+        context = context or {}
+        if self.batch_size <= 1 or self.batch_window <= 0 or context.get('rejected_sql') or context.get('export'):
+            return await self._generate_single(question, context)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((question, context, future))
+        if len(self._pending) >= self.batch_size:
+            # Пачка обрабатывается вне трассы вопроса, который ее заполнил
+            contextvars.Context().run(self._flush)
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.batch_window, self._flush, context=contextvars.Context()
+            )
+
+        with span('llm_batch'):
+            return await future
+
+    def _flush(self):
+        """Запуск обработки накопленных вопросов"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch: List[PendingQuestion]):
+        """Один запрос к LLM на пачку; если ответ не разобран - отдельный запрос на каждый вопрос"""
+        live = [item for item in batch if not item[2].done()]
+        results: List[Optional[str]] = []
         try:
-            # Промт!
-            system_prompt = """Ты эксперт по SQL и анализу данных. 
-            Тебе нужно преобразовать вопросы на русском языке в SQL запросы для PostgreSQL.
-
-            Структура базы данных:
-            1. Таблица videos:
-               - id (UUID) - уникальный идентификатор видео
-               - creator_id (VARCHAR) - идентификатор креатора
-               - video_created_at (TIMESTAMP) - когда было создано видео
-               - views_count (INTEGER) - количество просмотров
-               - likes_count (INTEGER) - количество лайков
-               - comments_count (INTEGER) - количество комментариев
-               - reports_count (INTEGER) - количество репортов
-               - created_at (TIMESTAMP) - когда запись создана в системе
-               - updated_at (TIMESTAMP) - когда запись обновлена
-
-            2. Таблица video_snapshots:
-               - id (UUID) - уникальный идентификатор снапшота
-               - video_id (UUID) - ссылка на видео
-               - views_count (INTEGER) - просмотры на момент снапшота
-               - likes_count (INTEGER) - лайки на момент снапшота
-               - comments_count (INTEGER) - комментарии на момент снапшота
-               - reports_count (INTEGER) - репорты на момент снапшота
-               - delta_views_count (INTEGER) - изменение просмотров
-               - delta_likes_count (INTEGER) - изменение лайков
-               - delta_comments_count (INTEGER) - изменение комментариев
-               - delta_reports_count (INTEGER) - изменение репортов
-               - created_at (TIMESTAMP) - когда снапшот создан
-               - updated_at (TIMESTAMP) - когда снапшот обновлен
-
-            Важные правила:
-            1. Всегда используй правильные имена таблиц и полей
-            2. Для дат используй TIMESTAMP WITH TIME ZONE
-            3. Для подсчета используй COUNT(*)
-            4. Для суммирования используй SUM()
-            5. Для фильтрации по дате используй WHERE DATE(created_at) BETWEEN ...
-            6. Возвращай ТОЛЬКО SQL запрос без пояснений
-
-            Примеры:
-            Вопрос: "Сколько всего видео есть в системе?"
-            SQL: SELECT COUNT(*) FROM videos;
-
-            Вопрос: "Сколько видео у креатора с id abc вышло с 1 по 5 ноября 2025?"
-            SQL: SELECT COUNT(*) FROM videos WHERE creator_id = 'abc' AND DATE(video_created_at) BETWEEN '2025-11-01' AND '2025-11-05';
-
-            Вопрос: "Сколько видео набрало больше 100000 просмотров?"
-            SQL: SELECT COUNT(*) FROM videos WHERE views_count > 100000;
-
-            Вопрос: "На сколько просмотров выросли все видео 28 ноября 2025?"
-            SQL: SELECT SUM(delta_views_count) FROM video_snapshots WHERE DATE(created_at) = '2025-11-28';
-
-            Вопрос: "Сколько разных видео получали новые просмотры 27 ноября 2025?"
-            SQL: SELECT COUNT(DISTINCT video_id) FROM video_snapshots WHERE DATE(created_at) = '2025-11-27' AND delta_views_count > 0;
-            """
-
-            # Подготовка сообщений для Groq
-            messages = [
-                {"role": "system", "content": str(system_prompt)},
-                {"role": "user", "content": str(question)}
-            ]
-
-            safe_context = None
-            if context:
-                safe_context = {k: str(v) for k, v in context.items()}
-            if safe_context:
-                messages.append({
-                    "role": "system",
-                    "content": f"Контекст: {safe_context}"
-                })
+            if len(live) > 1:
+                results = await self._generate_batch([(question, context) for question, context, _ in live]) or []
+            if len(results) != len(live):
+                if len(live) > 1:
+                    self.batch_fallbacks += 1
+                results = await asyncio.gather(
+                    *(self._generate_single(question, context) for question, context, _ in live)
+                )
+        finally:
+            # Ожидающие получают SQL или None, как при ошибке генерации
+            for index, (_, _, future) in enumerate(live):
+                if not future.done():
+                    future.set_result(results[index] if index < len(results) else None)
+
+    async def _generate_batch(self, items: List[Tuple[str, Optional[Dict[str, Any]]]]) -> Optional[List[str]]:
+        """SQL для нескольких вопросов одним запросом или None, если ответ не разобран"""
+        try:
+            with span('prompt'):
+                messages = self.prompt_builder.build_batch(items)
+            estimated_tokens = sum(estimate_tokens(message["content"]) for message in messages)
 
-            # Формирование запроса для Groq
             payload = {
                 "model": self.model,
                 "messages": messages,
                 "temperature": self.temperature,
-                "max_tokens": 500
+                "max_tokens": MAX_SQL_TOKENS * len(items)
             }
+            with span('llm'):
+                result = await self._chat_completion(payload)
+            self._record_tokens(estimated_tokens, result.get('usage'))
+            content = result['choices'][0]['message']['content']
+        except Exception as e:
+            logger.warning(f"Ошибка генерации SQL для пачки из {len(items)} вопросов: {e}")
+            return None
+
+        queries = split_numbered(content, len(items))
+        if queries is None:
+            logger.warning(f"Ответ на пачку из {len(items)} вопросов не разобран: {content[:200]}")
+            return None
 
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
+        self.batches += 1
+        self.batched_questions += len(items)
+        logger.info(f"Сгенерирован SQL для пачки из {len(items)} вопросов одним запросом")
+        return queries
+
+    async def _generate_single(self, question: str, context: Dict[str, Any] = None) -> str:
+        """Генерация SQL отдельным запросом к LLM"""
+        try:
+            # Статическая часть промпта собирается один раз, примеры подбираются под вопрос
+            with span('prompt'):
+                messages = self.prompt_builder.build(question, context)
+            estimated_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+
+            # Формирование запроса для Groq
+            payload = {
+                "model": self.model,
+                "messages": messages,
+                "temperature": self.temperature,
+                "max_tokens": MAX_SQL_TOKENS
             }
 
             # Запрос к Groq
-            # logger.debug(f"[LLM] URL запроса: {self.base_url}/chat/completions")
-            # logger.debug(f"[LLM] Заголовки запроса: {headers}")
-            # logger.debug(f"[LLM] Отправляемый payload: {payload}")
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                        f"{self.base_url}/chat/completions",
-                        headers=headers,
-                        json=payload
-                ) as response:
-                    # raw_text = await response.text()
-                    # logger.debug(f"[LLM] Статус ответа: {response.status}")
-                    # logger.debug(f"[LLM] Сырой ответ от модели: {raw_text}")
-
-                    if response.status == 200:
-                        result = await response.json()
-                        sql_query = result['choices'][0]['message']['content'].strip()
-
-                        # Очищаем SQL запрос лишних символов
-                        sql_query = sql_query.replace('```sql', '').replace('```', '').strip()
-
-                        logger.info(f"Сгенерирован SQL: {sql_query}")
-                        return sql_query
-                    else:
-                        error_text = await response.text()
-                        # logger.error(f"Ошибка Groq API: {response.status} - {error_text}")
-                        raise Exception(f"Ошибка: {response.status} - {error_text}")
+            with span('llm'):
+                result = await self._chat_completion(payload)
+            sql_query = result['choices'][0]['message']['content'].strip()
+            self._record_tokens(estimated_tokens, result.get('usage'))
+
+            # Очищаем SQL запрос лишних символов
+            sql_query = clean_sql(sql_query)
+
+            logger.info(f"Сгенерирован SQL: {sql_query}")
+            return sql_query
 
         except Exception as e:
             logger.error(f"Ошибка генерации SQL: {e}")
-            return None
\ No newline at end of file
+            return None
@@ -1,25 +1,96 @@
+import argparse
 import asyncio
 import logging
 
 from db.database import Database
 from db.config import settings
+from db.json_stream import FORMAT_AUTO, FORMAT_JSON, FORMAT_NDJSON
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MODE_COPY = 'copy'
+MODE_PARALLEL = 'parallel'
+MODE_INCREMENTAL = 'incremental'
 
-async def load_videos_data():
+
+def parse_args():
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Загрузка выгрузки видео в базу данных")
+    parser.add_argument(
+        'path', nargs='?', default='videos.json',
+        help="путь к выгрузке: .json, .ndjson/.jsonl, в том числе сжатые gzip (по умолчанию videos.json)"
+    )
+    parser.add_argument(
+        '--format', dest='fmt', default=FORMAT_AUTO,
+        choices=(FORMAT_AUTO, FORMAT_JSON, FORMAT_NDJSON),
+        help="формат файла (по умолчанию определяется по расширению)"
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=settings.LOAD_BATCH_SIZE,
+        help="количество строк в одном COPY батче"
+    )
+    parser.add_argument(
+        '--mode', default=MODE_COPY, choices=(MODE_COPY, MODE_PARALLEL, MODE_INCREMENTAL),
+        help="copy - COPY в одной транзакции; parallel - параллельно в staging таблицы "
+             "с подменой основных таблиц в конце (читатели видят старые данные до подмены); "
+             "incremental - только новые снапшоты и изменившиеся видео без очистки таблиц"
+    )
+    parser.add_argument(
+        '--workers', type=int, default=settings.LOAD_WORKERS,
+        help="количество соединений для режима parallel"
+    )
+    parser.add_argument(
+        '--retention-months', type=int, default=settings.SNAPSHOT_RETENTION_MONTHS,
+        help="удалить секции снапшотов старше N месяцев, включая текущий (0 - хранить все)"
+    )
+    parser.add_argument(
+        '--columnar-cache', action=argparse.BooleanOptionalAction,
+        default=settings.ANSWER_BACKEND == 'columnar',
+        help=f"после загрузки выгрузить таблицы в колоночный кэш {settings.COLUMNAR_PATH}"
+    )
+    return parser.parse_args()
+
+
+async def load_videos_data(
+        path: str = 'videos.json',
+        fmt: str = FORMAT_AUTO,
+        batch_size: int = None,
+        mode: str = MODE_COPY,
+        workers: int = None,
+        retention_months: int = None,
+        columnar_cache: bool = False
+):
     """Загрузка данных о видео из JSON файла"""
     try:
-        db = Database(settings.DATABASE_URL)
+        db = Database(
+            settings.DATABASE_URL,
+            partition_months=settings.SNAPSHOT_PARTITION_MONTHS,
+            retention_months=settings.SNAPSHOT_RETENTION_MONTHS if retention_months is None else retention_months,
+            pool_min_size=settings.DB_POOL_MIN_SIZE,
+            pool_max_size=settings.DB_POOL_MAX_SIZE,
+            max_inactive_lifetime=settings.DB_POOL_MAX_INACTIVE_LIFETIME
+        )
         await db.connect()
 
-        await db.load_json_data('videos.json')
+        batch_size = batch_size or settings.LOAD_BATCH_SIZE
+        if mode == MODE_PARALLEL:
+            await db.parallel_load_json_data(
+                path, workers=workers or settings.LOAD_WORKERS, batch_size=batch_size, fmt=fmt
+            )
+        elif mode == MODE_INCREMENTAL:
+            await db.incremental_load_json_data(path, batch_size=batch_size, fmt=fmt)
+        else:
+            await db.bulk_load_json_data(path, batch_size=batch_size, fmt=fmt)
         logger.info("Данные успешно загружены в базу данных")
 
+        if columnar_cache:
+            from db.columnar import build_columnar_cache
+            await build_columnar_cache(db, settings.COLUMNAR_PATH)
+
     except FileNotFoundError:
-        logger.info("Файл videos.json не найден!")
+        logger.info(f"Файл {path} не найден!")
     except Exception as e:
         logger.info(f"Ошибка: {e}")
     finally:
@@ -27,4 +98,7 @@ async def load_videos_data():
 
 
 if __name__ == "__main__":
-    asyncio.run(load_videos_data())
\ No newline at end of file
+    args = parse_args()
+    asyncio.run(load_videos_data(
+        args.path, args.fmt, args.batch_size, args.mode, args.workers, args.retention_months, args.columnar_cache
+    ))
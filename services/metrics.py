@@ -0,0 +1,208 @@
+import json
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+request_logger = logging.getLogger('requests')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _render_labels(pairs: Labels) -> str:
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    """Монотонный счетчик с метками"""
+
+    type = 'counter'
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        for labels, value in self._values.items():
+            yield self.name, labels, value
+
+
+class Histogram:
+    """Гистограмма с накопительными корзинами в формате Prometheus"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # метки -> (счетчики по корзинам, сумма, количество)
+        self._values: Dict[Labels, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            entry[0][index] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", labels + (('le', repr(bound)),), cumulative
+            yield f"{self.name}_bucket", labels + (('le', '+Inf'),), count
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class MetricsRegistry:
+    """Реестр метрик и источников статистики компонентов для /metrics"""
+
+    def __init__(self, prefix: str = 'bot'):
+        self.prefix = prefix
+        self._metrics: Dict[str, Any] = {}
+        # Словари stats() компонентов отдаются как gauge: имя -> функция
+        self._stats: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter(f"{self.prefix}_{name}", help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(f"{self.prefix}_{name}", help_text, buckets))
+
+    def register_stats(self, component: str, stats: Callable[[], Dict[str, Any]]):
+        """Числовые значения stats() компонента публикуются как gauge bot_<компонент>_<ключ>"""
+        self._stats[component] = stats
+
+    def render(self) -> str:
+        """Текстовый формат экспозиции Prometheus"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_render_labels(labels)} {value}")
+
+        for component, stats in self._stats.items():
+            try:
+                values = stats()
+            except Exception as e:
+                logger.warning(f"Статистика {component} недоступна: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{self.prefix}_{component}_{key}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram('stage_seconds', "Время этапов обработки вопроса")
+REQUEST_SECONDS = REGISTRY.histogram('request_seconds', "Полное время обработки вопроса")
+REQUESTS = REGISTRY.counter('requests_total', "Обработанные вопросы по пути ответа")
+LLM_TOKENS = REGISTRY.counter('llm_tokens_total', "Токены LLM по данным провайдера")
+
+_trace: ContextVar[Optional[Dict[str, Any]]] = ContextVar('request_trace', default=None)
+
+
+def record_stage(stage: str, seconds: float):
+    """Учет уже измеренного времени этапа"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        stages = trace['stages']
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str):
+    """Замер этапа: гистограмма stage_seconds и поле в трассе текущего вопроса"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def annotate(**fields):
+    """Дополнительные поля для строки лога текущего вопроса"""
+    trace = _trace.get()
+    if trace is not None:
+        trace.update(fields)
+
+
+@contextmanager
+def request_trace(**fields):
+    """Трасса вопроса: общее время, этапы и структурированная строка лога в конце"""
+    trace: Dict[str, Any] = {'stages': {}, **fields}
+    token = _trace.set(trace)
+    started = time.perf_counter()
+    try:
+        yield trace
+    except Exception as e:
+        trace['error'] = str(e)
+        raise
+    finally:
+        _trace.reset(token)
+        elapsed = time.perf_counter() - started
+        path = trace.get('path', 'error' if 'error' in trace else 'unknown')
+        REQUEST_SECONDS.observe(elapsed, path=path)
+        REQUESTS.inc(path=path)
+
+        record = {
+            'event': 'request',
+            **{key: value for key, value in trace.items() if key != 'stages'},
+            'path': path,
+            'total_ms': round(elapsed * 1000, 1),
+            'stages_ms': {stage: round(value * 1000, 1) for stage, value in trace['stages'].items()},
+        }
+        request_logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+async def start_metrics_server(host: str, port: int, registry: MetricsRegistry = REGISTRY):
+    """HTTP сервер с /metrics, работающий рядом с циклом опроса Telegram; возвращает web.AppRunner"""
+    from aiohttp import web
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
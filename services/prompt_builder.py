@@ -0,0 +1,229 @@
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.sql_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+# Служебные таблицы: состояние загрузки, журнал запросов и staging/incoming таблицы загрузчика.
+# Секции, представления и прочие объекты отсекает сам SCHEMA_QUERY
+_HIDDEN_TABLES = re.compile(r'^(?:ingest_state|query_log|.*_staging|.*_incoming)$')
+
+# Обычные и секционированные таблицы без их секций: схема не растет с каждой новой секцией
+SCHEMA_QUERY = """
+    SELECT c.relname AS table_name, a.attname AS column_name, format_type(a.atttypid, NULL) AS data_type
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+    ORDER BY c.relname, a.attnum
+"""
+
+# Схема на случай, если интроспекция недоступна
+FALLBACK_SCHEMA: Dict[str, List[Tuple[str, str]]] = {
+    'videos': [
+        ('id', 'uuid'), ('creator_id', 'varchar'), ('video_created_at', 'timestamp'),
+        ('views_count', 'integer'), ('likes_count', 'integer'),
+        ('comments_count', 'integer'), ('reports_count', 'integer'),
+        ('created_at', 'timestamp'), ('updated_at', 'timestamp'),
+    ],
+    'video_snapshots': [
+        ('id', 'uuid'), ('video_id', 'uuid'),
+        ('views_count', 'integer'), ('likes_count', 'integer'),
+        ('comments_count', 'integer'), ('reports_count', 'integer'),
+        ('delta_views_count', 'integer'), ('delta_likes_count', 'integer'),
+        ('delta_comments_count', 'integer'), ('delta_reports_count', 'integer'),
+        ('created_at', 'timestamp'), ('updated_at', 'timestamp'),
+    ],
+    'daily_snapshot_totals': [
+        ('day', 'date'), ('snapshots_count', 'integer'), ('active_videos', 'integer'),
+        ('delta_views_count', 'bigint'), ('delta_likes_count', 'bigint'),
+        ('delta_comments_count', 'bigint'), ('delta_reports_count', 'bigint'),
+        ('videos_with_new_views', 'integer'), ('videos_with_new_likes', 'integer'),
+        ('videos_with_new_comments', 'integer'), ('videos_with_new_reports', 'integer'),
+    ],
+}
+FALLBACK_SCHEMA['daily_creator_snapshot_totals'] = (
+    FALLBACK_SCHEMA['daily_snapshot_totals'][:1] + [('creator_id', 'varchar')]
+    + FALLBACK_SCHEMA['daily_snapshot_totals'][1:]
+)
+
+# Смысл таблиц, который не следует из имен колонок
+TABLE_NOTES = {
+    'videos': 'итоговая статистика видео; video_created_at - публикация',
+    'video_snapshots': 'почасовые замеры; delta_* - прирост с прошлого замера',
+    'daily_snapshot_totals': 'дневные суммы video_snapshots; videos_with_new_* - число видео с приростом за день',
+    'daily_creator_snapshot_totals': 'то же по креаторам',
+}
+
+_TYPE_NAMES = {
+    'character varying': 'varchar',
+    'timestamp without time zone': 'timestamp',
+    'timestamp with time zone': 'timestamptz',
+}
+
+INTRO = "Ты эксперт по PostgreSQL. Переведи вопрос на русском в один SQL запрос."
+
+RULES = """Правила:
+1. Только таблицы и колонки из схемы; ответ - ТОЛЬКО SQL без пояснений
+2. COUNT(*) для подсчета, SUM() для сумм
+3. Даты - литералы 'YYYY-MM-DD' из контекста (date_start, date_end), без NOW() и CURRENT_DATE;
+   фильтр по дням без функций над колонкой: created_at >= 'начало' AND created_at < 'день после конца'
+4. Суммы приростов по дням и периодам - из daily_snapshot_totals (по креатору - daily_creator_snapshot_totals);
+   active_videos и videos_with_new_* только для одного дня, разные видео за несколько дней - по video_snapshots
+5. Если в контексте есть rejected_sql, он отклонен по причине rejection_reason:
+   напиши более легкий запрос (фильтры по дате и креатору, без самосоединений video_snapshots)"""
+
+# Выгрузка в CSV: вместо одного числа нужны строки
+EXPORT_RULES = """Этот вопрос - выгрузка в CSV: верни строки, а не одно число.
+Понятные имена колонок (AS), ORDER BY по смыслу вопроса; LIMIT, только если он есть в вопросе"""
+
+# Несколько вопросов в одном запросе: ответ разбирается по номерам
+BATCH_RULES = """Ниже несколько независимых вопросов. Ответь нумерованным списком в том же порядке:
+для каждого вопроса строка "N. SQL" с номером вопроса, без пояснений и без ```"""
+
+SEED_EXAMPLES: List[Tuple[str, str]] = [
+    ("Сколько всего видео есть в системе?",
+     "SELECT COUNT(*) FROM videos;"),
+    ("Сколько видео у креатора с id abc вышло с 1 по 5 ноября 2025?",
+     "SELECT COUNT(*) FROM videos WHERE creator_id = 'abc' "
+     "AND video_created_at >= '2025-11-01' AND video_created_at < '2025-11-06';"),
+    ("Сколько видео набрало больше 100000 просмотров?",
+     "SELECT COUNT(*) FROM videos WHERE views_count > 100000;"),
+    ("На сколько просмотров выросли все видео 28 ноября 2025?",
+     "SELECT SUM(delta_views_count) FROM daily_snapshot_totals WHERE day = '2025-11-28';"),
+    ("Сколько разных видео получали новые просмотры 27 ноября 2025?",
+     "SELECT SUM(videos_with_new_views) FROM daily_snapshot_totals WHERE day = '2025-11-27';"),
+]
+
+_WORD = re.compile(r'[^\W\d_]{3,}|\d+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов: ~4 символа на токен"""
+    return (len(text) + 3) // 4
+
+
+def _terms(question: str) -> frozenset:
+    """Основы слов вопроса для лексического сходства; числа неразличимы"""
+    return frozenset('#' if word.isdigit() else word[:5] for word in _WORD.findall(normalize_question(question)))
+
+
+class PromptBuilder:
+    """Компактный промпт: схема из каталога Postgres, правила и k похожих примеров"""
+
+    def __init__(self, k: int = 2, max_examples: int = 200):
+        self.k = k
+        self.max_examples = max_examples
+        self._schema: Dict[str, List[Tuple[str, str]]] = dict(FALLBACK_SCHEMA)
+        self._prefix: Optional[str] = None
+        self._examples: List[Tuple[str, str, frozenset]] = [
+            (question, sql, _terms(question)) for question, sql in SEED_EXAMPLES
+        ]
+        self._known = {normalize_question(question) for question, _ in SEED_EXAMPLES}
+
+    async def load_schema(self, db):
+        """Однократная интроспекция таблиц при запуске"""
+        try:
+            rows = await db.execute_query(SCHEMA_QUERY)
+        except Exception as e:
+            logger.warning(f"Схема для промпта не прочитана, используется встроенная: {e}")
+            return
+
+        schema: Dict[str, List[Tuple[str, str]]] = {}
+        for row in rows:
+            if _HIDDEN_TABLES.match(row['table_name']):
+                continue
+            data_type = _TYPE_NAMES.get(row['data_type'], row['data_type'])
+            schema.setdefault(row['table_name'], []).append((row['column_name'], data_type))
+
+        if schema:
+            self._schema = schema
+            self._prefix = None
+            logger.info(f"Схема для промпта: {', '.join(schema)}")
+
+    @property
+    def prefix(self) -> str:
+        """Статическая часть промпта, одинаковая для всех запросов"""
+        if self._prefix is None:
+            self._prefix = f"{INTRO}\n\nСхема:\n{self._render_schema()}\n\n{RULES}"
+        return self._prefix
+
+    def add_example(self, question: str, sql: str):
+        """Пополнение хранилища примеров успешно выполненным запросом"""
+        key = normalize_question(question)
+        if key in self._known:
+            return
+        self._known.add(key)
+        self._examples.append((question, sql, _terms(question)))
+        if len(self._examples) > self.max_examples:
+            # Начальные примеры не вытесняются
+            removed = self._examples.pop(len(SEED_EXAMPLES))
+            self._known.discard(normalize_question(removed[0]))
+
+    def examples(self, question: str) -> List[Tuple[str, str]]:
+        """k примеров с наибольшим пересечением основ слов с вопросом"""
+        terms = _terms(question)
+
+        def similarity(example) -> float:
+            example_terms = example[2]
+            union = len(terms | example_terms)
+            return len(terms & example_terms) / union if union else 0.0
+
+        ranked = sorted(self._examples, key=similarity, reverse=True)
+        return [(example_question, sql) for example_question, sql, _ in ranked[:self.k]]
+
+    def build(self, question: str, context: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
+        """Сообщения для chat/completions"""
+        messages = [
+            {"role": "system", "content": self.prefix},
+            {"role": "system", "content": self._render_examples(self.examples(question))},
+            {"role": "user", "content": question},
+        ]
+        if (context or {}).get('export'):
+            messages.insert(2, {"role": "system", "content": EXPORT_RULES})
+
+        values = self._context_values(context)
+        if values:
+            messages.append({"role": "system", "content": f"Контекст: {values}"})
+        return messages
+
+    def build_batch(self, items: List[Tuple[str, Optional[Dict[str, Any]]]]) -> List[Dict[str, str]]:
+        """Сообщения для одного запроса на несколько вопросов: общий префикс, ответ нумерованным списком"""
+        shots: List[Tuple[str, str]] = []
+        for question, _ in items:
+            shots.extend(example for example in self.examples(question) if example not in shots)
+
+        lines = []
+        for number, (question, context) in enumerate(items, 1):
+            values = self._context_values(context)
+            lines.append(f"{number}. {question}" + (f" (контекст: {values})" if values else ""))
+
+        return [
+            {"role": "system", "content": self.prefix},
+            {"role": "system", "content": self._render_examples(shots)},
+            {"role": "system", "content": BATCH_RULES},
+            {"role": "user", "content": "\n".join(lines)},
+        ]
+
+    @staticmethod
+    def _render_examples(examples: List[Tuple[str, str]]) -> str:
+        shots = "\n\n".join(f'Вопрос: "{q}"\nSQL: {sql}' for q, sql in examples)
+        return f"Примеры:\n{shots}"
+
+    @staticmethod
+    def _context_values(context: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        return {
+            key: str(value) for key, value in (context or {}).items()
+            if value is not None and key not in ('question', 'export')
+        }
+
+    def _render_schema(self) -> str:
+        lines = []
+        for table, columns in self._schema.items():
+            line = f"{table}({', '.join(f'{name} {data_type}' for name, data_type in columns)})"
+            if table in TABLE_NOTES:
+                line += f" -- {TABLE_NOTES[table]}"
+            lines.append(line)
+        return "\n".join(lines)
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Асинхронный ограничитель скорости по алгоритму token bucket"""
+
+    def __init__(self, rate: float, capacity: float):
+        # rate - токенов в секунду, capacity - максимальный всплеск
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def per_minute(cls, limit: float) -> "TokenBucket":
+        """Ограничитель для лимита вида «N в минуту» с всплеском до N"""
+        return cls(rate=limit / 60.0, capacity=limit)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """Ожидание нужного количества токенов; возвращает время ожидания в секундах"""
+        tokens = min(tokens, self.capacity)
+        waited = 0.0
+
+        # Очередь ожидающих обслуживается по порядку захвата блокировки
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+
+                delay = (tokens - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
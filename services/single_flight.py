@@ -0,0 +1,47 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных запросов в одно выполнение"""
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Результат factory(); повторный вызов с тем же ключом ждет уже идущее выполнение.
+
+        Ошибка получают все ожидающие, в кэше она не остается: ключ удаляется
+        сразу после завершения выполнения.
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executed += 1
+            task = asyncio.ensure_future(factory())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.coalesced += 1
+
+        # Отмена одного ожидающего не отменяет выполнение для остальных
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики выполненных и объединенных запросов"""
+        total = self.executed + self.coalesced
+        return {
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._in_flight),
+            'coalesced_rate': self.coalesced / total if total else 0.0,
+        }
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Ошибка считается полученной, даже если все ожидающие отменены
+            task.exception()
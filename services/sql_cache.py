@@ -0,0 +1,287 @@
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.date_extractor import MONTHS
+
+logger = logging.getLogger(__name__)
+
+_MONTH = '(' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + ')'
+
+# Литералы вопроса, которые становятся слотами шаблона (в порядке приоритета)
+_ID_PATTERNS = [
+    re.compile(r'\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b', re.IGNORECASE),
+    re.compile(r'(?<=\bid)\s*[:=]?\s*([\w\-]+)', re.IGNORECASE),
+    re.compile(r'\b(?=[0-9a-f]*[a-f])(?=[0-9a-f]*\d)[0-9a-f]{12,}\b', re.IGNORECASE),
+]
+_DATE_RANGE_PATTERN = re.compile(
+    r'\b(?:с|от)\s+(\d{1,2})(?:\s+' + _MONTH + r')?(?:\s+\d{4})?\s+(?:по|до)\s+(\d{1,2})\s+' + _MONTH + r'(?:\s+\d{4})?',
+    re.IGNORECASE
+)
+_DATE_PATTERN = re.compile(r'\b(\d{1,2})\s+' + _MONTH + r'(?:\s+\d{4})?', re.IGNORECASE)
+_NUMERIC_DATE_PATTERN = re.compile(r'\b(\d{1,2})[./-](\d{1,2})[./-]\d{4}\b')
+_NUMBER_PATTERN = re.compile(r'\d+(?:[.,]\d+)?')
+
+_PUNCTUATION = re.compile(r'[^\w<>]+')
+
+
+def normalize_question(text: str) -> str:
+    """Нормализация вопроса: регистр, ё, пунктуация и пробелы"""
+    text = text.lower().replace('ё', 'е')
+    return ' '.join(_PUNCTUATION.sub(' ', text).split())
+
+
+def _marker(name: str) -> str:
+    return '{{' + name + '}}'
+
+
+def _number_in_sql(value: str) -> re.Pattern:
+    """Число как отдельный литерал SQL (не часть даты, идентификатора или маркера)"""
+    return re.compile(r"(?<![\w.\-:'{])" + re.escape(value) + r"(?![\w.\-:])")
+
+
+class SQLTemplateCache:
+    """Кэш сгенерированного SQL в виде шаблонов с типизированными слотами (LRU + TTL)"""
+
+    def __init__(self, max_size: int = 1000, ttl: float = 86400, path: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.uncacheable = 0
+
+        if path:
+            self._load()
+
+    def lookup(self, question: str, date_range: Optional[Tuple[datetime, datetime]]) -> Optional[str]:
+        """Готовый SQL для вопроса, если в кэше есть подходящий шаблон"""
+        for key, values in self._keys(question, date_range):
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+
+            expires_at, template = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                continue
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._fill(template, values)
+
+        self.misses += 1
+        return None
+
+    def store(self, question: str, date_range: Optional[Tuple[datetime, datetime]], sql: str):
+        """Сохранение SQL: параметризованным шаблоном, если литералы удалось сопоставить"""
+        keys = self._keys(question, date_range)
+        template_key = keys[0] if len(keys) > 1 else None
+
+        if template_key:
+            key, values = template_key
+            template = self._templatize(sql, values)
+            if template is not None:
+                self._put(key, template)
+                return
+
+        # Литералы не нашлись в SQL однозначно: кэшируем только точный вопрос
+        self.uncacheable += 1
+        key, _ = keys[-1]
+        self._put(key, sql)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики попаданий и промахов"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'exact_only': self.uncacheable,
+        }
+
+    def save(self):
+        """Сохранение кэша на диск (если задан путь)"""
+        if not self.path:
+            return
+
+        now = time.time()
+        data = {key: [expires_at, sql] for key, (expires_at, sql) in self._entries.items() if expires_at >= now}
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            logger.info(f"Кэш SQL шаблонов сохранен: {len(data)} записей в {self.path}")
+        except OSError as e:
+            logger.error(f"Ошибка сохранения кэша SQL шаблонов: {e}")
+
+    def _load(self):
+        """Загрузка сохраненного кэша с диска без просроченных записей"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать кэш SQL шаблонов {self.path}: {e}")
+            return
+
+        now = time.time()
+        for key, (expires_at, sql) in sorted(data.items(), key=lambda item: item[1][0]):
+            if expires_at >= now:
+                self._entries[key] = (expires_at, sql)
+        self._evict()
+        logger.info(f"Загружен кэш SQL шаблонов: {len(self._entries)} записей")
+
+    def _put(self, key: str, sql: str):
+        self._entries[key] = (time.time() + self.ttl, sql)
+        self._entries.move_to_end(key)
+        self.stores += 1
+        self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _keys(
+            self,
+            question: str,
+            date_range: Optional[Tuple[datetime, datetime]]
+    ) -> List[Tuple[str, Dict[str, str]]]:
+        """Ключи кэша: шаблонный (со значениями слотов), если вопрос удалось разобрать, и точный"""
+        range_str = '' if not date_range else f"{date_range[0].isoformat()}/{date_range[1].isoformat()}"
+        exact = (f"exact|{normalize_question(question)}|{range_str}", {})
+
+        parsed = self._abstract(question, date_range)
+        if parsed is None:
+            return [exact]
+        return [parsed, exact]
+
+    def _abstract(
+            self,
+            question: str,
+            date_range: Optional[Tuple[datetime, datetime]]
+    ) -> Optional[Tuple[str, Dict[str, str]]]:
+        """Замена дат, идентификаторов и чисел вопроса на типизированные слоты"""
+        spans: List[Tuple[int, int, str]] = []
+        values: Dict[str, str] = {}
+        date_parts: List[Tuple[int, Optional[int]]] = []
+
+        def claim(start: int, end: int) -> bool:
+            if any(start < s_end and s_start < end for s_start, s_end, _ in spans):
+                return False
+            return True
+
+        ids = 0
+        for pattern in _ID_PATTERNS:
+            for match in pattern.finditer(question):
+                group = 1 if pattern.groups else 0
+                start, end = match.span(group)
+                if claim(start, end):
+                    name = f"id{ids}"
+                    spans.append((start, end, '<id>'))
+                    values[name] = match.group(group)
+                    ids += 1
+
+        for match in _DATE_RANGE_PATTERN.finditer(question):
+            if claim(*match.span()):
+                spans.append((*match.span(), '<date>'))
+                day1, month1, day2, month2 = match.groups()
+                date_parts.append((int(day1), MONTHS[(month1 or month2).lower()]))
+                date_parts.append((int(day2), MONTHS[month2.lower()]))
+        for match in _DATE_PATTERN.finditer(question):
+            if claim(*match.span()):
+                spans.append((*match.span(), '<date>'))
+                date_parts.append((int(match.group(1)), MONTHS[match.group(2).lower()]))
+        for match in _NUMERIC_DATE_PATTERN.finditer(question):
+            if claim(*match.span()):
+                spans.append((*match.span(), '<date>'))
+                date_parts.append((int(match.group(1)), int(match.group(2))))
+
+        # Даты в тексте должны совпадать с извлеченным диапазоном, иначе слоты ненадежны
+        if date_parts:
+            if not date_range:
+                return None
+            bounds = {(date_range[0].day, date_range[0].month), (date_range[1].day, date_range[1].month)}
+            if any(part not in bounds for part in date_parts):
+                return None
+
+        numbers = 0
+        for match in _NUMBER_PATTERN.finditer(question):
+            if claim(*match.span()):
+                spans.append((*match.span(), '<num>'))
+                values[f"num{numbers}"] = match.group(0).replace(',', '.')
+                numbers += 1
+
+        if date_range:
+            start_date, end_date = (value.date() for value in date_range)
+            if start_date == end_date:
+                values['date'] = start_date.isoformat()
+                shape = 'day'
+            else:
+                values['date_start'] = start_date.isoformat()
+                values['date_end'] = end_date.isoformat()
+                shape = 'range'
+        else:
+            shape = 'none'
+
+        parts = []
+        position = 0
+        for start, end, token in sorted(spans):
+            parts.append(question[position:start])
+            parts.append(f" {token} ")
+            position = end
+        parts.append(question[position:])
+
+        return f"tpl|{normalize_question(''.join(parts))}|{shape}", values
+
+    def _templatize(self, sql: str, values: Dict[str, str]) -> Optional[str]:
+        """Замена литералов SQL маркерами слотов; None, если сопоставление неоднозначно
+
+        Каждое значение слота должно встречаться в SQL ровно один раз: в запросе
+        COUNT(*) FILTER (WHERE views_count > 100) * 100 / COUNT(*) второе 100 - константа
+        процента, и подстановка нового порога в оба места дала бы неверный ответ.
+        """
+        if len(set(values.values())) != len(values):
+            return None
+
+        template = sql
+        # Сначала даты: числа внутри дат не должны стать отдельными слотами
+        for name in sorted(values, key=lambda item: not item.startswith('date')):
+            value = values[name]
+            if name.startswith('date'):
+                if template.count(value) != 1:
+                    return None
+                template = template.replace(value, _marker(name))
+            elif name.startswith('id'):
+                quoted = f"'{value}'"
+                if template.count(quoted) != 1:
+                    return None
+                template = template.replace(quoted, f"'{_marker(name)}'")
+            else:
+                template, count = _number_in_sql(value).subn(_marker(name), template)
+                if count != 1:
+                    return None
+
+        if self._fill(template, values) != sql:
+            return None
+        return template
+
+    def _fill(self, template: str, values: Dict[str, str]) -> str:
+        for name, value in values.items():
+            template = template.replace(_marker(name), value)
+        return template
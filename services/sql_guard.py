@@ -0,0 +1,83 @@
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import asyncpg
+import sqlparse
+
+logger = logging.getLogger(__name__)
+
+
+class SQLRejected(Exception):
+    """Сгенерированный SQL не прошел проверку"""
+
+    def __init__(self, reason: str, sql: Optional[str] = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.sql = sql
+
+
+def _plan_nodes(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from _plan_nodes(child)
+
+
+class SQLGuard:
+    """Проверка SQL от LLM: один SELECT, оценка плана и выполнение в read-only транзакции"""
+
+    def __init__(self, statement_timeout_ms: int = 5000, max_cost: float = 5e6, max_rows: float = 5e7):
+        self.statement_timeout_ms = statement_timeout_ms
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+
+        self.checked = 0
+        self.rejected = 0
+
+    def validate(self, sql: Optional[str]):
+        """Разбор текста запроса: допускается только одна инструкция SELECT"""
+        self.checked += 1
+        if not sql or not sql.strip():
+            self._reject("пустой запрос", sql)
+
+        statements = [statement for statement in sqlparse.parse(sql) if str(statement).strip(' \n\t;')]
+        if len(statements) != 1:
+            self._reject(f"ожидалась одна инструкция, получено {len(statements)}", sql)
+
+        statement_type = statements[0].get_type()
+        if statement_type != 'SELECT':
+            self._reject(f"разрешен только SELECT, получено {statement_type}", sql)
+
+    def check_plan(self, plan: Dict[str, Any], sql: str):
+        """Отклонение запроса, если оценка стоимости или числа строк плана превышает порог"""
+        cost = plan.get('Total Cost', 0)
+        rows = max(node.get('Plan Rows', 0) for node in _plan_nodes(plan))
+        if cost > self.max_cost:
+            self._reject(f"оценка стоимости {cost:.0f} больше {self.max_cost:.0f}", sql)
+        if rows > self.max_rows:
+            self._reject(f"оценка числа строк {rows:.0f} больше {self.max_rows:.0f}", sql)
+        logger.info(f"SQL проверен: стоимость {cost:.0f}, строк {rows:.0f}")
+
+    async def execute_scalar(self, db, sql: str, *args) -> Any:
+        """Выполнение проверенного запроса с оценкой плана и ограничением времени"""
+        with self.rejections(sql):
+            return await db.execute_scalar(sql, *args, guard=self)
+
+    @contextmanager
+    def rejections(self, sql: str) -> Iterator[None]:
+        """Ошибки выполнения, вызванные самим запросом, превращаются в SQLRejected"""
+        try:
+            yield
+        except asyncpg.exceptions.QueryCanceledError:
+            self._reject(f"превышен statement_timeout {self.statement_timeout_ms} мс", sql)
+        except asyncpg.exceptions.ReadOnlySQLTransactionError:
+            self._reject("запрос пытается изменить данные", sql)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики проверенных и отклоненных запросов"""
+        return {'checked': self.checked, 'rejected': self.rejected}
+
+    def _reject(self, reason: str, sql: Optional[str]):
+        self.rejected += 1
+        logger.warning(f"SQL отклонен ({reason}): {sql}")
+        raise SQLRejected(reason, sql)
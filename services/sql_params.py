@@ -0,0 +1,166 @@
+import hashlib
+import re
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+_TOKEN = re.compile(
+    r"(?P<string>'(?:[^']|'')*')"
+    r'|(?P<quoted>"(?:[^"]|"")*")'
+    r'|(?P<comment>--[^\n]*|/\*.*?\*/)'
+    r'|(?P<param>\$\d+)'
+    r'|(?P<number>(?<![\w.])\d+(?:\.\d+)?(?![\w.]))'
+    r'|(?P<word>[A-Za-z_][\w.]*)'
+    r'|(?P<op><>|!=|<=|>=|::|[=<>])'
+    r'|(?P<space>\s+)'
+    r'|(?P<other>.)',
+    re.DOTALL
+)
+
+# После этих операторов литерал - значение условия, а не часть выражения
+_COMPARISONS = {'=', '<>', '!=', '<', '<=', '>', '>='}
+
+_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_TIMESTAMP = re.compile(r'^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?$')
+# Строки, тип которых Postgres выведет из колонки: идентификаторы креаторов, UUID
+_IDENTIFIER = re.compile(r'^(?=.*[A-Za-z_])[\w\-]+$')
+
+_INT64_MAX = 2 ** 63 - 1
+
+# DATE(колонка) в сравнении с датой: функция над колонкой мешает индексам и отсечению секций
+_DATE_FILTER = re.compile(
+    r"(?<![\w.])DATE\s*\(\s*(?P<column>[A-Za-z_][\w.]*)\s*\)\s*"
+    r"(?:(?P<op><=|>=|=|<|>)\s*'(?P<value>\d{4}-\d{2}-\d{2})'"
+    r"|BETWEEN\s+'(?P<low>\d{4}-\d{2}-\d{2})'\s+AND\s+'(?P<high>\d{4}-\d{2}-\d{2})')"
+    r"(?:\s*::\s*date)?",
+    re.IGNORECASE
+)
+
+
+def sargable_dates(sql: str) -> str:
+    """Замена DATE(колонка) <op> 'YYYY-MM-DD' и BETWEEN на полуинтервалы по самой колонке.
+
+    DATE(created_at) BETWEEN '2025-11-01' AND '2025-11-05' превращается в
+    (created_at >= '2025-11-01' AND created_at < '2025-11-06'), что позволяет
+    Postgres отсечь лишние секции video_snapshots и использовать индексы по времени.
+    """
+    def replace(match: re.Match) -> str:
+        column = match.group('column')
+        try:
+            if match.group('op') is None:
+                low = date.fromisoformat(match.group('low'))
+                high = date.fromisoformat(match.group('high')) + timedelta(days=1)
+                return f"({column} >= '{low}' AND {column} < '{high}')"
+            op = match.group('op')
+            value = date.fromisoformat(match.group('value'))
+        except ValueError:
+            return match.group()
+
+        next_day = value + timedelta(days=1)
+        if op == '=':
+            return f"({column} >= '{value}' AND {column} < '{next_day}')"
+        if op == '>=':
+            return f"{column} >= '{value}'"
+        if op == '>':
+            return f"{column} >= '{next_day}'"
+        if op == '<':
+            return f"{column} < '{value}'"
+        return f"{column} < '{next_day}'"
+
+    return _DATE_FILTER.sub(replace, sql)
+
+
+def parameterize(sql: str) -> Tuple[str, tuple]:
+    """Замена литералов в условиях на $n с типизированными аргументами.
+
+    Даты, метки времени, числа и идентификаторы в сравнениях и BETWEEN передаются
+    аргументами, чтобы одинаковые по форме запросы давали один текст для подготовки.
+    """
+    if re.search(r'\$\d', sql):
+        # Плейсхолдеры уже есть, а их значения неизвестны
+        return sql, ()
+
+    parts: List[str] = []
+    args: list = []
+    previous = None
+    between = False
+
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup
+        token = match.group()
+
+        if kind in ('space', 'comment'):
+            parts.append(token)
+            continue
+
+        bound = None
+        if kind in ('string', 'number') and (previous in _COMPARISONS or previous == 'BETWEEN'):
+            bound = _bind(kind, token)
+
+        if bound is not None:
+            value, cast = bound
+            args.append(value)
+            parts.append(f"${len(args)}{cast}")
+        else:
+            parts.append(token)
+
+        upper = token.upper() if kind == 'word' else None
+        if upper == 'BETWEEN':
+            between = True
+        elif upper == 'AND' and between:
+            # Верхняя граница BETWEEN тоже значение условия
+            between = False
+            previous = 'BETWEEN'
+            continue
+        previous = upper or token
+
+    return ''.join(parts), tuple(args)
+
+
+def _bind(kind: str, token: str) -> Optional[Tuple[object, str]]:
+    """(значение, приведение типа) для литерала или None, если литерал остается в тексте"""
+    if kind == 'number':
+        if '.' in token:
+            return float(token), '::numeric'
+        value = int(token)
+        return (value, '::bigint') if value <= _INT64_MAX else None
+
+    text = token[1:-1].replace("''", "'")
+    try:
+        if _DATE.match(text):
+            return date.fromisoformat(text), '::date'
+        if _TIMESTAMP.match(text):
+            return datetime.fromisoformat(text), '::timestamp'
+    except ValueError:
+        return None
+    if _IDENTIFIER.match(text):
+        return text, ''
+    return None
+
+
+_PLACEHOLDER_CAST = re.compile(r'\?\s*::\s*[a-z_]\w*')
+_PLACEHOLDER_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+
+
+def fingerprint(sql: str) -> Tuple[str, str]:
+    """(отпечаток, нормализованный текст) запроса без литералов, параметров и комментариев.
+
+    Запросы, отличающиеся только значениями, их приведением типа, пробелами и регистром
+    ключевых слов, получают один отпечаток; списки значений IN (...) сворачиваются в один '?'.
+    """
+    parts: List[str] = []
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup
+        if kind == 'comment':
+            continue
+        if kind == 'space':
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+        elif kind in ('string', 'number', 'param'):
+            parts.append('?')
+        elif kind == 'word':
+            parts.append(match.group().lower())
+        else:
+            parts.append(match.group())
+
+    normalized = _PLACEHOLDER_LIST.sub('?', _PLACEHOLDER_CAST.sub('?', ''.join(parts).strip(' ;')))
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16], normalized
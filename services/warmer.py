@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class FrequentQuery(NamedTuple):
+    key: Hashable
+    count: int
+    sql: str
+    args: tuple
+    guarded: bool
+
+
+class CacheWarmer:
+    """Прогрев после загрузки: SQL частых вопросов выполняется заново на данных нового поколения
+
+    Журнал частоты ограничен max_questions ключами (нормализованный вопрос, даты); при переполнении
+    вытесняется самый редкий. После каждого прогрева счетчики делятся пополам, чтобы популярность
+    отражала недавние дни. Результаты попадают в кэш результатов Database, а данные - в буферы Postgres.
+    """
+
+    def __init__(self, db, top_n: int = 50, concurrency: int = 2, max_questions: int = 1000, sql_guard=None):
+        self.db = db
+        self.top_n = top_n
+        self.concurrency = max(1, concurrency)
+        self.max_questions = max_questions
+        self.sql_guard = sql_guard
+
+        # ключ -> число вопросов; ключ -> (SQL, аргументы, выполнять через SQLGuard)
+        self._counts: Dict[Hashable, int] = {}
+        self._queries: Dict[Hashable, tuple] = {}
+        self._warmed: Set[Hashable] = set()
+        self._task: Optional[asyncio.Task] = None
+
+        self.runs = 0
+        self.warmed = 0
+        self.errors = 0
+        self.last_seconds = 0.0
+        self.coverage = 0.0
+        # Вопросы после прогрева и те из них, что были прогреты заранее
+        self.asked = 0
+        self.hits = 0
+
+    def attach(self):
+        """Подписка на смену поколения данных (уведомление загрузчика через Database)"""
+        self.db.add_generation_listener(self._on_generation)
+
+    def record(self, key: Hashable):
+        """Учет заданного вопроса"""
+        if self._warmed:
+            self.asked += 1
+            if key in self._warmed:
+                self.hits += 1
+
+        if key not in self._counts and len(self._counts) >= self.max_questions:
+            rarest = min(self._counts, key=self._counts.get)
+            del self._counts[rarest]
+            self._queries.pop(rarest, None)
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+    def remember(self, key: Hashable, sql: str, args: tuple, guarded: bool = False):
+        """SQL, которым был получен ответ на вопрос"""
+        if key in self._counts:
+            self._queries[key] = (sql, args, guarded)
+
+    def top(self, n: int) -> List[FrequentQuery]:
+        """n самых частых вопросов с известным SQL"""
+        ranked = sorted(self._queries, key=self._counts.get, reverse=True)[:n]
+        return [FrequentQuery(key, self._counts[key], *self._queries[key]) for key in ranked]
+
+    async def warm(self, generation: int) -> Dict[str, Any]:
+        """Выполнение SQL частых вопросов с ограничением параллельности"""
+        started = time.perf_counter()
+        entries = self.top(self.top_n)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        warmed: Set[Hashable] = set()
+        errors = 0
+
+        async def run(entry: FrequentQuery):
+            nonlocal errors
+            async with semaphore:
+                # Пока шел прогрев, могла завершиться следующая загрузка
+                if self.db.generation != generation:
+                    return
+                try:
+                    if entry.guarded and self.sql_guard is not None:
+                        await self.sql_guard.execute_scalar(self.db, entry.sql, *entry.args)
+                    else:
+                        await self.db.execute_scalar(entry.sql, *entry.args)
+                    warmed.add(entry.key)
+                except Exception as e:
+                    errors += 1
+                    logger.warning(f"Прогрев запроса не выполнен: {e}")
+
+        await asyncio.gather(*(run(entry) for entry in entries))
+
+        total = sum(self._counts.values())
+        self.coverage = sum(entry.count for entry in entries if entry.key in warmed) / total if total else 0.0
+        self._warmed = warmed
+        self.asked = self.hits = 0
+        for key in list(self._counts):
+            self._counts[key] //= 2
+            if not self._counts[key]:
+                del self._counts[key]
+                self._queries.pop(key, None)
+
+        self.runs += 1
+        self.warmed += len(warmed)
+        self.errors += errors
+        self.last_seconds = time.perf_counter() - started
+        logger.info(
+            f"Прогрев поколения {generation}: {len(warmed)} из {len(entries)} частых запросов "
+            f"за {self.last_seconds:.2f} с, они покрывают {self.coverage:.0%} вопросов"
+        )
+        return {'warmed': len(warmed), 'errors': errors, 'coverage': self.coverage, 'seconds': self.last_seconds}
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики прогревов и доля вопросов после загрузки, ответ на которые был прогрет"""
+        return {
+            'questions': len(self._counts),
+            'runs': self.runs,
+            'warmed': self.warmed,
+            'errors': self.errors,
+            'last_seconds': self.last_seconds,
+            'coverage': self.coverage,
+            'asked': self.asked,
+            'hits': self.hits,
+            'hit_rate': self.hits / self.asked if self.asked else 0.0,
+        }
+
+    def _on_generation(self, generation: int):
+        """Запуск прогрева; незавершенный прогрев прошлого поколения отменяется"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = asyncio.ensure_future(self.warm(generation))
+        self._task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Ошибка прогрева кэшей: {task.exception()}")